@@ -0,0 +1,374 @@
+from __future__ import annotations
+import atexit, itertools, json, logging, os, queue, threading, time
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, List, Optional, Tuple, Union
+from app.core.settings import settings
+from app.core.audit_index import IDX_SUFFIX, index_fields
+from app.core.audit_segments import Compactor, next_seq, segment_dir
+from app.core.filelock import PathLock
+
+log = logging.getLogger("orion.audit")
+
+LOCK_SUFFIX = ".lock"
+
+PathLike = Union[str, Path]
+
+_seq = itertools.count(1)
+
+def new_audit_id() -> str:
+    """
+    `<ms>-<pid>-<seq>`: same leading fields as the old `ms-pid` ids, plus a per-process
+    sequence so ids stay unique at any rate (and across threads) within one worker.
+    """
+    return f"{int(time.time() * 1000)}-{os.getpid()}-{next(_seq)}"
+
+class AuditWriter:
+    """
+    Shared JSONL audit writer: request threads enqueue records, one writer thread appends them.
+
+    - Bounded queue (AUDIT_QUEUE_MAX). When it stays full for AUDIT_ENQUEUE_TIMEOUT_MS the caller
+      is counted as back-pressure and then blocks until there is room, so records are never dropped
+      and always reach the file in submission order.
+    - Group commit: everything queued at wake-up (up to AUDIT_BATCH_MAX records) goes out in one write
+      per file, followed by a single flush.
+    - fsync policy: after AUDIT_FSYNC_EVERY_N records or AUDIT_FSYNC_INTERVAL_MS, whichever is first
+      (0 disables that trigger).
+    - Sidecar index: each record's byte offset/length plus its time, symbol, result and failing checks
+      go to `<file>.idx` right after the data (see app.core.audit_index), so reads can seek.
+      Each data+index append holds an exclusive lock on `<file>.lock`, so workers sharing the
+      file cannot interleave between taking the offset and writing.
+    - Rotation: once a file reaches AUDIT_ROTATE_MAX_BYTES or its first record is
+      AUDIT_ROTATE_MAX_SECONDS old, the writer thread moves it (and its sidecar) into `<file>.segments/`
+      and a compactor thread turns it into a block-gzip segment listed in the manifest
+      (app.core.audit_segments). Request threads never see either step. The decision and the rename
+      happen under the same `<file>.lock`, and every append checks the file's inode under that lock
+      first, so other workers reopen the new file rather than writing into a rotated one.
+    - `flush()` waits until everything submitted so far is on disk; `close()` also runs at exit.
+    """
+
+    def __init__(self, queue_max: int = 10000, batch_max: int = 512, fsync_every_n: int = 256,
+                 fsync_interval_ms: int = 1000, enqueue_timeout_ms: int = 50, rotate_max_bytes: int = 0,
+                 rotate_max_seconds: int = 0, segment_block_records: int = 1000):
+        self._q: "queue.Queue[Optional[Tuple[str, str, Dict[str, Any]]]]" = queue.Queue(maxsize=max(1, queue_max))
+        self.queue_max = max(1, queue_max)
+        self.batch_max = max(1, batch_max)
+        self.fsync_every_n = max(0, fsync_every_n)
+        self.fsync_interval = max(0, fsync_interval_ms) / 1000.0
+        self.enqueue_timeout = max(0, enqueue_timeout_ms) / 1000.0
+        self.rotate_max_bytes = max(0, rotate_max_bytes)
+        self.rotate_max_seconds = max(0, rotate_max_seconds)
+        self.compactor = Compactor(segment_block_records)
+
+        self._io_lock = threading.Lock()          # file handles / fsync bookkeeping
+        self._drained = threading.Event()         # set once close() has written everything admitted
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._done = threading.Condition()        # guards _closed/_submitted/_completed
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._files: Dict[str, IO[bytes]] = {}
+        self._plocks: Dict[str, PathLock] = {}    # data file -> cross-process lock on <file>.lock
+        self._unsynced: Dict[str, int] = {}
+        self._born: Dict[str, Tuple[int, float]] = {}  # data file -> (inode, time of its first record)
+        self._recovered: set = set()
+        self._last_fsync = time.monotonic()
+
+        self._submitted = 0
+        self._completed = 0
+        self._counters = {
+            "records_written": 0, "batches": 0, "fsyncs": 0, "high_water": 0,
+            "backpressure_events": 0, "sync_writes": 0, "errors": 0, "rotations": 0,
+            "flush_ms_last": 0.0, "flush_ms_max": 0.0, "flush_ms_total": 0.0,
+        }
+
+    @classmethod
+    def from_settings(cls) -> "AuditWriter":
+        return cls(queue_max=settings.AUDIT_QUEUE_MAX, batch_max=settings.AUDIT_BATCH_MAX,
+                   fsync_every_n=settings.AUDIT_FSYNC_EVERY_N, fsync_interval_ms=settings.AUDIT_FSYNC_INTERVAL_MS,
+                   enqueue_timeout_ms=settings.AUDIT_ENQUEUE_TIMEOUT_MS,
+                   rotate_max_bytes=settings.AUDIT_ROTATE_MAX_BYTES, rotate_max_seconds=settings.AUDIT_ROTATE_MAX_SECONDS,
+                   segment_block_records=settings.AUDIT_SEGMENT_BLOCK_RECORDS)
+
+    def _count(self, **inc: float) -> None:
+        with self._stats_lock:
+            for k, v in inc.items(): self._counters[k] += v
+
+    # ---- producer side ----
+    def _ensure_started(self) -> None:
+        if self._thread is not None: return
+        with self._start_lock:
+            if self._thread is None:
+                t = threading.Thread(target=self._run, name="orion-audit-writer", daemon=True)
+                t.start(); self._thread = t
+
+    def submit(self, path: PathLike, record: Dict[str, Any]) -> bool:
+        """Queue one record. Returns False if the caller had to wait on a full queue."""
+        return self.submit_many(path, (record,))
+
+    def submit_many(self, path: PathLike, records: Iterable[Dict[str, Any]]) -> bool:
+        key = str(path)
+        records = list(records)
+        lines = [json.dumps(r, ensure_ascii=False) + "\n" for r in records]
+        if not lines: return True
+        idxs = [index_fields(r) for r in records]
+        with self._done:
+            closed = self._closed
+            if not closed: self._submitted += len(lines)
+        if closed:
+            # after close(): append directly, once close() has written everything before us
+            self._drained.wait(timeout=10.0)
+            with self._io_lock:
+                self._append(key, lines, idxs)
+            self._count(sync_writes=len(lines))
+            return True
+        self._ensure_started()
+        waited = False
+        for line, idx in zip(lines, idxs):
+            try:
+                self._q.put((key, line, idx), timeout=self.enqueue_timeout)
+            except queue.Full:
+                if not waited:
+                    waited = True
+                    self._count(backpressure_events=1)
+                    log.warning("audit queue full (%d); producer waiting", self.queue_max)
+                self._q.put((key, line, idx))
+        depth = self._q.qsize()
+        with self._stats_lock:
+            if depth > self._counters["high_water"]: self._counters["high_water"] = depth
+        return not waited
+
+    def _mark_done(self, n: int) -> None:
+        with self._done:
+            self._completed += n
+            self._done.notify_all()
+
+    # ---- writer side ----
+    def _file(self, key: str) -> IO[bytes]:
+        """Open handle for `key`; reopened when the path now names another file (rotated by any worker)."""
+        f = self._files.get(key)
+        if f is not None:
+            try: stale = os.fstat(f.fileno()).st_ino != os.stat(key).st_ino
+            except OSError: stale = True  # removed/renamed underneath us
+            if stale:
+                f.close(); f = None
+                self._unsynced.pop(key, None)
+        if f is None:
+            Path(key).parent.mkdir(parents=True, exist_ok=True)
+            f = open(key, "ab"); self._files[key] = f
+            if not key.endswith(IDX_SUFFIX) and self._rotating and key not in self._recovered:
+                # finish compactions a previous process left behind
+                self._recovered.add(key); self.compactor.recover(segment_dir(key))
+        return f
+
+    def _first_record_time(self, key: str) -> Optional[float]:
+        """Time of the file's first record (from its sidecar, else the record), cached per inode."""
+        try: ino = os.stat(key).st_ino
+        except OSError: return None
+        cached = self._born.get(key)
+        if cached is not None and cached[0] == ino: return cached[1]
+        t = None
+        for src in (key + IDX_SUFFIX, key):
+            try:
+                with open(src, "rb") as fh: first = fh.readline()
+                rec = json.loads(first)
+                t = rec.get("t") if src != key else index_fields(rec)["t"]
+            except (OSError, ValueError, AttributeError):
+                continue
+            if t is not None: break
+        if t is None: t = time.time()  # no timestamp to go by: count from now
+        self._born[key] = (ino, t)
+        return t
+
+    @property
+    def _rotating(self) -> bool:
+        return bool(self.rotate_max_bytes or self.rotate_max_seconds)
+
+    @property
+    def io_lock(self) -> threading.Lock:
+        """Held across each data+index append; readers take it to see both consistently."""
+        return self._io_lock
+
+    def _plock(self, key: str) -> PathLock:
+        lk = self._plocks.get(key)
+        if lk is None: lk = self._plocks[key] = PathLock(key + LOCK_SUFFIX)
+        return lk
+
+    def _append(self, key: str, lines: List[str], idxs: List[Dict[str, Any]]) -> int:
+        """Write records and their index entries; returns the data file size afterwards."""
+        data = [line.encode("utf-8") for line in lines]
+        with self._plock(key):  # no other worker appends between reading the end and our index write
+            f = self._file(key)
+            off = f.seek(0, os.SEEK_END)
+            f.write(b"".join(data))
+            f.flush()
+            entries = []
+            for raw, idx in zip(data, idxs):
+                entries.append(json.dumps({"o": off, "n": len(raw), **idx}, ensure_ascii=False) + "\n")
+                off += len(raw)
+            fi = self._file(key + IDX_SUFFIX)
+            fi.write("".join(entries).encode("utf-8"))
+            fi.flush()
+        self._unsynced[key] = self._unsynced.get(key, 0) + len(lines)
+        self._count(records_written=len(lines))
+        return off
+
+    def _maybe_fsync(self, force: bool = False) -> None:
+        pending = sum(self._unsynced.values())
+        if not pending: return
+        due_n = self.fsync_every_n and pending >= self.fsync_every_n
+        due = self.fsync_interval and (time.monotonic() - self._last_fsync) >= self.fsync_interval
+        if not (force or due_n or due): return
+        for key, n in list(self._unsynced.items()):
+            f = self._files.get(key)
+            if n and f is not None:
+                try: os.fsync(f.fileno())
+                except OSError: pass
+            self._unsynced[key] = 0
+        self._last_fsync = time.monotonic()
+        self._count(fsyncs=1)
+
+    def _maybe_rotate(self, key: str) -> None:
+        if not self._rotating: return
+        with self._plock(key):  # another worker may have rotated since our append: decide on the current file
+            try: size = os.path.getsize(key)
+            except OSError: return
+            if not size: return
+            due = bool(self.rotate_max_bytes) and size >= self.rotate_max_bytes
+            if not due and self.rotate_max_seconds:
+                born = self._first_record_time(key)
+                due = born is not None and time.time() - born >= self.rotate_max_seconds
+            if due: self._rotate_files(key)
+
+    def _rotate_locked(self, key: str) -> Optional[Path]:
+        with self._plock(key):
+            return self._rotate_files(key)
+
+    def _rotate_files(self, key: str) -> Optional[Path]:
+        """Move `key` and its sidecar into the segment dir; caller holds io_lock and the file lock."""
+        for k in (key, key + IDX_SUFFIX):
+            f = self._files.pop(k, None)
+            if f is None: continue
+            try: os.fsync(f.fileno())
+            except OSError: pass
+            f.close()
+        self._unsynced.pop(key, None)
+        self._born.pop(key, None)
+        if not os.path.exists(key) or os.path.getsize(key) == 0: return None
+        seg_dir = segment_dir(key)
+        seg_dir.mkdir(parents=True, exist_ok=True)
+        raw = seg_dir / f"{Path(key).stem}.{next_seq(seg_dir):06d}.jsonl"
+        os.replace(key, raw)
+        if os.path.exists(key + IDX_SUFFIX): os.replace(key + IDX_SUFFIX, str(raw) + IDX_SUFFIX)
+        self._count(rotations=1)
+        self.compactor.submit(raw)
+        return raw
+
+    def rotate(self, path: PathLike) -> Optional[Path]:
+        """Rotate `path` now (after writing what is already queued); returns the raw segment path."""
+        self.flush()
+        with self._io_lock:
+            return self._rotate_locked(str(path))
+
+    def _commit(self, batch: List[Tuple[str, str, Dict[str, Any]]]) -> None:
+        t0 = time.perf_counter()
+        grouped: Dict[str, Tuple[List[str], List[Dict[str, Any]]]] = {}
+        for key, line, idx in batch:
+            lines, idxs = grouped.setdefault(key, ([], []))
+            lines.append(line); idxs.append(idx)
+        with self._io_lock:
+            for key, (lines, idxs) in grouped.items():
+                try:
+                    self._append(key, lines, idxs)
+                    self._maybe_rotate(key)
+                except Exception:
+                    self._count(errors=1)
+                    log.exception("audit write failed for %s", key)
+            self._maybe_fsync()
+        ms = (time.perf_counter() - t0) * 1000.0
+        with self._stats_lock:
+            c = self._counters
+            c["batches"] += 1; c["flush_ms_last"] = ms; c["flush_ms_total"] += ms
+            if ms > c["flush_ms_max"]: c["flush_ms_max"] = ms
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            try:
+                item = self._q.get(timeout=self.fsync_interval or None)
+            except queue.Empty:
+                with self._io_lock:
+                    self._maybe_fsync()
+                    for key in [k for k in self._files if not k.endswith(IDX_SUFFIX)]:
+                        self._maybe_rotate(key)  # age limit on idle files
+                continue
+            batch: List[Tuple[str, str, Dict[str, Any]]] = []
+            while True:
+                if item is None: stop = True
+                else: batch.append(item)
+                if stop or len(batch) >= self.batch_max: break
+                try: item = self._q.get_nowait()
+                except queue.Empty: break
+            if batch:
+                self._commit(batch)
+                self._mark_done(len(batch))
+
+    # ---- control ----
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until every record submitted before this call has been written."""
+        with self._done:
+            target = self._submitted
+            return self._done.wait_for(lambda: self._completed >= target, timeout=timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        with self._done:
+            if self._closed: return
+            self._closed = True  # _submitted is frozen from here on
+        t = self._thread
+        if t is not None:
+            self._q.put(None)
+            t.join(timeout=timeout)
+        # Producers admitted before close() may still be putting; drain until all of them landed.
+        deadline = time.monotonic() + timeout
+        while self._completed < self._submitted and time.monotonic() < deadline:
+            try: item = self._q.get(timeout=0.05)
+            except queue.Empty: continue
+            if item is not None:
+                self._commit([item]); self._mark_done(1)
+        self._drained.set()
+        with self._io_lock:
+            self._maybe_fsync(force=True)
+            for f in self._files.values():
+                try: f.close()
+                except Exception: pass
+            self._files.clear()
+            for lk in self._plocks.values(): lk.close()
+            self._plocks.clear()
+        self.compactor.close(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            c = dict(self._counters)
+        c["flush_ms_avg"] = (c["flush_ms_total"] / c["batches"]) if c["batches"] else 0.0
+        c.update({
+            "queue_depth": self._q.qsize(), "queue_max": self.queue_max, "pending": self._submitted - self._completed,
+            "batch_max": self.batch_max, "fsync_every_n": self.fsync_every_n,
+            "fsync_interval_ms": int(self.fsync_interval * 1000), "running": bool(self._thread and self._thread.is_alive()),
+            "rotate_max_bytes": self.rotate_max_bytes, "rotate_max_seconds": self.rotate_max_seconds,
+            "segments_compacted": self.compactor.compacted, "compaction_errors": self.compactor.errors,
+        })
+        return c
+
+audit_writer = AuditWriter.from_settings()
+atexit.register(audit_writer.close)
+
+def append(path: PathLike, record: Dict[str, Any]) -> bool:
+    return audit_writer.submit(path, record)
+
+def append_many(path: PathLike, records: Iterable[Dict[str, Any]]) -> bool:
+    return audit_writer.submit_many(path, records)
+
+def flush(timeout: float = 5.0) -> bool:
+    return audit_writer.flush(timeout)
+
+def shutdown() -> None:
+    audit_writer.close()
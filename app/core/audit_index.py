@@ -0,0 +1,216 @@
+from __future__ import annotations
+import json, os, threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Union
+
+PathLike = Union[str, Path]
+
+IDX_SUFFIX = ".idx"
+BUCKET_SECONDS = 3600  # time buckets are one hour wide
+
+# Gate keys in app.core.risk audit records ("reasons" also carries notional/qty/price)
+_RISK_GATES = ("session", "throttle", "orders_per_min", "max_position_risk", "daily_loss_limit", "cooloff")
+
+def parse_ts(ts: Any) -> Optional[float]:
+    if isinstance(ts, (int, float)): return float(ts)
+    if not isinstance(ts, str) or not ts: return None
+    try: return datetime.fromisoformat(ts.replace("Z", "+00:00")).timestamp()  # naive = local time
+    except ValueError: return None
+
+def index_fields(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Compact index entry for one audit record. Understands all three audit shapes:
+    app.core.risk (symbol/result/reasons), orders preview (request/result.status/result.checks)
+    and risk_engine events (ok/gates).
+    """
+    req = record.get("request") if isinstance(record.get("request"), dict) else {}
+    res = record.get("result")
+    symbol = record.get("symbol") or req.get("symbol")
+    failing: List[str] = []
+    if isinstance(res, dict):  # orders preview
+        result = "BLOCK" if res.get("status") == "BLOCKED" else "ALLOW"
+        failing = [c.get("name") for c in res.get("checks") or [] if isinstance(c, dict) and not c.get("passed", True)]
+    elif res in ("ALLOW", "BLOCK"):  # app.core.risk
+        result = res
+        reasons = record.get("reasons") or {}
+        failing = [k for k in _RISK_GATES if reasons.get(k, "ok") != "ok"]
+    elif "ok" in record:  # risk_engine
+        result = "ALLOW" if record.get("ok") else "BLOCK"
+        failing = [k for k, v in (record.get("gates") or {}).items() if not v]
+    else:
+        result = None
+    return {"t": parse_ts(record.get("ts")), "s": str(symbol).upper() if symbol else None, "r": result,
+            "f": failing, "id": record.get("audit_id")}
+
+def matches(e: Dict[str, Any], start: Optional[float] = None, end: Optional[float] = None,
+            symbol: Optional[str] = None, result: Optional[str] = None, check: Optional[str] = None,
+            audit_id: Optional[str] = None) -> bool:
+    """Filter one index entry; `symbol` must already be upper-cased."""
+    t = e.get("t")
+    if start is not None and (t is None or t < start): return False
+    if end is not None and (t is None or t > end): return False
+    if symbol is not None and e.get("s") != symbol: return False
+    if result is not None and e.get("r") != result: return False
+    if check is not None and check not in (e.get("f") or ()): return False
+    if audit_id is not None and e.get("id") != audit_id: return False
+    return True
+
+def _bucket(t: Optional[float]) -> Optional[int]:
+    return None if t is None else int(t // BUCKET_SECONDS)
+
+class AuditIndex:
+    """
+    In-memory view of an audit file's sidecar index (`<file>.idx`, one JSON line per record:
+    byte offset `o`, length `n`, epoch `t`, symbol `s`, result `r`, failing checks `f`, audit id `id`).
+
+    The sidecar is appended by the audit writer as it writes records; `refresh()` only reads
+    the sidecar lines added since the last call. Records appended without an index entry (older
+    files, other writers) are indexed once by scanning just the un-indexed tail of the data file.
+    Queries filter on the index and then seek to the matching records only. With
+    `persist=False` (rotated segments another thread may be compacting) the sidecar is only read,
+    never created or rewritten.
+    """
+
+    def __init__(self, path: PathLike, io_lock: Optional[threading.Lock] = None, persist: bool = True):
+        self.path = Path(path)
+        self.persist = persist
+        self.idx_path = Path(str(self.path) + IDX_SUFFIX)
+        self._io_lock = io_lock or threading.Lock()
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.entries: List[Dict[str, Any]] = []
+        self._offsets: Set[int] = set()
+        self.by_bucket: Dict[int, List[int]] = {}
+        self.by_symbol: Dict[str, List[int]] = {}
+        self.by_id: Dict[str, int] = {}
+        self.indexed_end = 0
+        self._idx_pos = 0
+        self._ino: Optional[int] = None
+
+    def _add(self, e: Dict[str, Any]) -> None:
+        if e["o"] in self._offsets: return
+        i = len(self.entries)
+        self.entries.append(e); self._offsets.add(e["o"])
+        b = _bucket(e.get("t"))
+        if b is not None: self.by_bucket.setdefault(b, []).append(i)
+        if e.get("s"): self.by_symbol.setdefault(e["s"], []).append(i)
+        if e.get("id"): self.by_id[e["id"]] = i
+        end = e["o"] + e["n"]
+        if end > self.indexed_end: self.indexed_end = end
+
+    def _read_sidecar(self) -> None:
+        try:
+            with open(self.idx_path, "rb") as f:
+                if os.fstat(f.fileno()).st_size < self._idx_pos:  # sidecar deleted/recreated
+                    self._idx_pos = 0  # re-read; entries already known are skipped by offset
+                f.seek(self._idx_pos)
+                chunk = f.read()
+        except FileNotFoundError:
+            return
+        done = chunk.rfind(b"\n") + 1  # only complete lines
+        for line in chunk[:done].splitlines():
+            try: self._add(json.loads(line))
+            except (ValueError, KeyError, TypeError): continue
+        self._idx_pos += done
+
+    def _catch_up(self) -> None:
+        """Index (and persist) complete records past `indexed_end` that have no sidecar entry."""
+        try: size = os.path.getsize(self.path)
+        except OSError: size = 0
+        if size < self.indexed_end:  # truncated in place: the sidecar no longer matches
+            ino = self._ino
+            if self.persist: self.idx_path.unlink(missing_ok=True)
+            self._reset(); self._ino = ino
+        if size <= self.indexed_end: return
+        new: List[Dict[str, Any]] = []
+        with open(self.path, "rb") as f:
+            f.seek(self.indexed_end)
+            off = self.indexed_end
+            for raw in f:
+                if not raw.endswith(b"\n"): break
+                try: e = index_fields(json.loads(raw))
+                except ValueError: e = {"t": None, "s": None, "r": None, "f": [], "id": None}
+                e["o"] = off; e["n"] = len(raw)
+                off += len(raw)
+                new.append(e)
+        if not new: return
+        if self.persist:
+            with open(self.idx_path, "ab") as f:
+                f.write("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in new).encode("utf-8"))
+                self._idx_pos = f.tell()
+        for e in new: self._add(e)
+
+    def refresh(self) -> None:
+        with self._lock, self._io_lock:  # writer holds io_lock between data and sidecar appends
+            try: ino: Optional[int] = os.stat(self.path).st_ino
+            except OSError: ino = None
+            if ino != self._ino:  # rotated/replaced: the current sidecar belongs to the new file
+                self._reset(); self._ino = ino
+            self._read_sidecar()
+            self._catch_up()
+
+    def _candidates(self, start: Optional[float], end: Optional[float], symbol: Optional[str],
+                    audit_id: Optional[str]) -> Iterable[int]:
+        if audit_id is not None:
+            i = self.by_id.get(audit_id)
+            return [] if i is None else [i]
+        sets: List[List[int]] = []
+        if symbol is not None:
+            sets.append(self.by_symbol.get(symbol.upper(), []))
+        if start is not None or end is not None:
+            if self.by_bucket:
+                lo = _bucket(start) if start is not None else min(self.by_bucket)
+                hi = _bucket(end) if end is not None else max(self.by_bucket)
+                if hi - lo + 1 <= len(self.by_bucket):
+                    rng = [i for b in range(lo, hi + 1) for i in self.by_bucket.get(b, ())]
+                else:
+                    rng = [i for b, ids in self.by_bucket.items() if lo <= b <= hi for i in ids]
+                sets.append(sorted(rng))
+            else:
+                sets.append([])
+        if not sets: return range(len(self.entries))
+        return min(sets, key=len)
+
+    def query(self, start: Optional[float] = None, end: Optional[float] = None, symbol: Optional[str] = None,
+              result: Optional[str] = None, check: Optional[str] = None, audit_id: Optional[str] = None,
+              limit: int = 100, newest_first: bool = True) -> Dict[str, Any]:
+        self.refresh()
+        with self._lock:
+            cand = self._candidates(start, end, symbol, audit_id)
+            sym = symbol.upper() if symbol else None
+            matched = [e for e in (self.entries[i] for i in cand)
+                       if matches(e, start, end, sym, result, check, audit_id)]
+        matched.sort(key=lambda e: e["o"], reverse=newest_first)
+        total = len(matched)
+        records = self.read(matched[:limit])
+        return {"total": total, "returned": len(records), "records": records}
+
+    def read(self, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        if not entries: return out
+        with open(self.path, "rb") as f:
+            for e in entries:
+                f.seek(e["o"])
+                try: out.append(json.loads(f.read(e["n"])))
+                except ValueError: continue
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": str(self.path), "records": len(self.entries), "indexed_bytes": self.indexed_end,
+                "symbols": len(self.by_symbol), "buckets": len(self.by_bucket)}
+
+_indexes: Dict[str, AuditIndex] = {}
+_indexes_lock = threading.Lock()
+
+def get_index(path: PathLike) -> AuditIndex:
+    """Process-wide index per audit file, sharing the audit writer's I/O lock."""
+    key = str(path)
+    with _indexes_lock:
+        ix = _indexes.get(key)
+        if ix is None:
+            from app.core.audit import audit_writer  # local import: app.core.audit imports this module
+            ix = _indexes[key] = AuditIndex(key, audit_writer.io_lock)
+        return ix
@@ -0,0 +1,250 @@
+from __future__ import annotations
+import gzip, json, logging, os, queue, re, threading, time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from app.core.audit_index import IDX_SUFFIX, AuditIndex, get_index, index_fields, matches
+from app.core.filelock import PathLock
+
+log = logging.getLogger("orion.audit")
+
+PathLike = Union[str, Path]
+
+SEGMENTS_SUFFIX = ".segments"
+MANIFEST = "manifest.json"
+COMPACT_LOCK = "compact.lock"
+_SEG_RE = re.compile(r"\.(\d{6})\.jsonl(\.gz)?$")
+_ID_SLACK_S = 5.0  # audit ids carry the ms they were minted at; records are stamped within this of it
+
+def segment_dir(path: PathLike) -> Path:
+    return Path(str(path) + SEGMENTS_SUFFIX)
+
+def _seq(p: Path) -> Optional[int]:
+    m = _SEG_RE.search(p.name)
+    return int(m.group(1)) if m else None
+
+def pending_raw(seg_dir: Path) -> List[Path]:
+    """Rotated segments not compacted yet, oldest first."""
+    if not seg_dir.is_dir(): return []
+    return sorted((p for p in seg_dir.glob("*.jsonl") if _seq(p) is not None), key=_seq)
+
+def next_seq(seg_dir: Path) -> int:
+    seqs = [s for s in (_seq(p) for p in seg_dir.glob("*.jsonl*")) if s is not None] if seg_dir.is_dir() else []
+    return max(seqs, default=0) + 1
+
+# ---------- manifest ----------
+
+_manifest_lock = threading.Lock()
+
+def load_manifest(seg_dir: Path) -> Dict[str, Any]:
+    try:
+        return json.loads((seg_dir / MANIFEST).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {"version": 1, "segments": []}
+
+def _save_manifest(seg_dir: Path, m: Dict[str, Any]) -> None:
+    tmp = seg_dir / (MANIFEST + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(m, f, ensure_ascii=False)
+        f.flush(); os.fsync(f.fileno())
+    os.replace(tmp, seg_dir / MANIFEST)
+
+# ---------- compaction ----------
+
+def _block_meta(entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    ts = [e["t"] for e in entries if e.get("t") is not None]
+    return {
+        "count": len(entries),
+        "t0": min(ts) if ts else None, "t1": max(ts) if ts else None,
+        "symbols": sorted({e["s"] for e in entries if e.get("s")}),
+        "results": sorted({e["r"] for e in entries if e.get("r")}),
+        "checks": sorted({c for e in entries for c in e.get("f") or ()}),
+    }
+
+def compact(raw: Path, block_records: int = 1000) -> Dict[str, Any]:
+    """
+    Turn a rotated raw segment into `<name>.jsonl.gz`: one gzip member per block of
+    `block_records` records (the file is still a valid .gz for zcat), with each block's offset,
+    length, time range, symbols, results and failing checks recorded in the manifest so readers
+    can skip or seek straight to blocks. Removes the raw file and its sidecar when done.
+    """
+    seg_dir = raw.parent
+    gz = raw.with_name(raw.name + ".gz")
+    part = gz.with_name(gz.name + ".part")
+    blocks: List[Dict[str, Any]] = []
+    raw_bytes = 0
+    with open(raw, "rb") as src, open(part, "wb") as dst:
+        lines: List[bytes] = []
+        entries: List[Dict[str, Any]] = []
+
+        def emit() -> None:
+            data = gzip.compress(b"".join(lines), compresslevel=6, mtime=0)
+            blocks.append({"o": dst.tell(), "n": len(data), **_block_meta(entries)})
+            dst.write(data)
+            lines.clear(); entries.clear()
+
+        for line in src:
+            if not line.endswith(b"\n"): line += b"\n"  # torn last line of a crashed writer
+            raw_bytes += len(line)
+            try: entries.append(index_fields(json.loads(line)))
+            except ValueError: entries.append({"t": None, "s": None, "r": None, "f": [], "id": None})
+            lines.append(line)
+            if len(lines) >= block_records: emit()
+        if lines: emit()
+        dst.flush(); os.fsync(dst.fileno())
+    os.replace(part, gz)
+
+    t0s = [b["t0"] for b in blocks if b["t0"] is not None]
+    t1s = [b["t1"] for b in blocks if b["t1"] is not None]
+    seg = {"seq": _seq(raw), "file": gz.name, "records": sum(b["count"] for b in blocks),
+           "t0": min(t0s) if t0s else None, "t1": max(t1s) if t1s else None,
+           "raw_bytes": raw_bytes, "bytes": gz.stat().st_size, "compacted_at": time.time(), "blocks": blocks}
+    with _manifest_lock:
+        m = load_manifest(seg_dir)
+        m["segments"] = sorted([s for s in m["segments"] if s.get("seq") != seg["seq"]] + [seg],
+                               key=lambda s: s["seq"])
+        _save_manifest(seg_dir, m)
+    raw.unlink(missing_ok=True)
+    Path(str(raw) + IDX_SUFFIX).unlink(missing_ok=True)
+    return seg
+
+class Compactor:
+    """Background thread that compresses rotated segments; request threads never wait on it."""
+
+    def __init__(self, block_records: int = 1000):
+        self.block_records = max(1, block_records)
+        self._q: "queue.Queue[Optional[Path]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.compacted = 0
+        self.errors = 0
+
+    def submit(self, raw: Path) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="orion-audit-compactor", daemon=True)
+                self._thread.start()
+        self._q.put(raw)
+
+    def recover(self, seg_dir: Path) -> None:
+        """Queue raw segments left behind by a previous process."""
+        for raw in pending_raw(seg_dir): self.submit(raw)
+
+    def _run(self) -> None:
+        while True:
+            raw = self._q.get()
+            try:
+                if raw is None: return
+                lock = PathLock(raw.parent / COMPACT_LOCK)  # workers recovering the same dir take turns
+                try:
+                    with lock:
+                        if raw.exists():
+                            compact(raw, self.block_records)
+                            self.compacted += 1
+                finally:
+                    lock.close()
+            except Exception:
+                self.errors += 1
+                log.exception("audit compaction failed for %s", raw)
+            finally:
+                self._q.task_done()
+
+    def join(self, timeout: float = 5.0) -> bool:
+        """Wait for queued compactions (tests / shutdown)."""
+        deadline = time.monotonic() + timeout
+        while self._q.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not self._q.unfinished_tasks
+
+    def close(self, timeout: float = 5.0) -> None:
+        t = self._thread
+        if t is not None:
+            self._q.put(None)
+            t.join(timeout=timeout)
+
+# ---------- reads ----------
+
+def _id_time(audit_id: str) -> Optional[float]:
+    try: return int(audit_id.split("-", 1)[0]) / 1000.0
+    except ValueError: return None
+
+def _block_may_match(b: Dict[str, Any], start: Optional[float], end: Optional[float], symbol: Optional[str],
+                     result: Optional[str], check: Optional[str], audit_id: Optional[str]) -> bool:
+    t0, t1 = b.get("t0"), b.get("t1")
+    if start is not None and (t1 is None or t1 < start): return False
+    if end is not None and (t0 is None or t0 > end): return False
+    if symbol is not None and symbol not in b.get("symbols", ()): return False
+    if result is not None and result not in b.get("results", ()): return False
+    if check is not None and check not in b.get("checks", ()): return False
+    if audit_id is not None:
+        t = _id_time(audit_id)
+        if t is not None and (t0 is None or t < t0 - _ID_SLACK_S or t > t1 + _ID_SLACK_S): return False
+    return True
+
+def _read_block(f, b: Dict[str, Any]) -> List[bytes]:
+    f.seek(b["o"])
+    return gzip.decompress(f.read(b["n"])).splitlines()
+
+def iter_segment_matches(path: PathLike, newest_first: bool = True, **filters: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Matching records from rotated history: raw segments still waiting for compaction
+    (through their sidecar index), then compressed segments. Blocks whose manifest entry
+    cannot match are never read.
+    """
+    seg_dir = segment_dir(path)
+    if filters.get("symbol"): filters["symbol"] = filters["symbol"].upper()
+    manifest = load_manifest(seg_dir)
+    sources: List[Tuple[int, Any]] = [(s["seq"], s) for s in manifest.get("segments", [])]
+    done = {seq for seq, _ in sources}
+    sources += [(_seq(p), p) for p in pending_raw(seg_dir) if _seq(p) not in done]
+    sources.sort(key=lambda x: x[0], reverse=newest_first)
+
+    for _, src in sources:
+        if isinstance(src, Path):  # pending raw segment: its sidecar was rotated along with it
+            ix = AuditIndex(src, persist=False)  # never (re)create a sidecar the compactor is about to delete
+            try: yield from ix.query(limit=10**9, newest_first=newest_first, **filters)["records"]
+            except FileNotFoundError: continue  # compacted meanwhile; manifest is re-read next query
+            continue
+        blocks = src.get("blocks", [])
+        try:
+            with open(seg_dir / src["file"], "rb") as f:
+                for b in (reversed(blocks) if newest_first else blocks):
+                    if not _block_may_match(b, **filters): continue
+                    lines = _read_block(f, b)
+                    for line in (reversed(lines) if newest_first else lines):
+                        try: rec = json.loads(line)
+                        except ValueError: continue
+                        if matches(index_fields(rec), **filters): yield rec
+        except FileNotFoundError:
+            continue
+
+def query_history(path: PathLike, start: Optional[float] = None, end: Optional[float] = None,
+                  symbol: Optional[str] = None, result: Optional[str] = None, check: Optional[str] = None,
+                  audit_id: Optional[str] = None, limit: int = 100, newest_first: bool = True) -> Dict[str, Any]:
+    """
+    Live file (sidecar index) plus rotated segments, newest first by default. Stops reading
+    history once `limit` records are collected; `more` then says further matches may exist and
+    `total` is a lower bound.
+    """
+    filters = {"start": start, "end": end, "symbol": symbol, "result": result, "check": check, "audit_id": audit_id}
+    live = get_index(path).query(limit=limit, newest_first=newest_first, **filters)
+    if not newest_first:  # oldest first: history before the live file
+        records, total, more = _collect(iter_segment_matches(path, newest_first=False, **filters), limit)
+        total += live["total"]
+        for rec in live["records"]:
+            if len(records) >= limit: more = True; break
+            records.append(rec)
+        return {"total": total, "returned": len(records), "more": more, "records": records}
+    records = list(live["records"])
+    if len(records) >= limit:
+        return {"total": live["total"], "returned": len(records), "more": True, "records": records}
+    older, n, more = _collect(iter_segment_matches(path, newest_first=True, **filters), limit - len(records))
+    records += older
+    return {"total": live["total"] + n, "returned": len(records), "more": more, "records": records}
+
+def _collect(it: Iterator[Dict[str, Any]], limit: int) -> Tuple[List[Dict[str, Any]], int, bool]:
+    out: List[Dict[str, Any]] = []
+    for rec in it:
+        if len(out) >= limit: return out, len(out), True
+        out.append(rec)
+    return out, len(out), False
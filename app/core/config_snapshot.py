@@ -0,0 +1,61 @@
+from __future__ import annotations
+import logging, signal, threading, time
+from typing import Any, Callable, Dict, List, NamedTuple
+
+from dotenv import load_dotenv
+
+log = logging.getLogger("orion.config")
+
+class Snapshot(NamedTuple):
+    version: int
+    loaded_at: float
+    values: Dict[str, Any]  # name -> whatever that name's builder returned (treat as immutable)
+
+_builders: Dict[str, Callable[[], Any]] = {}
+_lock = threading.RLock()  # reentrant: a SIGHUP can land while the main thread holds it
+_current = Snapshot(0, 0.0, {})
+
+load_dotenv(override=True)  # once per process; reload() re-reads it
+
+def register(name: str, build: Callable[[], Any]) -> None:
+    """Add a config builder; its value is built now and again on every reload()."""
+    global _current
+    with _lock:
+        _builders[name] = build
+        cur = _current
+        _current = Snapshot(cur.version, cur.loaded_at or time.time(), {**cur.values, name: build()})
+
+def get(name: str) -> Any:
+    """Current value for `name` (one dict read; never rebuilds)."""
+    return _current.values[name]
+
+def current() -> Snapshot:
+    return _current
+
+def reload() -> Snapshot:
+    """
+    Re-read `.env` and rebuild every registered config, then swap them in as one new
+    version. Readers see either the old snapshot or the new one, never a mix. If a builder
+    raises, the old snapshot stays in place.
+    """
+    global _current
+    with _lock:
+        load_dotenv(override=True)
+        values = {name: build() for name, build in _builders.items()}
+        _current = Snapshot(_current.version + 1, time.time(), values)
+    log.info("config reloaded: version %d (%s)", _current.version, ", ".join(sorted(values)))
+    return _current
+
+def install_sighup() -> bool:
+    """Reload on SIGHUP (POSIX, main thread only). Returns whether the handler was installed."""
+    if not hasattr(signal, "SIGHUP"): return False
+    try:
+        signal.signal(signal.SIGHUP, lambda *_: reload())
+    except ValueError:  # not the main thread
+        return False
+    return True
+
+def describe() -> Dict[str, Any]:
+    snap = _current
+    names: List[str] = sorted(snap.values)
+    return {"version": snap.version, "loaded_at": snap.loaded_at, "configs": names}
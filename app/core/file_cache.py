@@ -0,0 +1,81 @@
+from __future__ import annotations
+import os, threading, time
+from pathlib import Path
+from typing import Any, Callable, Generic, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# (st_mtime_ns, st_size, st_ino) or None when the file is absent
+Signature = Optional[Tuple[int, int, int]]
+
+def file_signature(path: Path) -> Signature:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+class WatchedFile(Generic[T]):
+    """
+    Process-resident view of a small file.
+
+    The loaded value is reused until the file's (mtime, size, inode) signature changes.
+    The signature itself is only re-checked every `revalidate_seconds`, so hot callers
+    do no filesystem work at all between checks. Writers that go through `store()`/`clear()`
+    update the cached value immediately (write-through).
+    """
+
+    def __init__(self, path: Path, loader: Callable[[Path], T], default: Callable[[], T],
+                 revalidate_seconds: float = 1.0):
+        self.path = Path(path)
+        self._loader = loader
+        self._default = default
+        self._revalidate = max(0.0, float(revalidate_seconds))
+        self._lock = threading.Lock()
+        self._sig: Signature = None
+        self._value: T = default()
+        self._checked_at = float("-inf")
+        self.version = 0
+
+    def _reload_locked(self, sig: Signature) -> None:
+        if sig is None:
+            value = self._default()
+        else:
+            try: value = self._loader(self.path)
+            except Exception: value = self._default()
+        self._sig, self._value = sig, value
+        self.version += 1
+
+    def get(self) -> T:
+        now = time.monotonic()
+        if now - self._checked_at < self._revalidate:
+            return self._value
+        with self._lock:
+            if now - self._checked_at >= self._revalidate:
+                sig = file_signature(self.path)
+                if sig != self._sig or self.version == 0:
+                    self._reload_locked(sig)
+                self._checked_at = now
+            return self._value
+
+    def store(self, content: str, value: Any) -> None:
+        """Write `content` to disk and publish `value` without a re-read."""
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text(content, encoding="utf-8")
+            self._sig, self._value = file_signature(self.path), value
+            self._checked_at = time.monotonic()
+            self.version += 1
+
+    def clear(self) -> None:
+        """Remove the file and reset to the default value."""
+        with self._lock:
+            self.path.unlink(missing_ok=True)
+            self._sig, self._value = None, self._default()
+            self._checked_at = time.monotonic()
+            self.version += 1
+
+    def invalidate(self) -> None:
+        """Force the next `get()` to re-stat the file."""
+        with self._lock:
+            self._checked_at = float("-inf")
@@ -0,0 +1,40 @@
+from __future__ import annotations
+import os
+from pathlib import Path
+from typing import Union
+
+try:  # POSIX
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+try:  # Windows
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+PathLike = Union[str, Path]
+
+class FileLock:
+    """Exclusive advisory lock on `fd` (flock on POSIX, msvcrt.locking on byte 0 on Windows)."""
+
+    def __init__(self, fd: int):
+        self.fd = fd
+
+    def __enter__(self) -> None:
+        if fcntl is not None: fcntl.flock(self.fd, fcntl.LOCK_EX)
+        else: os.lseek(self.fd, 0, os.SEEK_SET); msvcrt.locking(self.fd, msvcrt.LK_LOCK, 1)
+
+    def __exit__(self, *exc) -> None:
+        if fcntl is not None: fcntl.flock(self.fd, fcntl.LOCK_UN)
+        else: os.lseek(self.fd, 0, os.SEEK_SET); msvcrt.locking(self.fd, msvcrt.LK_UNLCK, 1)
+
+class PathLock(FileLock):
+    """FileLock on a dedicated `<path>` lock file (created on first use, never removed)."""
+
+    def __init__(self, path: PathLike):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        super().__init__(os.open(str(path), os.O_RDWR | os.O_CREAT, 0o644))
+
+    def close(self) -> None:
+        try: os.close(self.fd)
+        except OSError: pass
@@ -0,0 +1,249 @@
+from __future__ import annotations
+import mmap, os, sqlite3, struct, threading, time
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Union
+
+from app.core.filelock import FileLock as _FileLock, fcntl, msvcrt
+
+PathLike = Union[str, Path]
+
+SLOTS = 128              # one slot per second; longest supported window is SLOTS - 1 seconds
+_MAGIC = b"ORNRATE1"
+_HEADER = struct.Struct("<8sd")   # magic, last_order_ts (0.0 = never)
+_SLOT = struct.Struct("<qq")      # epoch second, count
+_RING = struct.Struct("<%dq" % (2 * SLOTS))
+_SIZE = _HEADER.size + SLOTS * _SLOT.size
+
+def _window_start(now: float, window_seconds: float) -> int:
+    if not 0 < window_seconds < SLOTS:
+        raise ValueError(f"window_seconds must be in (0, {SLOTS})")
+    return int(now) - int(window_seconds) + 1  # whole seconds in (now - window, now]
+
+class Acquired(NamedTuple):
+    granted: int      # orders admitted (and recorded) by this call
+    count: int        # orders already in the window before this call
+    throttled: bool   # refused because the last order was less than throttle_seconds ago
+
+def _grant(n: int, count: int, last: Optional[float], now: float, limit: Optional[int],
+           throttle_seconds: float) -> Acquired:
+    if throttle_seconds > 0 and last and now - last < throttle_seconds:
+        return Acquired(0, count, True)
+    granted = n if limit is None else max(0, min(n, int(limit) - count))
+    return Acquired(granted, count, False)
+
+class RateState:
+    """
+    Order-rate state for the throttle and orders-per-minute gates.
+
+    `count(window)` is a sliding window over per-second buckets (not a fixed clock minute);
+    `record(n)` adds `n` orders now and stamps the last-order time. `try_acquire` is the
+    admission path. It checks the throttle and the window limit, then records what it admits,
+    all as one atomic step, so workers racing at `limit - 1` cannot all pass. This base class is
+    process-local; MmapRateState and SqliteRateState share the state across uvicorn workers.
+    """
+    backend = "memory"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[int, int] = {}
+        self._last: Optional[float] = None
+
+    def count(self, window_seconds: float = 60.0, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        lo = _window_start(now, window_seconds); hi = int(now)
+        with self._lock:
+            for s in [s for s in self._buckets if s <= hi - SLOTS]: del self._buckets[s]
+            return sum(c for s, c in self._buckets.items() if lo <= s <= hi)
+
+    def record(self, n: int = 1, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        with self._lock:
+            if n: self._buckets[int(now)] = self._buckets.get(int(now), 0) + n
+            self._last = now
+
+    def try_acquire(self, n: int = 1, limit: Optional[int] = None, window_seconds: float = 60.0,
+                    throttle_seconds: float = 0.0, now: Optional[float] = None) -> Acquired:
+        """Admit up to `n` orders: none if throttled, else as many as fit under `limit` in the window."""
+        now = time.time() if now is None else now
+        lo = _window_start(now, window_seconds); hi = int(now)
+        with self._lock:
+            count = sum(c for s, c in self._buckets.items() if lo <= s <= hi)
+            got = _grant(n, count, self._last, now, limit, throttle_seconds)
+            if got.granted:
+                self._buckets[hi] = self._buckets.get(hi, 0) + got.granted
+                self._last = now
+        return got
+
+    def last_order_ts(self) -> Optional[float]:
+        with self._lock:
+            return self._last
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear(); self._last = None
+
+    def close(self) -> None:
+        pass
+
+class MmapRateState(RateState):
+    """
+    Fixed-size memory-mapped file: a header with the last-order time plus a ring of SLOTS
+    (second, count) buckets indexed by `second % SLOTS`. Every access is a few struct reads
+    under an exclusive file lock (flock / msvcrt.locking) plus a thread lock, so updates from
+    all workers on the host are atomic and a check costs microseconds.
+    """
+    backend = "mmap"
+
+    def __init__(self, path: PathLike):
+        if fcntl is None and msvcrt is None:  # pragma: no cover
+            raise OSError("no file locking available")
+        self._lock = threading.Lock()
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._flock = _FileLock(self._fd)
+        with self._lock, self._flock:
+            if os.fstat(self._fd).st_size < _SIZE:
+                os.ftruncate(self._fd, _SIZE)
+            self._mm = mmap.mmap(self._fd, _SIZE)
+            if self._mm[:len(_MAGIC)] != _MAGIC:
+                self._mm[:] = bytes(_SIZE)
+                _HEADER.pack_into(self._mm, 0, _MAGIC, 0.0)
+
+    def count(self, window_seconds: float = 60.0, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        lo = _window_start(now, window_seconds); hi = int(now)
+        with self._lock, self._flock:
+            ring = _RING.unpack_from(self._mm, _HEADER.size)
+        # a slot holds the second it was last written for, so stale laps fall outside [lo, hi]
+        return sum(c for sec, c in zip(ring[0::2], ring[1::2]) if lo <= sec <= hi)
+
+    def record(self, n: int = 1, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        s = int(now); off = _HEADER.size + (s % SLOTS) * _SLOT.size
+        with self._lock, self._flock:
+            mm = self._mm
+            if n:
+                sec, c = _SLOT.unpack_from(mm, off)
+                _SLOT.pack_into(mm, off, s, (c if sec == s else 0) + n)
+            _HEADER.pack_into(mm, 0, _MAGIC, now)
+
+    def try_acquire(self, n: int = 1, limit: Optional[int] = None, window_seconds: float = 60.0,
+                    throttle_seconds: float = 0.0, now: Optional[float] = None) -> Acquired:
+        now = time.time() if now is None else now
+        lo = _window_start(now, window_seconds); s = int(now)
+        off = _HEADER.size + (s % SLOTS) * _SLOT.size
+        with self._lock, self._flock:  # one flock across the read and the write
+            mm = self._mm
+            ring = _RING.unpack_from(mm, _HEADER.size)
+            count = sum(c for sec, c in zip(ring[0::2], ring[1::2]) if lo <= sec <= s)
+            got = _grant(n, count, _HEADER.unpack_from(mm, 0)[1] or None, now, limit, throttle_seconds)
+            if got.granted:
+                sec, c = _SLOT.unpack_from(mm, off)
+                _SLOT.pack_into(mm, off, s, (c if sec == s else 0) + got.granted)
+                _HEADER.pack_into(mm, 0, _MAGIC, now)
+        return got
+
+    def last_order_ts(self) -> Optional[float]:
+        with self._lock, self._flock:
+            ts = _HEADER.unpack_from(self._mm, 0)[1]
+        return ts or None
+
+    def reset(self) -> None:
+        with self._lock, self._flock:
+            self._mm[:] = bytes(_SIZE)
+            _HEADER.pack_into(self._mm, 0, _MAGIC, 0.0)
+
+    def close(self) -> None:
+        with self._lock:
+            try: self._mm.close()
+            finally: os.close(self._fd)
+
+class SqliteRateState(RateState):
+    """SQLite (WAL) fallback for hosts without usable mmap/file locks, e.g. some network filesystems."""
+    backend = "sqlite"
+
+    def __init__(self, path: PathLike):
+        self._lock = threading.Lock()
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS rate_buckets (second INTEGER PRIMARY KEY, count INTEGER NOT NULL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS rate_meta (k TEXT PRIMARY KEY, v REAL)")
+
+    def count(self, window_seconds: float = 60.0, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        lo = _window_start(now, window_seconds)
+        with self._lock:
+            row = self._db.execute("SELECT COALESCE(SUM(count), 0) FROM rate_buckets WHERE second BETWEEN ? AND ?",
+                                   (lo, int(now))).fetchone()
+        return int(row[0])
+
+    def record(self, n: int = 1, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        s = int(now)
+        with self._lock:
+            db = self._db
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                if n:
+                    db.execute("INSERT INTO rate_buckets(second, count) VALUES(?, ?) "
+                               "ON CONFLICT(second) DO UPDATE SET count = count + excluded.count", (s, n))
+                    db.execute("DELETE FROM rate_buckets WHERE second <= ?", (s - SLOTS,))
+                db.execute("INSERT INTO rate_meta(k, v) VALUES('last_order_ts', ?) "
+                           "ON CONFLICT(k) DO UPDATE SET v = excluded.v", (now,))
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK"); raise
+
+    def try_acquire(self, n: int = 1, limit: Optional[int] = None, window_seconds: float = 60.0,
+                    throttle_seconds: float = 0.0, now: Optional[float] = None) -> Acquired:
+        now = time.time() if now is None else now
+        lo = _window_start(now, window_seconds); s = int(now)
+        with self._lock:
+            db = self._db
+            db.execute("BEGIN IMMEDIATE")  # the write lock is held from the reads through the insert
+            try:
+                count = db.execute("SELECT COALESCE(SUM(count), 0) FROM rate_buckets WHERE second BETWEEN ? AND ?",
+                                   (lo, s)).fetchone()[0]
+                row = db.execute("SELECT v FROM rate_meta WHERE k = 'last_order_ts'").fetchone()
+                got = _grant(n, int(count), row[0] if row else None, now, limit, throttle_seconds)
+                if got.granted:
+                    db.execute("INSERT INTO rate_buckets(second, count) VALUES(?, ?) "
+                               "ON CONFLICT(second) DO UPDATE SET count = count + excluded.count", (s, got.granted))
+                    db.execute("DELETE FROM rate_buckets WHERE second <= ?", (s - SLOTS,))
+                    db.execute("INSERT INTO rate_meta(k, v) VALUES('last_order_ts', ?) "
+                               "ON CONFLICT(k) DO UPDATE SET v = excluded.v", (now,))
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK"); raise
+        return got
+
+    def last_order_ts(self) -> Optional[float]:
+        with self._lock:
+            row = self._db.execute("SELECT v FROM rate_meta WHERE k = 'last_order_ts'").fetchone()
+        return row[0] if row else None
+
+    def reset(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM rate_buckets"); self._db.execute("DELETE FROM rate_meta")
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+def open_rate_state(path: PathLike, backend: str = "auto") -> RateState:
+    """
+    backend: "mmap" (`path`), "sqlite" (`path` with a .sqlite suffix), "memory" (per process,
+    the old behaviour) or "auto" (mmap, falling back to SQLite if the file cannot be mapped/locked).
+    """
+    backend = (backend or "auto").lower()
+    if backend == "memory": return RateState()
+    if backend == "sqlite": return SqliteRateState(Path(path).with_suffix(".sqlite"))
+    if backend == "mmap": return MmapRateState(path)
+    try:
+        return MmapRateState(path)
+    except (OSError, ValueError):
+        return SqliteRateState(Path(path).with_suffix(".sqlite"))
@@ -1,9 +1,13 @@
 from __future__ import annotations
 import json, os, time
 from dataclasses import dataclass, asdict
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Dict, Optional
+from app.core import audit, rules
+from app.core.file_cache import WatchedFile
+from app.core.rate_state import open_rate_state
+from app.core.session_calendar import HolidaySpec, SessionCalendar, calendar_for, get_calendar, load_holiday_file
 from app.core.settings import settings
 
 BASE_DIR = Path(__file__).resolve().parents[2]
@@ -16,6 +20,9 @@ COOLOFF_FLAG_FILE = CFG_DIR / "cooloff_active.flag"
 RISK_PRESET_FILE = CFG_DIR / "risk_preset.json"
 CIRCUIT_BREAKER_FILE = CFG_DIR / "circuit_breaker.lock"
 HOLIDAY_FILE = CFG_DIR / "us_holidays.json"
+BREAKER_LOCK_FILE = LOG_DIR / "circuit_breaker.lock"
+DAILY_PNL_FILE = LOG_DIR / "daily_pnl_now.txt"
+RATE_STATE_FILE = LOG_DIR / "rate_state.bin"
 
 DEFAULT_PRESET = {
     "ORDER_THROTTLE_SECONDS": settings.ORDER_THROTTLE_SECONDS,
@@ -31,7 +38,8 @@ DEFAULT_PRESET = {
     "COOLOFF_AFTER_DRAWDOWN": settings.COOLOFF_AFTER_DRAWDOWN,
 }
 
-_rolling_min_buckets: Dict[int, int] = {}
+# Orders-per-minute window, shared by every worker on this host (see app.core.rate_state)
+rate_state = open_rate_state(RATE_STATE_FILE, settings.RATE_STATE_BACKEND)
 
 def _now_utc(): return datetime.now(timezone.utc)
 def _read_float(path: Path):
@@ -39,40 +47,84 @@ def _read_float(path: Path):
     except Exception: return None
 def _write_text(path: Path, content: str):
     path.parent.mkdir(parents=True, exist_ok=True); path.write_text(content, encoding="utf-8")
-def _append_jsonl(path: Path, obj: Dict[str, Any]):
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("a", encoding="utf-8") as f: f.write(json.dumps(obj, ensure_ascii=False) + "\n")
-
-def _is_us_holiday(d: datetime) -> bool:
-    try:
-        if HOLIDAY_FILE.exists():
-            days = json.loads(HOLIDAY_FILE.read_text(encoding="utf-8"))
-            return d.strftime("%Y-%m-%d") in set(days)
-    except Exception: pass
-    y = d.year
-    return d.strftime("%Y-%m-%d") in {f"{y}-01-01", f"{y}-07-04", f"{y}-12-25"}
-
-def _is_rth_open(now_et: datetime, preset: Dict[str, Any]) -> bool:
-    start = preset.get("RTH_START", "09:30"); end = preset.get("RTH_END", "16:00")
-    hhmm = now_et.strftime("%H:%M"); return start <= hhmm <= end
-
-def _get_preset() -> Dict[str, Any]:
-    if RISK_PRESET_FILE.exists():
-        try: return {**DEFAULT_PRESET, **json.loads(RISK_PRESET_FILE.read_text(encoding="utf-8"))}
-        except Exception: return DEFAULT_PRESET.copy()
-    return DEFAULT_PRESET.copy()
-
-def _save_preset(p): _write_text(RISK_PRESET_FILE, json.dumps(p, indent=2))
-
-def _orders_in_last_minute() -> int:
-    now = int(time.time()); minute = now // 60
-    for k in list(_rolling_min_buckets.keys()):
-        if k < minute - 1: _rolling_min_buckets.pop(k, None)
-    return _rolling_min_buckets.get(minute, 0)
-
-def _bump_orders_minute_counter():
-    now = int(time.time()); minute = now // 60
-    _rolling_min_buckets[minute] = _rolling_min_buckets.get(minute, 0) + 1
+def _append_jsonl(path: Path, obj: Dict[str, Any]): audit.append(path, obj)
+def _append_jsonl_many(path: Path, objs): audit.append_many(path, objs)
+
+def _load_preset(path: Path) -> Dict[str, Any]:
+    return {**DEFAULT_PRESET, **json.loads(path.read_text(encoding="utf-8"))}
+
+class RiskState:
+    """
+    Process-resident copy of everything evaluate_order needs from disk: preset, holiday calendar,
+    throttle timestamp, daily PnL and the circuit-breaker / cool-off flags.
+
+    Every file is only re-read when its (mtime, size, inode) signature changes, so a steady-state
+    evaluation does no disk reads. The blocking-gate files (throttle timestamp, daily PnL, breaker,
+    cool-off) are written by other workers/tools, so they are re-stat'ed on every access and never
+    served stale. The preset and holiday calendar are re-stat'ed at most every
+    RISK_STATE_REVALIDATE_SECONDS (0 = every access): an edit made outside this process takes up to
+    that long to apply. Updates made through this module write through to disk and to the cache in
+    one step; `version` changes whenever any of the cached values does.
+    """
+
+    def __init__(self, revalidate_seconds: float = settings.RISK_STATE_REVALIDATE_SECONDS):
+        r = revalidate_seconds
+        self.preset_file = WatchedFile(RISK_PRESET_FILE, _load_preset, DEFAULT_PRESET.copy, r)
+        self.holidays_file = WatchedFile(HOLIDAY_FILE, load_holiday_file, lambda: None, r)
+        self.last_order_file = WatchedFile(LAST_ORDER_TS_FILE, _read_float, lambda: None, 0)
+        self.daily_pnl_file = WatchedFile(DAILY_PNL_FILE, _read_float, lambda: None, 0)
+        self.breaker_file = WatchedFile(BREAKER_LOCK_FILE, lambda _: True, lambda: False, 0)
+        self.cooloff_file = WatchedFile(COOLOFF_FLAG_FILE, lambda _: True, lambda: False, 0)
+        self._files = (self.preset_file, self.holidays_file, self.last_order_file,
+                       self.daily_pnl_file, self.breaker_file, self.cooloff_file)
+
+    @property
+    def preset(self) -> Dict[str, Any]: return self.preset_file.get()
+    @property
+    def holidays(self) -> Optional[HolidaySpec]: return self.holidays_file.get()
+    @property
+    def last_order_ts(self) -> Optional[float]: return self.last_order_file.get()
+    @property
+    def daily_pnl(self) -> Optional[float]: return self.daily_pnl_file.get()
+    @property
+    def circuit_breaker(self) -> bool: return self.breaker_file.get()
+    @property
+    def cooloff(self) -> bool: return self.cooloff_file.get()
+    @property
+    def version(self) -> int: return sum(w.version for w in self._files)
+
+    def save_preset(self, p: Dict[str, Any]): self.preset_file.store(json.dumps(p, indent=2), p)
+    def mark_order(self, ts: float): self.last_order_file.store(str(ts), ts)
+    def trip_breaker(self): self.breaker_file.store("daily_breach", True)
+    def clear_breaker(self):
+        self.breaker_file.clear()
+        if CIRCUIT_BREAKER_FILE.exists(): CIRCUIT_BREAKER_FILE.unlink(missing_ok=True)
+    def set_cooloff(self, active: bool):
+        if active: self.cooloff_file.store("1", True)
+        else: self.cooloff_file.clear()
+    def calendar(self, preset: Dict[str, Any]) -> SessionCalendar:
+        """Compiled session calendar for the preset's TIMEZONE/RTH hours and the current holiday file."""
+        return calendar_for(preset.get("TIMEZONE"), preset.get("RTH_START"), preset.get("RTH_END"),
+                            self.holidays, settings.SESSION_TZ)
+    def invalidate(self):
+        for w in self._files: w.invalidate()
+
+risk_state = RiskState()
+
+def _get_preset() -> Dict[str, Any]: return dict(risk_state.preset)
+
+def _save_preset(p): risk_state.save_preset(p)
+
+def _orders_in_last_minute() -> int: return rate_state.count(60)
+
+def _claim_orders(preset: Dict[str, Any], n: int = 1):
+    """
+    Atomically re-check the throttle and orders-per-minute gates against the shared rate state and
+    record up to `n` admitted orders. The pipeline's checks are a fast pre-filter; this is what
+    stops two workers that both saw `limit - 1` (or both saw the throttle clear) from both allowing.
+    """
+    return rate_state.try_acquire(n, int(preset.get("ORDERS_PER_MIN_LIMIT", 15)), 60,
+                                  int(preset.get("ORDER_THROTTLE_SECONDS", 3)))
 
 from typing import Dict as _Dict
 @dataclass
@@ -86,64 +138,86 @@ class RiskCheckResult:
 def current_preset() -> Dict[str, Any]: return _get_preset()
 def update_preset(patch: Dict[str, Any]) -> Dict[str, Any]:
     p = _get_preset(); p.update({k: v for k, v in patch.items() if k in DEFAULT_PRESET}); _save_preset(p); return p
-def clear_circuit_breaker():
-    if CIRCUIT_BREAKER_FILE.exists(): CIRCUIT_BREAKER_FILE.unlink(missing_ok=True)
-def set_cooloff(active: bool):
-    if active: _write_text(COOLOFF_FLAG_FILE, "1")
-    else:
-        if COOLOFF_FLAG_FILE.exists(): COOLOFF_FLAG_FILE.unlink(missing_ok=True)
-
-def evaluate_order(symbol: str, side: str, qty: float, order_type: str, price: Optional[float], meta_overrides=None) -> RiskCheckResult:
-    preset = _get_preset(); 
-    if meta_overrides: preset = {**preset, **meta_overrides}
-    now_utc = _now_utc(); now_et = now_utc - timedelta(hours=4)  # naive ET
-
-    session_ok = True; session_reason = "ok"
-    if bool(preset.get("SESSION_ENABLED", True)):
-        if _is_us_holiday(now_et): session_ok = False; session_reason = "holiday"
-        elif not _is_rth_open(now_et, preset) and not (preset.get("ALLOW_PREMARKET") or preset.get("ALLOW_AFTERHOURS")):
-            session_ok = False; session_reason = "closed"
-
-    throttle_secs = int(preset.get("ORDER_THROTTLE_SECONDS", 3))
-    last_ts = _read_float(LAST_ORDER_TS_FILE) or 0.0
-    throttle_ok = True; throttle_reason = "ok"
-    if throttle_secs > 0 and last_ts and (time.time() - last_ts) < throttle_secs:
-        throttle_ok = False; throttle_reason = "throttled"
-
-    opm_limit = int(preset.get("ORDERS_PER_MIN_LIMIT", 15))
-    opm_now = _orders_in_last_minute()
-    opm_ok = opm_now < opm_limit; opm_reason = f"{opm_now}/{opm_limit}" if not opm_ok else "ok"
-
+def clear_circuit_breaker(): risk_state.clear_breaker()
+def set_cooloff(active: bool): risk_state.set_cooloff(active)
+
+class _StateSources:
+    """app.core.rules state adapter over the process-resident RiskState and the shared rate state."""
+    def __init__(self, state: RiskState): self.state = state
+    def session_state(self, now: float, tz, rth_start, rth_end, extended: bool) -> str:
+        cal = calendar_for(tz, rth_start, rth_end, self.state.holidays, settings.SESSION_TZ)
+        if cal.is_holiday(now): return "holiday"
+        if not cal.is_trading_day(now): return "closed"
+        return "ok" if extended or cal.is_open(now) else "closed"
+    def cooloff(self) -> bool: return self.state.cooloff
+    def circuit_breaker(self) -> bool: return self.state.circuit_breaker
+    def last_order_ts(self) -> Optional[float]: return self.state.last_order_ts
+    def orders_in_window(self, seconds: int) -> int: return rate_state.count(seconds)
+    def day_pnl(self) -> Optional[float]: return self.state.daily_pnl
+
+def _rule_config(preset: Dict[str, Any]) -> Dict[str, Any]:
+    """Preset -> app.core.rules constants (compiled once per distinct preset)."""
+    return {
+        "SESSION_CALENDAR": bool(preset.get("SESSION_ENABLED", True)),
+        "EXTENDED_HOURS": bool(preset.get("ALLOW_PREMARKET") or preset.get("ALLOW_AFTERHOURS")),
+        "TIMEZONE": preset.get("TIMEZONE") or settings.SESSION_TZ,
+        "RTH_START": preset.get("RTH_START", "09:30"), "RTH_END": preset.get("RTH_END", "16:00"),
+        "ORDER_THROTTLE_SECONDS": int(preset.get("ORDER_THROTTLE_SECONDS", 3)),
+        "ORDERS_PER_MIN_LIMIT": int(preset.get("ORDERS_PER_MIN_LIMIT", 15)),
+        "MAX_POSITION_RISK": float(preset.get("MAX_POSITION_RISK", 2500.0)),
+        "DAILY_LOSS_LIMIT": float(preset.get("DAILY_LOSS_LIMIT", 500.0)),
+        "CIRCUIT_BREAKER": True,
+    }
+
+_GATES = ("session", "throttle", "daily_loss_limit", "cooloff")
+_REASON_KEYS = ("session", "throttle", "orders_per_min", "max_position_risk", "daily_loss_limit", "cooloff")
+
+def _common_gates(state: RiskState, preset: Dict[str, Any]) -> Dict[str, str]:
+    """Order-independent gates (session, throttle, daily loss, cool-off) as reason strings; "ok" = pass."""
+    outs = rules.compile_pipeline(_rule_config(preset), _GATES).run(rules.Order(), _StateSources(state))
+    return {o.name: o.reason for o in outs}
+
+def _audit_record(symbol, side, qty, order_type, price, notional, reasons, ok, preset) -> Dict[str, Any]:
+    return {"audit_id": audit.new_audit_id(), "ts": datetime.now().isoformat(timespec="seconds"), "symbol": symbol, "side": side, "qty": qty, "type": order_type,
+            "price": price, "notional": notional, "reasons": reasons, "result": "ALLOW" if ok else "BLOCK",
+            "preset": {k: preset.get(k) for k in DEFAULT_PRESET.keys()}}
+
+def _apply_outcome(state: RiskState, preset: Dict[str, Any], allowed: int, daily_reason: str):
+    """
+    Persist the side effects of an evaluation: the throttle timestamp file on allow, breaker/cool-off on
+    loss. The per-minute count was already recorded by `_claim_orders`.
+    """
+    if allowed:
+        state.mark_order(time.time())
+    elif daily_reason != "ok":
+        if not state.circuit_breaker: state.trip_breaker()
+        if preset.get("COOLOFF_AFTER_DRAWDOWN", 0) and not state.cooloff: state.set_cooloff(True)
+
+def evaluate_order(symbol: str, side: str, qty: float, order_type: str, price: Optional[float], meta_overrides=None,
+                   short_circuit: bool = False) -> RiskCheckResult:
+    """
+    Run the app.core.rules pipeline for one order. With `short_circuit`, checks after the first
+    block are not evaluated and report "skipped".
+    """
+    state = risk_state
+    preset = {**state.preset, **(meta_overrides or {})}  # never hand out the cached dict
     notional = (price or 0.0) * float(qty or 0.0)
-    max_pos = float(preset.get("MAX_POSITION_RISK", 2500.0))
-    notional_ok = notional <= max_pos if max_pos > 0 else True
-    notional_reason = f"{notional:.2f}>{max_pos:.2f}" if not notional_ok else "ok"
-
-    daily_pnl_file = LOG_DIR / "daily_pnl_now.txt"
-    val = _read_float(daily_pnl_file) or 0.0
-    daily_limit = float(preset.get("DAILY_LOSS_LIMIT", 500.0))
-    daily_ok = True; daily_reason = "ok"
-    if daily_limit > 0 and val < -abs(daily_limit): daily_ok = False; daily_reason = f"breach {val:.2f} < {-abs(daily_limit):.2f}"
-    if (LOG_DIR / 'circuit_breaker.lock').exists(): daily_ok = False; daily_reason = "circuit_breaker"
-
-    cooloff_ok = not COOLOFF_FLAG_FILE.exists()
-    cooloff_reason = "ok" if cooloff_ok else "cooloff_active"
-
-    all_ok = session_ok and throttle_ok and opm_ok and notional_ok and daily_ok and cooloff_ok
-    reasons = {"session": session_reason, "throttle": throttle_reason, "orders_per_min": opm_reason,
-               "max_position_risk": notional_reason, "daily_loss_limit": daily_reason, "cooloff": cooloff_reason,
-               "notional": notional, "qty": qty, "price": price}
-
-    audit = {"ts": datetime.now().isoformat(timespec="seconds"), "symbol": symbol, "side": side, "qty": qty, "type": order_type,
-             "price": price, "notional": notional, "reasons": reasons, "result": "ALLOW" if all_ok else "BLOCK",
-             "preset": {k: preset.get(k) for k in DEFAULT_PRESET.keys()}}
-    _append_jsonl(ORDERS_AUDIT_FILE, audit)
+    outs = rules.evaluate(_rule_config(preset), rules.Order(symbol, side, float(qty or 0.0), notional),
+                          _StateSources(state), short_circuit=short_circuit)
 
+    got = {o.name: o.reason for o in outs}
+    all_ok = all(o.passed for o in outs)
+    reasons: Dict[str, Any] = {k: got.get(k, "skipped") for k in _REASON_KEYS}
+    reasons.update({"notional": notional, "qty": qty, "price": price})
     if all_ok:
-        _write_text(LAST_ORDER_TS_FILE, str(time.time())); _bump_orders_minute_counter()
-    else:
-        if reasons["daily_loss_limit"] != "ok": _write_text(LOG_DIR / 'circuit_breaker.lock', 'daily_breach')
-        if preset.get("COOLOFF_AFTER_DRAWDOWN", 0) and reasons["daily_loss_limit"] != "ok":
-            _write_text(COOLOFF_FLAG_FILE, "1")
+        got = _claim_orders(preset)
+        if not got.granted:
+            all_ok = False
+            if got.throttled: reasons["throttle"] = "throttled"
+            else: reasons["orders_per_min"] = f"{got.count}/{int(preset.get('ORDERS_PER_MIN_LIMIT', 15))}"
+
+    _append_jsonl(ORDERS_AUDIT_FILE, _audit_record(symbol, side, qty, order_type, price, notional, reasons, all_ok, preset))
+    daily = reasons["daily_loss_limit"]
+    _apply_outcome(state, preset, 1 if all_ok else 0, "ok" if daily == "skipped" else daily)
 
     return RiskCheckResult(ok=all_ok, reasons=reasons, preset=preset)
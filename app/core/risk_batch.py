@@ -0,0 +1,102 @@
+from __future__ import annotations
+from itertools import accumulate
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.core.risk import (
+    ORDERS_AUDIT_FILE, RiskCheckResult, risk_state,
+    _append_jsonl_many, _apply_outcome, _audit_record, _claim_orders, _common_gates, _orders_in_last_minute,
+)
+
+try:  # NumPy is optional; the pure-Python path gives identical results
+    import numpy as np
+except Exception:  # pragma: no cover - exercised only without numpy
+    np = None
+
+def _vector_gates(qty: Sequence[float], price: Sequence[float], max_pos: float, common_ok: bool,
+                  opm_now: int, opm_limit: int) -> Tuple[List[float], List[bool], List[int], List[bool]]:
+    """
+    Per-order notional / max-position / orders-per-minute gates over the whole batch.
+
+    Orders are admitted in request order: order i sees `opm_now` plus the number of earlier
+    orders in the batch that passed every other gate, exactly as if they had been evaluated
+    one by one.
+    Returns (notional, notional_ok, opm_count, ok).
+    """
+    if np is not None:
+        q = np.asarray(qty, dtype=np.float64); p = np.asarray(price, dtype=np.float64)
+        notional = q * p
+        notional_ok = notional <= max_pos if max_pos > 0 else np.ones(len(q), dtype=bool)
+        base_ok = notional_ok & common_ok
+        prior = np.cumsum(base_ok, dtype=np.int64) - base_ok
+        opm_count = opm_now + prior
+        ok = base_ok & (opm_count < opm_limit)
+        return notional.tolist(), notional_ok.tolist(), opm_count.tolist(), ok.tolist()
+
+    notional = [a * b for a, b in zip(qty, price)]
+    notional_ok = [n <= max_pos if max_pos > 0 else True for n in notional]
+    base_ok = [common_ok and n for n in notional_ok]
+    passed = list(accumulate(int(b) for b in base_ok))
+    opm_count = [opm_now + c - int(b) for c, b in zip(passed, base_ok)]
+    ok = [b and c < opm_limit for b, c in zip(base_ok, opm_count)]
+    return notional, notional_ok, opm_count, ok
+
+def evaluate_batch(orders: List[Dict[str, Any]], meta_overrides=None) -> Tuple[List[RiskCheckResult], Dict[str, Any]]:
+    """
+    Batch counterpart of app.core.risk.evaluate_order.
+
+    `orders` are dicts with symbol/side/qty/order_type/price. Order-independent gates are computed
+    once; notional, max-position and orders-per-minute run as array operations over the batch.
+
+    Throttle: the batch counts as ONE submission. ORDER_THROTTLE_SECONDS is checked once against the
+    previous submission (a throttled batch blocks every leg) and is not applied between legs; the
+    timestamp is set once if any leg is allowed. ORDERS_PER_MIN_LIMIT still counts every allowed leg.
+    The legs that pass are then claimed in one atomic step (`_claim_orders`); if another worker
+    took slots in the meantime, the trailing legs that no longer fit are blocked on orders_per_min.
+    All audit lines go out in one write.
+    """
+    state = risk_state
+    preset = {**state.preset, **(meta_overrides or {})}  # never hand out the cached dict
+    gates = _common_gates(state, preset)
+    common_ok = all(v == "ok" for v in gates.values())
+
+    opm_limit = int(preset.get("ORDERS_PER_MIN_LIMIT", 15))
+    max_pos = float(preset.get("MAX_POSITION_RISK", 2500.0))
+    qty = [float(o.get("qty") or 0.0) for o in orders]
+    price = [float(o.get("price") or 0.0) for o in orders]
+    notional, notional_ok, opm_count, ok = _vector_gates(qty, price, max_pos, common_ok,
+                                                         _orders_in_last_minute(), opm_limit)
+    throttled: set = set()
+    passing = [i for i, x in enumerate(ok) if x]
+    if passing:
+        got = _claim_orders(preset, len(passing))
+        for k, i in enumerate(passing):
+            if got.throttled: throttled.add(i); ok[i] = False
+            else: opm_count[i] = got.count + k; ok[i] = k < got.granted
+
+    results: List[RiskCheckResult] = []; audits = []
+    blocked_by: Dict[str, int] = {}
+    for i, o in enumerate(orders):
+        opm_reason = "ok" if opm_count[i] < opm_limit else f"{opm_count[i]}/{opm_limit}"
+        notional_reason = "ok" if notional_ok[i] else f"{notional[i]:.2f}>{max_pos:.2f}"
+        throttle_reason = "throttled" if i in throttled else gates["throttle"]
+        reasons = {"session": gates["session"], "throttle": throttle_reason, "orders_per_min": opm_reason,
+                   "max_position_risk": notional_reason, "daily_loss_limit": gates["daily_loss_limit"],
+                   "cooloff": gates["cooloff"], "notional": notional[i], "qty": o.get("qty"), "price": o.get("price")}
+        if not ok[i]:
+            for k in ("session", "throttle", "orders_per_min", "max_position_risk", "daily_loss_limit", "cooloff"):
+                if reasons[k] != "ok": blocked_by[k] = blocked_by.get(k, 0) + 1
+        audits.append(_audit_record(o.get("symbol"), o.get("side"), o.get("qty"), o.get("order_type"),
+                                    o.get("price"), notional[i], reasons, ok[i], preset))
+        results.append(RiskCheckResult(ok=ok[i], reasons=reasons, preset=preset))
+
+    if audits: _append_jsonl_many(ORDERS_AUDIT_FILE, audits)
+    allowed = sum(1 for x in ok if x)
+    _apply_outcome(state, preset, allowed, gates["daily_loss_limit"])
+
+    aggregate = {
+        "count": len(orders), "allowed": allowed, "blocked": len(orders) - allowed,
+        "notional_total": float(sum(notional)),
+        "notional_allowed": float(sum(n for n, x in zip(notional, ok) if x)),
+        "blocked_by": blocked_by,
+    }
+    return results, aggregate
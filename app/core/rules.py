@@ -0,0 +1,183 @@
+from __future__ import annotations
+import threading, time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+class Order(NamedTuple):
+    symbol: Optional[str] = None
+    side: Optional[str] = None
+    qty: float = 0.0
+    notional: Optional[float] = None  # None = unknown (market order without a price estimate)
+
+class Outcome(NamedTuple):
+    name: str
+    passed: bool
+    reason: str = "ok"              # short code, "ok" on pass (app.core.risk `reasons` values)
+    detail: Optional[str] = None    # human text (orders preview `checks[].detail`)
+    warn: bool = False              # passed, but could not be fully evaluated
+
+# A compiled check: (order, now, sources) -> Outcome. `sources` is the caller's state adapter:
+#   session_state(now, tz, rth_start, rth_end, extended) -> "ok" | "holiday" | "closed"
+#   cooloff() -> bool, circuit_breaker() -> bool, last_order_ts() -> Optional[float]
+#   orders_in_window(seconds) -> int, day_pnl() -> Optional[float] (may raise)
+CheckFn = Callable[[Order, float, Any], Outcome]
+Factory = Callable[[Dict[str, Any]], Optional[CheckFn]]  # returns None when the config disables the check
+
+_REGISTRY: "OrderedDict[str, Tuple[Factory, bool]]" = OrderedDict()
+
+def register(name: str, order_independent: bool = False) -> Callable[[Factory], Factory]:
+    """Register a check factory. Registration order is evaluation order."""
+    def deco(factory: Factory) -> Factory:
+        _REGISTRY[name] = (factory, order_independent)
+        return factory
+    return deco
+
+def check_names(order_independent: Optional[bool] = None) -> List[str]:
+    return [n for n, (_, oi) in _REGISTRY.items() if order_independent is None or oi == order_independent]
+
+class Pipeline:
+    """A flat list of closures compiled from one config; evaluation does no config lookups."""
+
+    def __init__(self, checks: Sequence[Tuple[str, CheckFn]]):
+        self.names = tuple(n for n, _ in checks)
+        self._fns = tuple(fn for _, fn in checks)
+
+    def run(self, order: Order, sources: Any, now: Optional[float] = None,
+            short_circuit: bool = False) -> List[Outcome]:
+        """All outcomes in registry order; with `short_circuit`, stop after the first block."""
+        now = time.time() if now is None else now
+        out: List[Outcome] = []
+        for fn in self._fns:
+            o = fn(order, now, sources)
+            out.append(o)
+            if short_circuit and not o.passed: break
+        return out
+
+_cache: "OrderedDict[Tuple, Pipeline]" = OrderedDict()
+_cache_lock = threading.Lock()
+CACHE_MAX = 64
+
+def compile_pipeline(cfg: Dict[str, Any], names: Optional[Iterable[str]] = None) -> Pipeline:
+    """
+    Pipeline for `cfg` (hashable values only), reusing the compiled closures while the config
+    is unchanged. `names` restricts it to a subset of the registered checks.
+    """
+    wanted = tuple(check_names()) if names is None else tuple(n for n in _REGISTRY if n in set(names))
+    key = (wanted, tuple(sorted(cfg.items())))
+    with _cache_lock:
+        p = _cache.get(key)
+        if p is not None:
+            _cache.move_to_end(key)
+            return p
+    checks = []
+    for n in wanted:
+        fn = _REGISTRY[n][0](cfg)
+        if fn is not None: checks.append((n, fn))
+    p = Pipeline(checks)
+    with _cache_lock:
+        _cache[key] = p
+        while len(_cache) > CACHE_MAX: _cache.popitem(last=False)
+    return p
+
+def evaluate(cfg: Dict[str, Any], order: Order, sources: Any, now: Optional[float] = None,
+             short_circuit: bool = False) -> List[Outcome]:
+    return compile_pipeline(cfg).run(order, sources, now, short_circuit)
+
+def evaluate_many(cfg: Dict[str, Any], orders: Sequence[Order], sources: Any,
+                  now: Optional[float] = None) -> List[List[Outcome]]:
+    """Order-independent checks run once for the whole list; the rest run per order."""
+    now = time.time() if now is None else now
+    shared = compile_pipeline(cfg, check_names(order_independent=True)).run(Order(), sources, now)
+    per = compile_pipeline(cfg, check_names(order_independent=False))
+    rank = {n: i for i, n in enumerate(_REGISTRY)}
+    return [sorted(shared + per.run(o, sources, now), key=lambda x: rank[x.name]) for o in orders]
+
+def _const(o: Outcome) -> CheckFn:
+    return lambda order, now, src: o
+
+# ---------- built-in checks (registration order = evaluation order) ----------
+
+@register("session", order_independent=True)
+def _session(cfg: Dict[str, Any]) -> Optional[CheckFn]:
+    if not cfg.get("SESSION_ACTIVE", True):
+        return _const(Outcome("session", False, "disabled", "Session disabled"))
+    ok = Outcome("session", True)
+    if not cfg.get("SESSION_CALENDAR", False):
+        return _const(ok)
+    tz, start, end = cfg.get("TIMEZONE"), cfg.get("RTH_START", "09:30"), cfg.get("RTH_END", "16:00")
+    extended = bool(cfg.get("EXTENDED_HOURS", False))
+    def check(order: Order, now: float, src: Any) -> Outcome:
+        st = src.session_state(now, tz, start, end, extended)
+        return ok if st == "ok" else Outcome("session", False, st, f"Market {st}")
+    return check
+
+@register("cooloff", order_independent=True)
+def _cooloff(cfg: Dict[str, Any]) -> Optional[CheckFn]:
+    if cfg.get("FORCE_COOLOFF_BLOCK"):
+        return _const(Outcome("cooloff", False, "cooloff_active", "Forced cool-off block"))
+    ok = Outcome("cooloff", True)
+    if not cfg.get("COOLOFF_ENFORCED", True):
+        return _const(ok)
+    blocked = Outcome("cooloff", False, "cooloff_active", "Cool-off active")
+    return lambda order, now, src: blocked if src.cooloff() else ok
+
+@register("throttle", order_independent=True)
+def _throttle(cfg: Dict[str, Any]) -> Optional[CheckFn]:
+    if cfg.get("FORCE_THROTTLE_BLOCK"):
+        return _const(Outcome("throttle", False, "throttled", "Forced throttle block"))
+    secs = float(cfg.get("ORDER_THROTTLE_SECONDS", 0) or 0)
+    first = Outcome("throttle", True, "ok", "No prior order timestamp")
+    def check(order: Order, now: float, src: Any) -> Outcome:
+        last = src.last_order_ts()
+        if not last: return first
+        elapsed = now - last
+        if elapsed < secs:
+            return Outcome("throttle", False, "throttled", f"Throttle: wait {int(secs - int(elapsed))}s")
+        return Outcome("throttle", True, "ok", f"Elapsed {int(elapsed)}s")
+    return check
+
+@register("orders_per_min")
+def _orders_per_min(cfg: Dict[str, Any]) -> Optional[CheckFn]:
+    limit = cfg.get("ORDERS_PER_MIN_LIMIT")
+    if limit is None: return None
+    limit = int(limit)
+    ok = Outcome("orders_per_min", True)
+    def check(order: Order, now: float, src: Any) -> Outcome:
+        n = src.orders_in_window(60)
+        if n < limit: return ok
+        return Outcome("orders_per_min", False, f"{n}/{limit}", f"{n} orders in the last 60s (limit {limit})")
+    return check
+
+@register("max_position_risk")
+def _max_position_risk(cfg: Dict[str, Any]) -> Optional[CheckFn]:
+    cap = float(cfg.get("MAX_POSITION_RISK", 0) or 0)
+    unknown = Outcome("max_position_risk", True, "ok",
+                      "Notional unknown (no limit_price / price_estimate); skipped strict check", True)
+    def check(order: Order, now: float, src: Any) -> Outcome:
+        n = order.notional
+        if n is None: return unknown
+        if cap > 0 and n > cap:
+            return Outcome("max_position_risk", False, f"{n:.2f}>{cap:.2f}",
+                           f"Notional {n:.2f} exceeds MAX_POSITION_RISK {cap:.2f}")
+        return Outcome("max_position_risk", True, "ok", f"Notional {n:.2f} ≤ {cap:.2f}")
+    return check
+
+@register("daily_loss_limit", order_independent=True)
+def _daily_loss_limit(cfg: Dict[str, Any]) -> Optional[CheckFn]:
+    limit = abs(float(cfg.get("DAILY_LOSS_LIMIT", 0) or 0))
+    use_breaker = bool(cfg.get("CIRCUIT_BREAKER", False))
+    tripped = Outcome("daily_loss_limit", False, "circuit_breaker", "Circuit breaker tripped")
+    off = Outcome("daily_loss_limit", True, "ok", "Daily loss limit disabled")
+    def check(order: Order, now: float, src: Any) -> Outcome:
+        if use_breaker and src.circuit_breaker(): return tripped
+        if limit <= 0: return off
+        try: pnl = src.day_pnl()
+        except Exception as e:
+            return Outcome("daily_loss_limit", False, "pnl_unavailable", f"PnL unavailable: {e}")
+        if pnl is None:
+            return Outcome("daily_loss_limit", True, "ok", f"PnL unknown; limit {limit:.2f} not enforced")
+        if pnl <= -limit:
+            return Outcome("daily_loss_limit", False, f"breach {pnl:.2f} <= {-limit:.2f}",
+                           f"Day PnL {pnl:.2f} ≤ -{limit:.2f} (blocked)")
+        return Outcome("daily_loss_limit", True, "ok", f"Day PnL {pnl:.2f} within limit {limit:.2f}")
+    return check
@@ -0,0 +1,191 @@
+from __future__ import annotations
+import json
+import threading
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from datetime import date, datetime, time as dtime, timedelta
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, NamedTuple, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# Per-day status codes in SessionCalendar.status
+CLOSED, OPEN, HALF_DAY, HOLIDAY = 0, 1, 2, 3
+
+HORIZON_YEARS_BACK = 1
+HORIZON_YEARS_AHEAD = 3
+
+@dataclass(frozen=True)
+class HolidaySpec:
+    """Full-day closures plus early closes (`half_days`: ((YYYY-MM-DD, "HH:MM"), ...))."""
+    holidays: FrozenSet[str] = frozenset()
+    half_days: Tuple[Tuple[str, str], ...] = ()
+
+def default_holidays(years) -> HolidaySpec:
+    # same fixed dates the risk gate has always used when no holiday file exists
+    return HolidaySpec(frozenset(f"{y}-{md}" for y in years for md in ("01-01", "07-04", "12-25")))
+
+def load_holiday_file(path: Path) -> HolidaySpec:
+    """
+    `us_holidays.json` as either a list of "YYYY-MM-DD" (every entry a full closure) or
+    {"holidays": [...], "half_days": {"YYYY-MM-DD": "13:00", ...}}.
+    """
+    data = json.loads(path.read_text(encoding="utf-8"))
+    if isinstance(data, dict):
+        days = data.get("holidays") or []
+        half = data.get("half_days") or {}
+    else:
+        days, half = data, {}
+    return HolidaySpec(frozenset(str(d) for d in days), tuple(sorted((str(k), str(v)) for k, v in half.items())))
+
+def _hhmm(s: str) -> dtime:
+    h, m = str(s).split(":")[:2]
+    return dtime(int(h), int(m))
+
+def check_timezone(name: str) -> str:
+    """`name` if zoneinfo knows it, else ValueError."""
+    try:
+        ZoneInfo(str(name))
+    except (ZoneInfoNotFoundError, ValueError) as e:
+        raise ValueError(f"unknown timezone {name!r}") from e
+    return name
+
+def check_hhmm(s: str) -> str:
+    """`s` if it is an "HH:MM" time of day, else ValueError."""
+    try:
+        _hhmm(s)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"expected HH:MM, got {s!r}") from e
+    return s
+
+class _Compiled(NamedTuple):
+    day_starts: array   # local-midnight epoch per day
+    status: bytes       # CLOSED/OPEN/HALF_DAY/HOLIDAY per day
+    sessions: array     # [open, close, open, close, ...] epochs
+
+@dataclass
+class SessionCalendar:
+    """
+    Regular-trading-hours schedule for one timezone, compiled for a multi-year horizon.
+
+    Each day is one byte of status plus its local-midnight epoch; open sessions are a flat,
+    sorted array of [open, close, open, close, ...] epochs computed through zoneinfo, so DST is
+    handled per day. `is_open(t)` and `next_transition(t)` are a single bisect (O(log n)).
+    Sessions are half-open, [open, close): at exactly RTH_END the market is closed, as in
+    Alpaca's clock. (The old minute-string gate let the whole 16:00 minute through.)
+    Times outside the horizon compile the neighbouring years on demand. The calendar is shared
+    through `get_calendar`, so the recompile runs under a lock and swaps in one immutable
+    snapshot; readers take the snapshot once and never see one array from before the swap
+    and another from after it.
+    """
+    tz_name: str
+    rth_start: str = "09:30"
+    rth_end: str = "16:00"
+    spec: Optional[HolidaySpec] = None
+    first_year: int = field(default_factory=lambda: date.today().year - HORIZON_YEARS_BACK)
+    last_year: int = field(default_factory=lambda: date.today().year + HORIZON_YEARS_AHEAD)
+
+    def __post_init__(self):
+        self.tz = ZoneInfo(self.tz_name)
+        self._lock = threading.Lock()
+        self._c = self._compile()
+
+    @property
+    def day_starts(self) -> array: return self._c.day_starts
+    @property
+    def status(self) -> bytes: return self._c.status
+    @property
+    def sessions(self) -> array: return self._c.sessions
+
+    def _compile(self) -> _Compiled:
+        spec = self.spec or default_holidays(range(self.first_year, self.last_year + 1))
+        half = dict(spec.half_days)
+        start, end = _hhmm(self.rth_start), _hhmm(self.rth_end)
+        day_starts = array("d"); status = bytearray(); sessions = array("d")
+        d = date(self.first_year, 1, 1); stop = date(self.last_year, 12, 31)
+        one = timedelta(days=1)
+        while d <= stop:
+            iso = d.isoformat()
+            day_starts.append(datetime.combine(d, dtime(0), self.tz).timestamp())
+            if d.weekday() >= 5: st = CLOSED
+            elif iso in spec.holidays: st = HOLIDAY
+            elif iso in half: st = HALF_DAY
+            else: st = OPEN
+            status.append(st)
+            if st in (OPEN, HALF_DAY):
+                close = _hhmm(half[iso]) if st == HALF_DAY else end
+                sessions.append(datetime.combine(d, start, self.tz).timestamp())
+                sessions.append(datetime.combine(d, close, self.tz).timestamp())
+            d += one
+        return _Compiled(day_starts, bytes(status), sessions)
+
+    @staticmethod
+    def _covers(c: _Compiled, t: float) -> bool:
+        return bool(c.day_starts) and c.day_starts[0] <= t < c.day_starts[-1] + 86400
+
+    def _cover(self, t: float) -> _Compiled:
+        """Snapshot covering `t`, widening the horizon first if needed."""
+        c = self._c
+        if self._covers(c, t): return c
+        with self._lock:
+            c = self._c
+            if self._covers(c, t): return c
+            y = datetime.fromtimestamp(t, self.tz).year
+            self.first_year = min(self.first_year, y - 1); self.last_year = max(self.last_year, y + 1)
+            c = self._c = self._compile()
+            return c
+
+    def day_status(self, t: float) -> int:
+        c = self._cover(t)
+        return c.status[bisect_right(c.day_starts, t) - 1]
+
+    def is_holiday(self, t: float) -> bool:
+        return self.day_status(t) == HOLIDAY
+
+    def is_trading_day(self, t: float) -> bool:
+        return self.day_status(t) in (OPEN, HALF_DAY)
+
+    def is_open(self, t: float) -> bool:
+        return bisect_right(self._cover(t).sessions, t) % 2 == 1  # inside [open, close)
+
+    def next_transition(self, t: float) -> Optional[Tuple[float, bool]]:
+        """(epoch, opens) of the next open/close strictly after `t`; None past the horizon."""
+        s = self._cover(t).sessions
+        i = bisect_right(s, t)
+        if i >= len(s): return None
+        return s[i], i % 2 == 0
+
+    def next_open_close(self, t: float) -> Tuple[Optional[float], Optional[float]]:
+        s = self._cover(t).sessions
+        i = bisect_right(s, t)
+        nxt_open = s[i + (i % 2)] if i + (i % 2) < len(s) else None
+        nxt_close = s[i + 1 - (i % 2)] if i + 1 - (i % 2) < len(s) else None
+        return nxt_open, nxt_close
+
+    def clock(self, t: float) -> Dict[str, Any]:
+        """Alpaca `/v2/clock`-shaped answer."""
+        nxt_open, nxt_close = self.next_open_close(t)
+        iso = lambda x: datetime.fromtimestamp(x, self.tz).isoformat() if x is not None else None
+        return {"timestamp": iso(t), "is_open": self.is_open(t), "next_open": iso(nxt_open), "next_close": iso(nxt_close)}
+
+@lru_cache(maxsize=16)
+def get_calendar(tz_name: str, rth_start: str = "09:30", rth_end: str = "16:00",
+                 spec: Optional[HolidaySpec] = None) -> SessionCalendar:
+    """Compiled calendar per (timezone, hours, holiday spec); a changed holiday file is a new spec."""
+    return SessionCalendar(tz_name, rth_start, rth_end, spec)
+
+def calendar_for(tz_name: Optional[str], rth_start: Optional[str], rth_end: Optional[str],
+                 spec: Optional[HolidaySpec], default_tz: str) -> SessionCalendar:
+    """
+    get_calendar for preset values that may be bad (a hand-edited risk_preset.json): an unknown
+    timezone falls back to `default_tz`, and unparsable or inverted hours to 09:30-16:00.
+    """
+    try: tz_name = check_timezone(tz_name or default_tz)
+    except ValueError: tz_name = default_tz
+    try:
+        start, end = check_hhmm(rth_start or "09:30"), check_hhmm(rth_end or "16:00")
+        if _hhmm(start) >= _hhmm(end): raise ValueError
+    except ValueError:
+        start, end = "09:30", "16:00"
+    return get_calendar(tz_name, start, end, spec)
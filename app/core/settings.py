@@ -14,6 +14,16 @@ class Settings(BaseModel):
     DAILY_LOSS_LIMIT: float = float(os.getenv("DAILY_LOSS_LIMIT", "500"))
     COOLOFF_AFTER_DRAWDOWN: int = int(os.getenv("COOLOFF_AFTER_DRAWDOWN", "0"))
     SESSION_TZ: str = os.getenv("SESSION_TZ", "America/New_York")
+    RISK_STATE_REVALIDATE_SECONDS: float = float(os.getenv("RISK_STATE_REVALIDATE_SECONDS", "1.0"))
+    AUDIT_QUEUE_MAX: int = int(os.getenv("AUDIT_QUEUE_MAX", "10000"))
+    AUDIT_BATCH_MAX: int = int(os.getenv("AUDIT_BATCH_MAX", "512"))
+    AUDIT_FSYNC_EVERY_N: int = int(os.getenv("AUDIT_FSYNC_EVERY_N", "256"))
+    AUDIT_FSYNC_INTERVAL_MS: int = int(os.getenv("AUDIT_FSYNC_INTERVAL_MS", "1000"))
+    AUDIT_ENQUEUE_TIMEOUT_MS: int = int(os.getenv("AUDIT_ENQUEUE_TIMEOUT_MS", "50"))
+    AUDIT_ROTATE_MAX_BYTES: int = int(os.getenv("AUDIT_ROTATE_MAX_BYTES", str(64 * 1024 * 1024)))
+    AUDIT_ROTATE_MAX_SECONDS: int = int(os.getenv("AUDIT_ROTATE_MAX_SECONDS", "86400"))
+    AUDIT_SEGMENT_BLOCK_RECORDS: int = int(os.getenv("AUDIT_SEGMENT_BLOCK_RECORDS", "1000"))
+    RATE_STATE_BACKEND: str = os.getenv("RATE_STATE_BACKEND", "auto")
     BACKEND_API_KEY: str = os.getenv("BACKEND_API_KEY", "")
 
 settings = Settings()
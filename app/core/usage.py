@@ -3,8 +3,9 @@ from __future__ import annotations
 from dataclasses import dataclass
 from pathlib import Path
 import json
+import os
 import datetime as dt
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Set
 
 # Root of repo = app/core/../../
 ROOT = Path(__file__).resolve().parents[2]
@@ -39,7 +40,28 @@ DEFAULT = TokenUsage(current_balance=0.0, daily_used=[], currency="USD")
 def _ensure_config_dir() -> None:
     CONFIG_DIR.mkdir(parents=True, exist_ok=True)
 
+_tokens_imported: Set[str] = set()  # store paths whose tokens.json import has run in this process
+
+def _sqlite_store():
+    # USAGE_BACKEND=sqlite: keep the state in CONFIG_DIR/usage.sqlite (row "core"); tokens.json is imported once.
+    # The store is the process-wide one per directory (kept open), shared with the usage router.
+    if os.getenv("USAGE_BACKEND", "json").lower() != "sqlite":
+        return None
+    from app.services.usage_sqlite import get_sqlite_store
+    store = get_sqlite_store(CONFIG_DIR)
+    if str(store.path) not in _tokens_imported:
+        store.migrate_tokens_file("core", TOKENS_FILE)
+        _tokens_imported.add(str(store.path))
+    return store
+
 def load_usage() -> TokenUsage:
+    store = _sqlite_store()
+    if store is not None:
+        data = store.get_tokens("core")
+        if data is None:
+            return DEFAULT
+        return TokenUsage(current_balance=float(data["current_balance"]),
+                          daily_used=[float(x) for x in data["daily_used"]], currency=str(data["currency"]))
     try:
         if TOKENS_FILE.exists():
             data = json.loads(TOKENS_FILE.read_text(encoding="utf-8"))
@@ -60,5 +82,9 @@ def save_usage(payload: Dict[str, Any]) -> TokenUsage:
         "daily_used": [float(x) for x in payload.get("daily_used", [])],
         "currency": str(payload.get("currency", "USD")),
     }
+    store = _sqlite_store()
+    if store is not None:
+        store.set_tokens("core", merged)
+        return load_usage()
     TOKENS_FILE.write_text(json.dumps(merged, indent=2), encoding="utf-8")
     return load_usage()
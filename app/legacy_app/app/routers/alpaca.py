@@ -1,22 +1,39 @@
 # src/app/routers/alpaca.py
 from fastapi import APIRouter, HTTPException, Query
-import os, json, sqlite3
+import asyncio, os, json, re, sqlite3, threading, time
 import httpx
 from typing import Optional, Literal, Dict, Any, List, Tuple
 from datetime import datetime, timedelta, timezone
 from math import floor
 
+from ..services.budget_ledger import BudgetLedger, install as install_budget_ledger
+from ..services.equity_series import EquitySeriesStore, lttb, ohlc
+from ..services.journal_dal import JournalDAL
+from ..services.sqlite_pool import ConnectionPool
+
 router = APIRouter(prefix="/alpaca", tags=["alpaca"])
 
 JOURNAL_DB = os.getenv("JOURNAL_DB", "journal.db")
+EQUITY_SERIES_DIR = os.getenv("EQUITY_SERIES_DIR") or os.path.join(os.path.dirname(os.path.abspath(JOURNAL_DB)), "equity_series")
+EQUITY_SNAPSHOT_SECONDS = float(os.getenv("EQUITY_SNAPSHOT_SECONDS", "60"))  # 0 disables the background job
+JOURNAL_POOL_SIZE = int(os.getenv("JOURNAL_POOL_SIZE", "8"))
+JOURNAL_READERS = int(os.getenv("JOURNAL_READERS", "4"))
+ORDERS_SYNC_PAGE_SIZE = int(os.getenv("ORDERS_SYNC_PAGE_SIZE", "500"))  # Alpaca's max page size
+SYNC_WATERMARK_KEY = "orders_sync_watermark"
+SYNC_SKEW = timedelta(minutes=5)  # broker vs local clock slack on the sync cursor
 
 # ---------- SQLite helpers/migrations ----------
-def _connect():
-    con = sqlite3.connect(JOURNAL_DB, timeout=30, check_same_thread=False)
+SCHEMA_VERSION = 3  # bump when _migrate() changes
+
+def _pragmas(con: sqlite3.Connection):
     con.execute("PRAGMA journal_mode=WAL;")
     con.execute("PRAGMA busy_timeout=5000;")
     con.execute("PRAGMA synchronous=NORMAL;")
     con.execute("PRAGMA foreign_keys=ON;")
+
+def _connect():
+    con = sqlite3.connect(JOURNAL_DB, timeout=30, check_same_thread=False)
+    _pragmas(con)
     return con
 
 def _ensure_columns(con: sqlite3.Connection, table: str, cols: List[Tuple[str, str]]):
@@ -124,15 +141,56 @@ def _migrate(con: sqlite3.Connection):
         ("last_started_date", "TEXT"),
     ])
 
+    # Indexes (v2): covering for the per-session sums, order_id lookups, entries by kind
+    con.execute("""CREATE INDEX IF NOT EXISTS session_reservations_session
+                   ON session_reservations(session_id, status, symbol, amount, qty)""")
+    con.execute("CREATE INDEX IF NOT EXISTS session_reservations_order ON session_reservations(order_id, status)")
+    con.execute("CREATE INDEX IF NOT EXISTS entries_kind ON entries(kind, id)")
+
+    # Running budget totals per session and per (session, symbol), kept by triggers (v3)
+    install_budget_ledger(con)
+
     # Defaults
     con.execute("INSERT OR IGNORE INTO auto_session (id, enabled) VALUES (1, 0)")
     con.execute("INSERT OR IGNORE INTO settings(key, value) VALUES('trading_mode','paper')")
     con.commit()
 
+def _schema_version(con: sqlite3.Connection) -> int:
+    con.execute("CREATE TABLE IF NOT EXISTS schema_version (id INTEGER PRIMARY KEY CHECK (id=1), version INTEGER NOT NULL)")
+    row = con.execute("SELECT version FROM schema_version WHERE id=1").fetchone()
+    return row[0] if row else 0
+
+def migrate_once():
+    """Bring JOURNAL_DB to SCHEMA_VERSION; runs _migrate at most once per process (and not at all when current)."""
+    global _migrated
+    if _migrated: return
+    with _migrate_lock:
+        if _migrated: return
+        con = _connect()
+        try:
+            if _schema_version(con) < SCHEMA_VERSION:
+                _migrate(con)
+                con.execute("INSERT INTO schema_version(id, version) VALUES (1, ?) "
+                            "ON CONFLICT(id) DO UPDATE SET version=excluded.version", (SCHEMA_VERSION,))
+                con.commit()
+        finally:
+            con.close()
+        _migrated = True
+
+_migrated = False
+_migrate_lock = threading.Lock()
+_pool = ConnectionPool(JOURNAL_DB, size=JOURNAL_POOL_SIZE, setup=_pragmas)
+
 def _db() -> sqlite3.Connection:
-    con = _connect()
-    _migrate(con)
-    return con
+    """A pooled journal connection for sync helpers; `con.close()` returns it to the pool."""
+    migrate_once()
+    return _pool.acquire()
+
+# Async endpoints: `await dal.read(fn, ...)` / `await dal.write(fn, ...)` with fn(con, ...) run off the event loop
+dal = JournalDAL(JOURNAL_DB, readers=JOURNAL_READERS, setup=_pragmas, before_first_use=migrate_once)
+
+# In-memory mirror of session_budget / session_symbol_budget; writers of session_reservations call ledger.touch()
+ledger = BudgetLedger()
 
 # ---------- misc helpers ----------
 def _utcnow_iso() -> str:
@@ -211,34 +269,48 @@ async def latest_price(symbol: str, feed: str = "iex") -> Optional[float]:
     return float(p) if isinstance(p, (int, float)) else None
 
 # ---------- journal ----------
-def log_entry(kind: str, **kw):
-    con = _db()
+def _insert_entry(con: sqlite3.Connection, kind: str, kw: Dict[str, Any]):
     con.execute(
         """INSERT INTO entries (ts, kind, order_id, symbol, side, qty, price, avg_fill_price, status, note, payload)
            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
         (_utcnow_iso(), kind, kw.get("order_id"), kw.get("symbol"), kw.get("side"), kw.get("qty"),
          kw.get("price"), kw.get("avg_fill_price"), kw.get("status"), kw.get("note"), kw.get("payload"))
     )
-    con.commit(); con.close()
 
-def list_entries(limit: int = 200) -> List[Dict[str, Any]]:
-    con = _db()
+def _select_entries(con: sqlite3.Connection, limit: int) -> List[Dict[str, Any]]:
     cur = con.execute("""SELECT id, ts, kind, order_id, symbol, side, qty, price, avg_fill_price, status, note
                          FROM entries ORDER BY id DESC LIMIT ?""", (limit,))
     cols = [c[0] for c in cur.description]
-    rows = [dict(zip(cols, r)) for r in cur.fetchall()]
-    con.close(); return rows
+    return [dict(zip(cols, r)) for r in cur.fetchall()]
 
-def list_entries_by_kind(kind: str, limit: int = 1000) -> List[Dict[str, Any]]:
-    con = _db()
+def _select_entries_by_kind(con: sqlite3.Connection, kind: str, limit: int) -> List[Dict[str, Any]]:
     cur = con.execute("""SELECT id, ts, kind, price, note, payload FROM entries
                          WHERE kind=? ORDER BY id DESC LIMIT ?""", (kind, limit))
     cols = [c[0] for c in cur.description]
-    rows = [dict(zip(cols, r)) for r in cur.fetchall()]
+    return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+def log_entry(kind: str, **kw):
+    con = _db()
+    _insert_entry(con, kind, kw)
+    con.commit(); con.close()
+
+async def alog_entry(kind: str, **kw):
+    """log_entry for async endpoints: runs on the journal writer thread."""
+    await dal.write(_insert_entry, kind, kw)
+
+def list_entries(limit: int = 200) -> List[Dict[str, Any]]:
+    con = _db()
+    rows = _select_entries(con, limit)
+    con.close(); return rows
+
+def list_entries_by_kind(kind: str, limit: int = 1000) -> List[Dict[str, Any]]:
+    con = _db()
+    rows = _select_entries_by_kind(con, kind, limit)
     con.close(); return rows
 
 # ---------- session budget core ----------
-def _get_active_session(con: sqlite3.Connection) -> Optional[Dict[str, Any]]:
+def _read_active_session(con: sqlite3.Connection) -> Optional[Dict[str, Any]]:
+    """Latest active session, read only: one past its duration comes back with status 'expired'."""
     cur = con.execute("""SELECT id, start_ts, end_ts, status, budget_total, duration_min, note
                          FROM sessions WHERE status='active' ORDER BY id DESC LIMIT 1""")
     row = cur.fetchone()
@@ -247,26 +319,52 @@ def _get_active_session(con: sqlite3.Connection) -> Optional[Dict[str, Any]]:
     if s.get("duration_min"):
         start_dt = datetime.fromisoformat(s["start_ts"].replace("Z","")).replace(tzinfo=timezone.utc)
         if datetime.utcnow().replace(tzinfo=timezone.utc) > start_dt + timedelta(minutes=int(s["duration_min"])):
-            con.execute("UPDATE sessions SET status='expired', end_ts=? WHERE id=?", (_utcnow_iso(), s["id"]))
-            con.commit()
             s["status"] = "expired"
     return s
 
-def _sum_by(con: sqlite3.Connection, session_id: int, symbol: Optional[str], statuses: Tuple[str, ...], field: str) -> float:
-    params = [session_id]
-    sql = f"SELECT COALESCE(SUM({field}),0.0) FROM session_reservations WHERE session_id=? AND status IN ({','.join(['?']*len(statuses))})"
-    params.extend(statuses)
+def _expire_session_tx(con: sqlite3.Connection, session_id: int) -> None:
+    con.execute("UPDATE sessions SET status='expired', end_ts=? WHERE id=? AND status='active'",
+                (_utcnow_iso(), session_id))
+
+def _get_active_session(con: sqlite3.Connection) -> Optional[Dict[str, Any]]:
+    """_read_active_session for write paths: an overdue session is marked expired in the journal too."""
+    s = _read_active_session(con)
+    if s and s["status"] == "expired":
+        _expire_session_tx(con, s["id"])
+        con.commit()
+    return s
+
+async def _active_session() -> Optional[Dict[str, Any]]:
+    """Active session via the read pool; the expiry UPDATE is a separate write, issued only when due."""
+    s = await dal.read(_read_active_session)
+    if s and s["status"] == "expired":
+        await dal.write(_expire_session_tx, s["id"])
+    return s
+
+def _sums_by_status(con: sqlite3.Connection, session_id: int, symbol: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    """{status: {"amount": ..., "qty": ...}} for one session (optionally one symbol) in a single index-only pass.
+
+    The aggregate the budget ledger maintains incrementally; the request paths read `ledger.totals` instead."""
+    sql = "SELECT status, COALESCE(SUM(amount),0.0), COALESCE(SUM(qty),0.0) FROM session_reservations WHERE session_id=?"
+    params: List[Any] = [session_id]
     if symbol:
         sql += " AND symbol=?"; params.append(symbol)
-    cur = con.execute(sql, tuple(params))
-    return f(cur.fetchone()[0], 0.0)
+    cur = con.execute(sql + " GROUP BY status", tuple(params))
+    return {st: {"amount": f(amt, 0.0), "qty": f(q, 0.0)} for st, amt, q in cur.fetchall()}
+
+def _sum_status(sums: Dict[str, Dict[str, float]], statuses: Tuple[str, ...], field: str) -> float:
+    return sum(sums.get(st, {}).get(field, 0.0) for st in statuses)
 
 def _session_summary(con: sqlite3.Connection) -> Optional[Dict[str, Any]]:
-    s = _get_active_session(con)
+    return _summary_of(con, _get_active_session(con))
+
+def _summary_of(con: sqlite3.Connection, s: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Budget summary of session `s` (from _read_active_session / _active_session); reads only."""
     if not s: return None
     total = f(s["budget_total"])
-    open_amt = _sum_by(con, s["id"], None, ("open",), "amount")
-    spent_amt = _sum_by(con, s["id"], None, ("spent",), "amount")
+    sums = ledger.totals(con, s["id"])
+    open_amt = _sum_status(sums, ("open",), "amount")
+    spent_amt = _sum_status(sums, ("spent",), "amount")
     remaining = max(0.0, total - open_amt - spent_amt)
     elapsed_sec = None; left_sec = None
     if s.get("duration_min"):
@@ -288,11 +386,13 @@ def _reserve(con: sqlite3.Connection, session_id: int, order_id: str,
                    (session_id, ts, order_id, symbol, side, est_price, qty, amount, status)
                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'open')""",
                 (session_id, _utcnow_iso(), order_id, symbol, side, est_price, qty, amount))
+    ledger.touch()
     con.commit()
 
 def _release_by_order(con: sqlite3.Connection, order_id: str):
     con.execute("""UPDATE session_reservations SET status='released'
                    WHERE order_id=? AND status='open'""", (order_id,))
+    ledger.touch()
     con.commit()
 
 def _spend_by_order(con: sqlite3.Connection, order_id: str, filled_qty: Optional[float], avg_fill_price: Optional[float]):
@@ -307,49 +407,48 @@ def _spend_by_order(con: sqlite3.Connection, order_id: str, filled_qty: Optional
                        SET status='spent'
                        WHERE order_id=? AND status='open'""",
                     (order_id,))
+    ledger.touch()
     con.commit()
 
 # ---- session endpoints ----
-@router.post("/session/start")
-async def session_start(budget: float, duration_min: Optional[int] = None, note: Optional[str] = None):
-    if budget <= 0: raise HTTPException(400, "Budget must be > 0")
-    con = _db()
+# Reads go through _active_session() and dal.read; only an overdue session costs a (separate) write.
+def _session_start_tx(con: sqlite3.Connection, budget: float, duration_min: Optional[int], note: Optional[str]) -> int:
     s = _get_active_session(con)
     if s and s["status"] == "active":
         con.execute("UPDATE sessions SET status='stopped', end_ts=? WHERE id=?", (_utcnow_iso(), s["id"]))
-        con.commit()
-    con.execute("""INSERT INTO sessions (start_ts, status, budget_total, duration_min, note)
-                   VALUES (?, 'active', ?, ?, ?)""", (_utcnow_iso(), float(budget), duration_min, note))
-    con.commit()
-    sid = int(con.execute("SELECT last_insert_rowid()").fetchone()[0])
-    con.close()
+    cur = con.execute("""INSERT INTO sessions (start_ts, status, budget_total, duration_min, note)
+                         VALUES (?, 'active', ?, ?, ?)""", (_utcnow_iso(), float(budget), duration_min, note))
+    return int(cur.lastrowid)
+
+@router.post("/session/start")
+async def session_start(budget: float, duration_min: Optional[int] = None, note: Optional[str] = None):
+    if budget <= 0: raise HTTPException(400, "Budget must be > 0")
+    sid = await dal.write(_session_start_tx, budget, duration_min, note)
     return {"ok": True, "session_id": sid}
 
+def _session_stop_tx(con: sqlite3.Connection) -> Optional[int]:
+    s = _get_active_session(con)
+    if not s: return None
+    con.execute("UPDATE sessions SET status='stopped', end_ts=? WHERE id=?", (_utcnow_iso(), s["id"]))
+    return s["id"]
+
 @router.post("/session/stop")
 async def session_stop():
-    con = _db()
-    s = _get_active_session(con)
-    if not s:
-        con.close()
+    sid = await dal.write(_session_stop_tx)
+    if sid is None:
         return {"ok": True, "message": "no active session"}
-    con.execute("UPDATE sessions SET status='stopped', end_ts=? WHERE id=?", (_utcnow_iso(), s["id"]))
-    con.commit(); con.close()
-    return {"ok": True, "stopped_session_id": s["id"]}
+    return {"ok": True, "stopped_session_id": sid}
 
 @router.get("/session")
 async def session_status():
-    con = _db()
-    summary = _session_summary(con)
-    con.close()
+    summary = await dal.read(_summary_of, await _active_session())
     if not summary: return {"active": False}
     if summary["status"] == "expired":
         return {"active": False, "expired": True, "summary": summary}
     return {"active": True, "summary": summary}
 
-@router.get("/session/log")
-async def session_log(limit: int = Query(500, ge=1, le=5000), latest_if_none: bool = True):
-    con = _db()
-    s = _get_active_session(con)
+def _session_log_tx(con: sqlite3.Connection, s: Optional[Dict[str, Any]], limit: int,
+                    latest_if_none: bool) -> Dict[str, Any]:
     sid = None
     if s:
         sid = s["id"]
@@ -358,7 +457,6 @@ async def session_log(limit: int = Query(500, ge=1, le=5000), latest_if_none: bo
         row = cur.fetchone()
         sid = row[0] if row else None
     if not sid:
-        con.close()
         return {"session": None, "rows": [], "totals": {}}
     cur = con.execute("""
         SELECT ts, order_id, symbol, side, est_price, qty, amount, filled_qty, avg_fill_price, status
@@ -369,21 +467,24 @@ async def session_log(limit: int = Query(500, ge=1, le=5000), latest_if_none: bo
     """, (sid, limit))
     cols = [c[0] for c in cur.description]
     rows = [dict(zip(cols, r)) for r in cur.fetchall()]
-    tot = {k: _sum_by(con, sid, None, (k,), "amount") for k in ("open","spent","released")}
+    sums = ledger.totals(con, sid)
+    tot = {k: _sum_status(sums, (k,), "amount") for k in ("open","spent","released")}
     tot["count"] = len(rows)
-    con.close()
     return {"session_id": sid, "rows": rows, "totals": tot}
 
+@router.get("/session/log")
+async def session_log(limit: int = Query(500, ge=1, le=5000), latest_if_none: bool = True):
+    return await dal.read(_session_log_tx, await _active_session(), limit, latest_if_none)
+
 # ---- symbol throttle endpoints ----
-@router.post("/session/symbol_limit")
-async def session_symbol_limit(symbol: str, max_dollars: Optional[float] = None, max_shares: Optional[float] = None):
-    symbol = symbol.upper().strip()
-    if not symbol: raise HTTPException(400, "symbol required")
-    con = _db()
+def _active_session_or_400(con: sqlite3.Connection) -> Dict[str, Any]:
     s = _get_active_session(con)
     if not s or s["status"] != "active":
-        con.close()
         raise HTTPException(400, "no active session")
+    return s
+
+def _symbol_limit_tx(con: sqlite3.Connection, symbol: str, max_dollars: Optional[float], max_shares: Optional[float]):
+    s = _active_session_or_400(con)
     con.execute("""
         INSERT INTO session_symbol_limits (session_id, symbol, max_dollars, max_shares)
         VALUES (?, ?, ?, ?)
@@ -391,53 +492,58 @@ async def session_symbol_limit(symbol: str, max_dollars: Optional[float] = None,
             max_dollars=excluded.max_dollars,
             max_shares=excluded.max_shares
     """, (s["id"], symbol, max_dollars, max_shares))
-    con.commit(); con.close()
+
+@router.post("/session/symbol_limit")
+async def session_symbol_limit(symbol: str, max_dollars: Optional[float] = None, max_shares: Optional[float] = None):
+    symbol = symbol.upper().strip()
+    if not symbol: raise HTTPException(400, "symbol required")
+    await dal.write(_symbol_limit_tx, symbol, max_dollars, max_shares)
     return {"ok": True}
 
+def _symbol_limits_tx(con: sqlite3.Connection, session_id: int) -> Dict[str, Any]:
+    cur = con.execute("""SELECT symbol, max_dollars, max_shares
+                         FROM session_symbol_limits WHERE session_id=? ORDER BY symbol""", (session_id,))
+    rows = [{"symbol": r[0], "max_dollars": r[1], "max_shares": r[2]} for r in cur.fetchall()]
+    return {"active": True, "limits": rows}
+
 @router.get("/session/symbol_limits")
 async def session_symbol_limits():
-    con = _db()
-    s = _get_active_session(con)
+    s = await _active_session()
     if not s or s["status"] != "active":
-        con.close()
         return {"active": False, "limits": []}
-    cur = con.execute("""SELECT symbol, max_dollars, max_shares
-                         FROM session_symbol_limits WHERE session_id=? ORDER BY symbol""", (s["id"],))
-    rows = [{"symbol": r[0], "max_dollars": r[1], "max_shares": r[2]} for r in cur.fetchall()]
-    con.close()
-    return {"active": True, "limits": rows}
+    return await dal.read(_symbol_limits_tx, s["id"])
+
+def _symbol_limit_delete_tx(con: sqlite3.Connection, symbol: str):
+    s = _active_session_or_400(con)
+    con.execute("""DELETE FROM session_symbol_limits WHERE session_id=? AND symbol=?""", (s["id"], symbol))
 
 @router.post("/session/symbol_limit/delete")
 async def session_symbol_limit_delete(symbol: str):
     symbol = symbol.upper().strip()
-    con = _db()
-    s = _get_active_session(con)
-    if not s or s["status"] != "active":
-        con.close()
-        raise HTTPException(400, "no active session")
-    con.execute("""DELETE FROM session_symbol_limits WHERE session_id=? AND symbol=?""", (s["id"], symbol))
-    con.commit(); con.close()
+    await dal.write(_symbol_limit_delete_tx, symbol)
     return {"ok": True}
 
 # ---- daily auto-session ----
+def _auto_config_tx(con: sqlite3.Connection, *values):
+    con.execute("""UPDATE auto_session SET enabled=?, budget_total=?, duration_min=?, start_hour=?, start_min=? WHERE id=1""",
+                values)
+
 @router.post("/session/auto/config")
 async def auto_session_config(enabled: bool,
                               budget_total: Optional[float] = None,
                               duration_min: Optional[int] = None,
                               start_hour: Optional[int] = None,
                               start_min: Optional[int] = None):
-    con = _db()
-    con.execute("""UPDATE auto_session SET enabled=?, budget_total=?, duration_min=?, start_hour=?, start_min=? WHERE id=1""",
-                (1 if enabled else 0, budget_total, duration_min, start_hour, start_min))
-    con.commit(); con.close()
+    await dal.write(_auto_config_tx, 1 if enabled else 0, budget_total, duration_min, start_hour, start_min)
     return {"ok": True}
 
+def _auto_config_row(con: sqlite3.Connection):
+    cur = con.execute("SELECT enabled, budget_total, duration_min, start_hour, start_min, last_started_date FROM auto_session WHERE id=1")
+    return cur.fetchone()
+
 @router.get("/session/auto/config")
 async def auto_session_get():
-    con = _db()
-    cur = con.execute("SELECT enabled, budget_total, duration_min, start_hour, start_min, last_started_date FROM auto_session WHERE id=1")
-    row = cur.fetchone()
-    con.close()
+    row = await dal.read(_auto_config_row)
     if not row:
         return {"enabled": False}
     keys = ["enabled","budget_total","duration_min","start_hour","start_min","last_started_date"]
@@ -445,25 +551,29 @@ async def auto_session_get():
     data["enabled"] = bool(data["enabled"])
     return data
 
-@router.post("/session/auto/tick")
-async def auto_session_tick():
-    con = _db()
-    cur = con.execute("SELECT enabled, budget_total, duration_min, start_hour, start_min, last_started_date FROM auto_session WHERE id=1")
-    row = cur.fetchone()
+def _session_calendar():
+    """Shared session calendar when running inside the main backend; None standalone (no holiday check)."""
+    try:
+        from app.core.risk import risk_state
+    except ImportError:
+        return None
+    return risk_state.calendar(risk_state.preset)
+
+def _auto_tick_tx(con: sqlite3.Connection) -> Dict[str, Any]:
+    row = _auto_config_row(con)
     if not row:
-        con.close()
         return {"ok": True, "started": False, "reason": "no config"}
     enabled, budget, duration, h, m, last_started = row
     if not enabled:
-        con.close()
         return {"ok": True, "started": False, "reason": "disabled"}
     today = datetime.now().date().isoformat()
     now = datetime.now()
     if last_started == today:
-        con.close()
         return {"ok": True, "started": False, "reason": "already started today"}
+    cal = _session_calendar()
+    if cal is not None and not cal.is_trading_day(now.timestamp()):
+        return {"ok": True, "started": False, "reason": "market closed today"}
     if h is None or m is None or budget is None or budget <= 0:
-        con.close()
         return {"ok": True, "started": False, "reason": "incomplete config"}
     start_dt = now.replace(hour=int(h), minute=int(m), second=0, microsecond=0)
     if now >= start_dt:
@@ -473,12 +583,13 @@ async def auto_session_tick():
                            VALUES (?, 'active', ?, ?, ?)""",
                         (_utcnow_iso(), float(budget), duration, "auto-session"))
             con.execute("UPDATE auto_session SET last_started_date=? WHERE id=1", (today,))
-            con.commit()
-            con.close()
             return {"ok": True, "started": True}
-    con.close()
     return {"ok": True, "started": False}
 
+@router.post("/session/auto/tick")
+async def auto_session_tick():
+    return await dal.write(_auto_tick_tx)
+
 # ---- Trading Mode (paper/live) ----
 CONFIRM_PHRASE = "I UNDERSTAND THE RISKS"
 
@@ -533,10 +644,10 @@ async def test_buy(symbol: str = "AAPL", qty: int = 1):
             if r.status_code >= 400:
                 raise HTTPException(status_code=r.status_code, detail=r.text)
             order = r.json()
-            try: log_entry("order_submitted", order_id=order.get("id"), symbol=symbol.upper(), side="buy", qty=qty, status=order.get("status"), payload=json.dumps(order))
+            try: await alog_entry("order_submitted", order_id=order.get("id"), symbol=symbol.upper(), side="buy", qty=qty, status=order.get("status"), payload=json.dumps(order))
             except Exception: pass
             await client.delete(f"{trading_base()}/orders/{order['id']}", headers=alpaca_headers())
-            try: log_entry("order_cancelled", order_id=order.get("id"), symbol=symbol.upper(), side="buy", qty=qty)
+            try: await alog_entry("order_cancelled", order_id=order.get("id"), symbol=symbol.upper(), side="buy", qty=qty)
             except Exception: pass
             return {"ok": True, "order_id": order.get("id")}
     except httpx.HTTPError as e:
@@ -668,40 +779,129 @@ async def orders(status: Literal["open","closed","all"] = "open",
     except httpx.HTTPError as e:
         raise HTTPException(status_code=502, detail=f"Orders error: {e!s}")
 
+# Incremental sync. Only orders behind the session's open reservations can change a
+# reservation, so the broker is paged forward from a cursor. The cursor is the stored
+# watermark (the earliest submit time still open at the last sync), and never later than
+# the oldest open reservation. Open and closed listings are paged concurrently. Open
+# reservations whose order is in neither listing are looked up one by one: they are
+# released only on a 404, and left open when the lookup fails.
+def _sync_plan_tx(con: sqlite3.Connection, session_id: int) -> Tuple[List[str], Optional[datetime]]:
+    cur = con.execute("SELECT DISTINCT order_id FROM session_reservations WHERE session_id=? AND status='open' "
+                      "AND order_id IS NOT NULL", (session_id,))
+    ids = [r[0] for r in cur.fetchall()]
+    if not ids: return [], None
+    oldest = con.execute("SELECT MIN(ts) FROM session_reservations WHERE session_id=? AND status='open'",
+                         (session_id,)).fetchone()[0]
+    row = con.execute("SELECT value FROM settings WHERE key=?", (SYNC_WATERMARK_KEY,)).fetchone()
+    bounds = [t for t in (_parse_ts(oldest), _parse_ts(row[0] if row else None)) if t is not None]
+    return ids, (min(bounds) - SYNC_SKEW) if bounds else None
+
+def _parse_ts(v: Optional[str]) -> Optional[datetime]:
+    """RFC 3339 from Alpaca (nanoseconds) or the journal -> aware UTC datetime; None if unparseable."""
+    if not v: return None
+    try: dt = datetime.fromisoformat(re.sub(r"(\.\d{6})\d+", r"\1", str(v).strip()).replace("Z", "+00:00"))
+    except ValueError: return None
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+def _rfc3339(dt: datetime) -> str:
+    return dt.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+
+async def _orders_since(client: httpx.AsyncClient, status: str, after: Optional[datetime], until: datetime) -> List[Dict[str, Any]]:
+    """All `status` orders submitted in (after, until], following Alpaca's `after` cursor page by page."""
+    out: List[Dict[str, Any]] = []
+    seen = set()
+    cursor = after
+    while True:
+        params = {"status": status, "limit": str(ORDERS_SYNC_PAGE_SIZE), "direction": "asc", "until": _rfc3339(until)}
+        if cursor: params["after"] = _rfc3339(cursor)
+        r = await client.get(f"{trading_base()}/orders", headers=alpaca_headers(), params=params)
+        r.raise_for_status()
+        page = r.json() or []
+        fresh = [o for o in page if o.get("id") not in seen]
+        seen.update(o.get("id") for o in fresh)
+        out.extend(fresh)
+        last = _parse_ts(page[-1].get("submitted_at")) if page else None
+        if len(page) < ORDERS_SYNC_PAGE_SIZE or last is None:
+            return out
+        # `after` is exclusive: step back 1us so orders sharing the boundary timestamp are re-read, not skipped.
+        # A full page of one timestamp moves past it instead; any order skipped that way is looked up by id.
+        nxt = last - timedelta(microseconds=1)
+        if cursor is not None and nxt <= cursor: nxt = last
+        if cursor is not None and nxt <= cursor: return out
+        cursor = nxt
+
+async def _order_by_id(client: httpx.AsyncClient, order_id: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """(order_id, order): {} when the broker does not know the order, None when the lookup failed."""
+    try:
+        r = await client.get(f"{trading_base()}/orders/{order_id}", headers=alpaca_headers())
+    except httpx.HTTPError:
+        return order_id, None
+    if r.status_code == 404: return order_id, {}
+    if r.status_code >= 400: return order_id, None
+    return order_id, r.json() or None
+
+def _sync_transitions(order_ids: List[str], by_id: Dict[str, Optional[Dict[str, Any]]], until: datetime):
+    """Split open reservations' orders into releases / spends (with and without fill data) and the new watermark."""
+    releases: List[Tuple[str]] = []; fills: List[Tuple[Any, Any, float, str]] = []; spends: List[Tuple[str]] = []
+    watermark = until
+    for oid in order_ids:
+        o = by_id.get(oid)
+        if o is None:  # lookup failed: keep it open and look again from here next time
+            continue
+        st = (o.get("status") or "").lower()
+        if not o or st in ("canceled", "expired", "rejected"):
+            releases.append((oid,))
+        elif st in ("filled", "partially_filled"):
+            q, p = o.get("filled_qty"), o.get("filled_avg_price")
+            if q and p: fills.append((q, p, f(q) * f(p), oid))
+            else: spends.append((oid,))
+        else:
+            submitted = _parse_ts(o.get("submitted_at"))
+            if submitted is not None and submitted < watermark: watermark = submitted
+    return releases, fills, spends, watermark
+
+def _apply_sync_tx(con: sqlite3.Connection, releases: List[Tuple[str]], fills: List[Tuple[Any, Any, float, str]],
+                   spends: List[Tuple[str]], watermark: str) -> int:
+    """All transitions of one sync as three executemany statements in a single transaction."""
+    updated = 0
+    if releases:
+        updated += con.executemany("UPDATE session_reservations SET status='released' "
+                                   "WHERE order_id=? AND status='open'", releases).rowcount
+    if fills:
+        updated += con.executemany("""UPDATE session_reservations
+                                      SET status='spent', filled_qty=?, avg_fill_price=?, amount=?
+                                      WHERE order_id=? AND status='open'""", fills).rowcount
+    if spends:
+        updated += con.executemany("UPDATE session_reservations SET status='spent' "
+                                   "WHERE order_id=? AND status='open'", spends).rowcount
+    if updated: ledger.touch()
+    con.execute("""INSERT INTO settings(key, value) VALUES(?, ?)
+                   ON CONFLICT(key) DO UPDATE SET value=excluded.value""", (SYNC_WATERMARK_KEY, watermark))
+    return updated
+
 @router.post("/orders/sync")
 async def orders_sync():
-    con = _db()
-    s = _get_active_session(con)
+    s = await _active_session()
     if not s:
-        con.close()
         return {"ok": True, "updated": 0, "reason": "no active session"}
+    order_ids, after = await dal.read(_sync_plan_tx, s["id"])
+    if not order_ids:
+        return {"ok": True, "updated": 0, "fetched": 0}
+    until = datetime.now(timezone.utc)
     try:
         async with httpx.AsyncClient(timeout=20) as client:
-            ro = await client.get(f"{trading_base()}/orders", headers=alpaca_headers(), params={"status": "open", "limit": "200", "direction": "desc"})
-            rc = await client.get(f"{trading_base()}/orders", headers=alpaca_headers(), params={"status": "closed", "limit": "200", "direction": "desc"})
-            ro.raise_for_status(); rc.raise_for_status()
-            open_orders = ro.json() or []
-            closed_orders = rc.json() or []
+            open_orders, closed_orders = await asyncio.gather(_orders_since(client, "open", after, until),
+                                                              _orders_since(client, "closed", after, until))
+            by_id: Dict[str, Optional[Dict[str, Any]]] = {o.get("id"): o for o in (open_orders + closed_orders) if o.get("id")}
+            missing = [oid for oid in order_ids if oid not in by_id]
+            by_id.update(await asyncio.gather(*(_order_by_id(client, oid) for oid in missing)))
     except httpx.HTTPError as e:
-        con.close()
         raise HTTPException(status_code=502, detail=f"Sync error: {e!s}")
 
-    by_id: Dict[str, Dict[str, Any]] = {o.get("id"): o for o in (open_orders + closed_orders) if o.get("id")}
-    cur = con.execute("""SELECT id, order_id FROM session_reservations WHERE session_id=? AND status='open'""", (s["id"],))
-    open_res = cur.fetchall()
-    updated = 0
-    for _, oid in open_res:
-        o = by_id.get(oid)
-        if not o:
-            _release_by_order(con, oid); updated += 1; continue
-        st = (o.get("status") or "").lower()
-        filled_qty = o.get("filled_qty"); avg_fill_price = o.get("filled_avg_price")
-        if st in ("canceled", "expired", "rejected"):
-            _release_by_order(con, oid); updated += 1
-        elif st in ("filled", "partially_filled"):
-            _spend_by_order(con, oid, filled_qty, avg_fill_price); updated += 1
-    con.close()
-    return {"ok": True, "updated": updated}
+    releases, fills, spends, watermark = _sync_transitions(order_ids, by_id, until)
+    updated = await dal.write(_apply_sync_tx, releases, fills, spends, _rfc3339(watermark))
+    return {"ok": True, "updated": updated, "fetched": len(open_orders) + len(closed_orders),
+            "looked_up": len(missing), "after": _rfc3339(after) if after else None, "watermark": _rfc3339(watermark)}
 
 @router.get("/positions")
 async def positions():
@@ -727,7 +927,7 @@ async def positions_close_all(cancel_orders: bool = True):
             except Exception: raw = None
     except httpx.HTTPError as e:
         raise HTTPException(status_code=502, detail=f"Close all error: {e!s}")
-    try: log_entry("positions_close_all", payload=json.dumps(raw) if raw is not None else None)
+    try: await alog_entry("positions_close_all", payload=json.dumps(raw) if raw is not None else None)
     except Exception: pass
     return {"ok": True, "result": raw}
 
@@ -752,7 +952,7 @@ async def positions_summary():
     day_pl = sum(f(pos.get("unrealized_intraday_pl")) for pos in positions)
     prior_mv = sum(f(pos.get("lastday_price")) * f(pos.get("qty")) for pos in positions)
     day_plpc = (day_pl / prior_mv) if prior_mv > 0 else None
-    con = _db(); sess = _session_summary(con); con.close()
+    sess = await dal.read(_summary_of, await _active_session())
     summary = {
         "cash": f(account.get("cash")), "equity": f(account.get("equity")),
         "portfolio_value": f(account.get("portfolio_value")), "buying_power": f(account.get("buying_power")),
@@ -762,6 +962,58 @@ async def positions_summary():
     }
     return {"summary": summary, "positions": positions, "account": account}
 
+def _order_session_check(con: sqlite3.Connection, symbol: str, side: str, qty: Optional[float], notional: Optional[float],
+                         est_price: Optional[float], limit_price: Optional[float], session_enforce: bool) -> Optional[Dict[str, Any]]:
+    """Budget / per-symbol limits for a buy in the active session (raises 400); returns the session."""
+    sess = _get_active_session(con)
+    if session_enforce and sess and sess["status"] == "active" and side == "buy":
+        summary = _summary_of(con, sess)
+        if not summary or summary["status"] != "active":
+            raise HTTPException(400, json.dumps({"error":"session_inactive"}))
+        remaining = f(summary["remaining"])
+        ep = est_price if est_price else f(limit_price)
+        # Cost estimation
+        if notional and notional > 0:
+            est_cost = float(notional)
+            est_qty  = (est_cost / ep) if (ep and ep > 0) else None
+        else:
+            if not ep or ep <= 0 or not qty:
+                raise HTTPException(400, json.dumps({"error":"no_price_estimate"}))
+            est_cost = ep * float(qty)
+            est_qty  = float(qty)
+        if est_cost > remaining:
+            allowed_qty = None
+            if ep and ep > 0 and notional is None:
+                allowed_qty = int(max(0, floor(remaining / ep)))
+            raise HTTPException(400, json.dumps({
+                "error":"session_budget","remaining":remaining,"est_price":ep,
+                "allowed_qty":allowed_qty, "allowed_dollars":remaining
+            }))
+        # Per-symbol throttle
+        cur = con.execute("""SELECT max_dollars, max_shares FROM session_symbol_limits
+                             WHERE session_id=? AND symbol=?""", (sess["id"], symbol.upper()))
+        row = cur.fetchone()
+        if row:
+            max_dollars, max_shares = row
+            sums = ledger.totals(con, sess["id"], symbol.upper())
+            used_dollars = _sum_status(sums, ("open","spent"), "amount")
+            used_shares  = _sum_status(sums, ("open","spent"), "qty")
+            if max_dollars is not None and (used_dollars + est_cost) > float(max_dollars):
+                raise HTTPException(400, json.dumps({"error":"symbol_limit_dollars","symbol":symbol.upper(),"used_dollars":used_dollars,"max_dollars":float(max_dollars),"est_cost":est_cost}))
+            if max_shares is not None and (est_qty is not None) and (used_shares + est_qty) > float(max_shares):
+                raise HTTPException(400, json.dumps({"error":"symbol_limit_shares","symbol":symbol.upper(),"used_shares":used_shares,"max_shares":float(max_shares),"new_qty":est_qty}))
+    return sess
+
+def _order_record_tx(con: sqlite3.Connection, order: Dict[str, Any], entry: Dict[str, Any],
+                     reserve: Optional[Tuple[int, str, str, float, float, float]]):
+    """Journal the submitted order and, for session buys, reserve its budget (each best-effort)."""
+    try: _insert_entry(con, "order_submitted", entry)
+    except sqlite3.Error: pass
+    if reserve is not None:
+        sid, sym, side, ep, qest, amt = reserve
+        try: _reserve(con, sid, order.get("id"), sym, side, ep, qest, amt)
+        except sqlite3.Error: pass
+
 # ---- Order placement / cancel ----
 @router.post("/order")
 async def order(
@@ -824,42 +1076,7 @@ async def order(
                     raise HTTPException(400, json.dumps({"error":"risk_limit","equity":equity,"est_price":est_price,"allowed_dollars":allowed_dollars,"allowed_qty":allowed_qty}))
 
     # Session budget enforcement (buys)
-    con = _db(); sess = _get_active_session(con)
-    if session_enforce and sess and sess["status"] == "active" and side == "buy":
-        summary = _session_summary(con)
-        if not summary or summary["status"] != "active":
-            con.close(); raise HTTPException(400, json.dumps({"error":"session_inactive"}))
-        remaining = f(summary["remaining"])
-        ep = est_price if est_price else f(limit_price)
-        # Cost estimation
-        if notional and notional > 0:
-            est_cost = float(notional)
-            est_qty  = (est_cost / ep) if (ep and ep > 0) else None
-        else:
-            if not ep or ep <= 0 or not qty:
-                con.close(); raise HTTPException(400, json.dumps({"error":"no_price_estimate"}))
-            est_cost = ep * float(qty)
-            est_qty  = float(qty)
-        if est_cost > remaining:
-            allowed_qty = None
-            if ep and ep > 0 and notional is None:
-                allowed_qty = int(max(0, floor(remaining / ep)))
-            con.close(); raise HTTPException(400, json.dumps({
-                "error":"session_budget","remaining":remaining,"est_price":ep,
-                "allowed_qty":allowed_qty, "allowed_dollars":remaining
-            }))
-        # Per-symbol throttle
-        cur = con.execute("""SELECT max_dollars, max_shares FROM session_symbol_limits
-                             WHERE session_id=? AND symbol=?""", (sess["id"], symbol.upper()))
-        row = cur.fetchone()
-        if row:
-            max_dollars, max_shares = row
-            used_dollars = _sum_by(con, sess["id"], symbol.upper(), ("open","spent"), "amount")
-            used_shares  = _sum_by(con, sess["id"], symbol.upper(), ("open","spent"), "qty")
-            if max_dollars is not None and (used_dollars + est_cost) > float(max_dollars):
-                con.close(); raise HTTPException(400, json.dumps({"error":"symbol_limit_dollars","symbol":symbol.upper(),"used_dollars":used_dollars,"max_dollars":float(max_dollars),"est_cost":est_cost}))
-            if max_shares is not None and (est_qty is not None) and (used_shares + est_qty) > float(max_shares):
-                con.close(); raise HTTPException(400, json.dumps({"error":"symbol_limit_shares","symbol":symbol.upper(),"used_shares":used_shares,"max_shares":float(max_shares),"new_qty":est_qty}))
+    sess = await dal.write(_order_session_check, symbol, side, qty, notional, est_price, limit_price, session_enforce)
 
     # Build order body
     body: Dict[str, Any] = {"symbol": symbol.upper(), "side": side, "type": type,
@@ -873,31 +1090,27 @@ async def order(
         async with httpx.AsyncClient(timeout=15) as client:
             r = await client.post(f"{trading_base()}/orders", headers=alpaca_headers(), json=body)
             if r.status_code >= 400:
-                con.close(); raise HTTPException(status_code=r.status_code, detail=r.text)
+                raise HTTPException(status_code=r.status_code, detail=r.text)
             order = r.json()
     except httpx.HTTPError as e:
-        con.close(); raise HTTPException(status_code=502, detail=f"Place order error: {e!s}")
+        raise HTTPException(status_code=502, detail=f"Place order error: {e!s}")
 
+    entry = dict(order_id=order.get("id"), symbol=symbol.upper(), side=side, qty=qty, price=limit_price,
+                 status=order.get("status"), note=note, payload=json.dumps(order))
+    reserve = None
+    if session_enforce and sess and sess["status"] == "active" and side == "buy":
+        ep = est_price if est_price else f(limit_price)
+        if notional and notional > 0:
+            amt = float(notional)
+            qest = (amt / ep) if (ep and ep > 0) else 0.0
+        else:
+            qest = float(qty or 0.0)
+            amt = (ep * qest) if (ep and qest) else 0.0
+        reserve = (sess["id"], symbol.upper(), side, ep if ep else 0.0, qest, amt)
     try:
-        log_entry("order_submitted", order_id=order.get("id"), symbol=symbol.upper(), side=side,
-                  qty=qty, price=limit_price, status=order.get("status"), note=note, payload=json.dumps(order))
+        await dal.write(_order_record_tx, order, entry, reserve)
     except Exception:
         pass
-
-    if session_enforce and sess and sess["status"] == "active" and side == "buy":
-        try:
-            ep = est_price if est_price else f(limit_price)
-            if notional and notional > 0:
-                amt = float(notional)
-                qest = (amt / ep) if (ep and ep > 0) else 0.0
-            else:
-                qest = float(qty or 0.0)
-                amt = (ep * qest) if (ep and qest) else 0.0
-            _reserve(con, sess["id"], order.get("id"), symbol.upper(), side, ep if ep else 0.0, qest, amt)
-        except Exception:
-            pass
-
-    con.close()
     return order
 
 @router.post("/order/cancel")
@@ -910,12 +1123,16 @@ async def cancel_order(order_id: str):
     except httpx.HTTPError as e:
         raise HTTPException(status_code=502, detail=f"Cancel order error: {e!s}")
     try:
-        con = _db(); _release_by_order(con, order_id); con.close()
-        log_entry("order_cancelled", order_id=order_id)
+        await dal.write(_release_by_order, order_id)
+        await alog_entry("order_cancelled", order_id=order_id)
     except Exception:
         pass
     return {"ok": True, "order_id": order_id}
 
+def _release_all_open(con: sqlite3.Connection):
+    con.execute("UPDATE session_reservations SET status='released' WHERE status='open'")
+    ledger.touch()
+
 @router.post("/orders/cancel_all")
 async def cancel_all_orders():
     try:
@@ -926,8 +1143,8 @@ async def cancel_all_orders():
     except httpx.HTTPError as e:
         raise HTTPException(status_code=502, detail=f"Cancel all error: {e!s}")
     try:
-        con = _db(); con.execute("UPDATE session_reservations SET status='released' WHERE status='open'"); con.commit(); con.close()
-        log_entry("orders_cancel_all")
+        await dal.write(_release_all_open)
+        await alog_entry("orders_cancel_all")
     except Exception:
         pass
     return {"ok": True}
@@ -935,30 +1152,94 @@ async def cancel_all_orders():
 # ---- journal / equity ----
 @router.get("/journal/entries")
 async def journal_entries(limit: int = Query(200, ge=1, le=2000)):
-    return {"entries": list_entries(limit=limit)}
+    return {"entries": await dal.read(_select_entries, limit)}
 
 @router.post("/journal/log")
 async def journal_log(kind: str = "note", symbol: Optional[str] = None, note: Optional[str] = None):
-    log_entry(kind, symbol=symbol, note=note)
+    await alog_entry(kind, symbol=symbol, note=note)
     return {"ok": True}
 
+_equity_series: Optional[EquitySeriesStore] = None
+_equity_task: Optional[asyncio.Task] = None
+
+def equity_series() -> EquitySeriesStore:
+    global _equity_series
+    if _equity_series is None:
+        _equity_series = EquitySeriesStore(EQUITY_SERIES_DIR)
+    return _equity_series
+
+async def _fetch_equity() -> float:
+    """Account equity; ValueError when the payload has none (never recorded as a 0 sample)."""
+    async with httpx.AsyncClient(timeout=10) as client:
+        r = await client.get(f"{trading_base()}/account", headers=alpaca_headers())
+        r.raise_for_status()
+        eq = r.json().get("equity")
+    try: return float(eq)
+    except (TypeError, ValueError): raise ValueError(f"account has no usable equity: {eq!r}")
+
+async def _equity_snapshot_loop():
+    while True:
+        try: equity_series().append(await _fetch_equity())
+        except Exception: pass  # next tick retries; the series just has a gap
+        await asyncio.sleep(EQUITY_SNAPSHOT_SECONDS)
+
+async def _start_equity_job():
+    global _equity_task
+    if EQUITY_SNAPSHOT_SECONDS > 0 and os.getenv("ALPACA_KEY") and os.getenv("ALPACA_SECRET"):
+        _equity_task = asyncio.create_task(_equity_snapshot_loop())
+
+async def _stop_equity_job():
+    if _equity_task is not None: _equity_task.cancel()
+    if _equity_series is not None: _equity_series.close()
+
+router.add_event_handler("startup", migrate_once)
+router.add_event_handler("startup", _start_equity_job)
+router.add_event_handler("shutdown", _stop_equity_job)
+router.add_event_handler("shutdown", _pool.close_all)
+router.add_event_handler("shutdown", dal.close)
+
 @router.post("/journal/snapshot_equity")
 async def journal_snapshot_equity():
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            r = await client.get(f"{trading_base()}/account", headers=alpaca_headers())
-            r.raise_for_status(); acc = r.json()
-    except httpx.HTTPError as e:
+        eq = await _fetch_equity()
+    except (httpx.HTTPError, ValueError) as e:
         raise HTTPException(status_code=502, detail=f"Snapshot equity error: {e!s}")
-    try: log_entry("equity", price=f(acc.get("equity")), note="equity snapshot", payload=json.dumps(acc))
+    equity_series().append(eq)
+    try: await alog_entry("equity", price=eq, note="equity snapshot")
     except Exception: pass
-    return {"ok": True, "equity": f(acc.get("equity"))}
+    return {"ok": True, "equity": eq}
 
 @router.get("/journal/equity")
 async def journal_equity(limit: int = Query(1000, ge=1, le=5000)):
-    entries = list_entries_by_kind("equity", limit=limit)
+    entries = await dal.read(_select_entries_by_kind, "equity", limit)
     return {"entries": entries}
 
+def _ts_arg(name: str, v: Optional[str]) -> Optional[float]:
+    if v is None or v == "": return None
+    try: return float(v)
+    except ValueError: pass
+    try: return datetime.fromisoformat(v.replace("Z", "+00:00")).timestamp()
+    except ValueError: raise HTTPException(400, f"{name}: expected ISO-8601 or epoch seconds")
+
+@router.get("/journal/equity/series")
+async def journal_equity_series(from_: Optional[str] = Query(None, alias="from"), to: Optional[str] = None,
+                                points: int = Query(500, ge=3, le=5000),
+                                mode: Literal["lttb", "ohlc"] = "lttb"):
+    """Equity between `from` and `to` (default: the last 24h), downsampled to at most `points`."""
+    end = _ts_arg("to", to) or time.time()
+    start = _ts_arg("from", from_)
+    if start is None: start = end - 86400
+    if start > end: raise HTTPException(400, "from must be <= to")
+    return await asyncio.to_thread(_equity_series_window, start, end, points, mode)
+
+def _equity_series_window(start: float, end: float, points: int, mode: str) -> Dict[str, Any]:
+    """Range read and downsampling in one worker-thread call; both are O(samples)."""
+    ts, eq = equity_series().range(start, end)
+    if mode == "ohlc":
+        return {"mode": "ohlc", "from": start, "to": end, "samples": len(ts), "bars": ohlc(ts, eq, start, end, points)}
+    return {"mode": "lttb", "from": start, "to": end, "samples": len(ts),
+            "points": [{"t": t, "equity": v} for t, v in lttb(ts, eq, points)]}
+
 # ---------- Universe (asset selection) ----------
 PRESETS: Dict[str, List[str]] = {
     "Tech Megacaps": ["AAPL","MSFT","NVDA","GOOGL","META","AMZN","TSLA"],
@@ -0,0 +1,122 @@
+# File: backend/app/legacy_app/app/services/budget_ledger.py
+"""
+Running session budget totals, maintained next to session_reservations.
+
+  session_budget         (session_id)          open/spent/released amount and qty
+  session_symbol_budget  (session_id, symbol)  the same, per symbol
+SQLite triggers on session_reservations keep both tables current. Every insert, status
+change, amount change or delete moves the row's amount/qty out of the old bucket and into
+the new one, in the same transaction. This covers every writer, including raw UPDATEs.
+`install()` creates the tables and triggers and rebuilds the totals once from the
+reservations.
+
+`BudgetLedger` mirrors those rows in memory, one instance per journal DB, shared by every
+connection to it. A lookup is a dict hit, and it falls back to one primary-key read when
+the journal may have changed since the row was cached. A change is detected as one of:
+  - `touch()` was called (this process changed reservations);
+  - PRAGMA data_version moved on the looking-up connection since that connection's last
+    lookup (another connection or process committed).
+data_version is per connection, so each connection's last value is remembered. A connection
+seen for the first time (or dropped from that bounded map) clears the mirror once.
+Totals come back in the `{status: {"amount": .., "qty": ..}}` shape of an aggregate
+over the reservations.
+"""
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+STATUSES = ("open", "spent", "released")
+FIELDS = ("amount", "qty")
+_COLS = [f"{st}_{fld}" for st in STATUSES for fld in FIELDS]
+_MAX_CONNECTIONS = 64  # per-connection data_version memory (pool + DAL readers fit comfortably)
+
+Totals = Dict[str, Dict[str, float]]
+
+def _tables(con: sqlite3.Connection) -> None:
+    cols = ", ".join(f"{c} REAL NOT NULL DEFAULT 0" for c in _COLS)
+    con.execute(f"CREATE TABLE IF NOT EXISTS session_budget (session_id INTEGER PRIMARY KEY, {cols})")
+    con.execute(f"""CREATE TABLE IF NOT EXISTS session_symbol_budget (
+                        session_id INTEGER NOT NULL, symbol TEXT NOT NULL, {cols},
+                        PRIMARY KEY (session_id, symbol)) WITHOUT ROWID""")
+
+def _apply(row: str, sign: str) -> str:
+    """Trigger body adding (sign '+') or removing ('-') reservation `row` (NEW/OLD) to/from both ledgers."""
+    sets = ", ".join(
+        f"{st}_{fld} = {st}_{fld} {sign} (CASE WHEN {row}.status='{st}' THEN COALESCE({row}.{fld}, 0) ELSE 0 END)"
+        for st in STATUSES for fld in FIELDS)
+    sym = f"COALESCE({row}.symbol, '')"
+    return (f"INSERT OR IGNORE INTO session_budget(session_id) VALUES ({row}.session_id);\n"
+            f"UPDATE session_budget SET {sets} WHERE session_id={row}.session_id;\n"
+            f"INSERT OR IGNORE INTO session_symbol_budget(session_id, symbol) VALUES ({row}.session_id, {sym});\n"
+            f"UPDATE session_symbol_budget SET {sets} WHERE session_id={row}.session_id AND symbol={sym};\n")
+
+def _triggers(con: sqlite3.Connection) -> None:
+    con.execute(f"""CREATE TRIGGER IF NOT EXISTS session_budget_ins AFTER INSERT ON session_reservations
+                    BEGIN {_apply('NEW', '+')} END""")
+    con.execute(f"""CREATE TRIGGER IF NOT EXISTS session_budget_upd
+                    AFTER UPDATE OF session_id, symbol, status, amount, qty ON session_reservations
+                    BEGIN {_apply('OLD', '-')}{_apply('NEW', '+')} END""")
+    con.execute(f"""CREATE TRIGGER IF NOT EXISTS session_budget_del AFTER DELETE ON session_reservations
+                    BEGIN {_apply('OLD', '-')} END""")
+
+def rebuild(con: sqlite3.Connection) -> None:
+    """Recompute both ledgers from session_reservations (one aggregate pass each)."""
+    sums = ", ".join(f"COALESCE(SUM(CASE WHEN status='{st}' THEN {fld} END), 0)" for st in STATUSES for fld in FIELDS)
+    cols = ", ".join(_COLS)
+    con.execute("DELETE FROM session_budget")
+    con.execute("DELETE FROM session_symbol_budget")
+    con.execute(f"INSERT INTO session_budget(session_id, {cols}) "
+                f"SELECT session_id, {sums} FROM session_reservations GROUP BY session_id")
+    con.execute(f"INSERT INTO session_symbol_budget(session_id, symbol, {cols}) "
+                f"SELECT session_id, COALESCE(symbol, ''), {sums} FROM session_reservations "
+                f"GROUP BY session_id, COALESCE(symbol, '')")
+
+def install(con: sqlite3.Connection) -> None:
+    """Create the ledger tables and triggers and rebuild the totals; the caller commits."""
+    _tables(con)
+    _triggers(con)
+    rebuild(con)
+
+def _totals(row: Optional[Tuple[float, ...]]) -> Totals:
+    vals = row or (0.0,) * len(_COLS)
+    it = iter(vals)
+    return {st: {fld: float(next(it)) for fld in FIELDS} for st in STATUSES}
+
+class BudgetLedger:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cache: Dict[Tuple[int, Optional[str]], Totals] = {}
+        # id(con) -> (con, data_version at its last lookup); holding `con` keeps its id from being reused
+        self._versions: "OrderedDict[int, Tuple[sqlite3.Connection, int]]" = OrderedDict()
+        self._gen = 0
+        self._cache_gen = 0
+
+    def touch(self) -> None:
+        """Call whenever this process writes session_reservations; cached totals reload on next use."""
+        with self._lock: self._gen += 1
+
+    def _valid_for(self, con: sqlite3.Connection) -> None:
+        dv = con.execute("PRAGMA data_version").fetchone()[0]
+        seen = self._versions.pop(id(con), None)
+        self._versions[id(con)] = (con, dv)
+        if len(self._versions) > _MAX_CONNECTIONS: self._versions.popitem(last=False)
+        if seen is None or seen[1] != dv or self._cache_gen != self._gen:
+            self._cache.clear()
+            self._cache_gen = self._gen
+
+    def totals(self, con: sqlite3.Connection, session_id: int, symbol: Optional[str] = None) -> Totals:
+        """Open/spent/released totals for a session, or for one of its symbols."""
+        key = (int(session_id), symbol)
+        with self._lock:
+            self._valid_for(con)
+            hit = self._cache.get(key)
+            if hit is not None: return hit
+            cols = ", ".join(_COLS)
+            if symbol is None:
+                row = con.execute(f"SELECT {cols} FROM session_budget WHERE session_id=?", (key[0],)).fetchone()
+            else:
+                row = con.execute(f"SELECT {cols} FROM session_symbol_budget WHERE session_id=? AND symbol=?",
+                                  (key[0], symbol)).fetchone()
+            out = self._cache[key] = _totals(row)
+            return out
@@ -0,0 +1,194 @@
+# File: backend/app/legacy_app/app/services/equity_series.py
+"""
+Intraday equity time series: an array-backed ring for today plus one columnar file per past
+day, with OHLC / LTTB downsampling for charts.
+
+On disk (EQUITY_SERIES_DIR):
+  YYYY-MM-DD.rows   today's samples, appended as little-endian (ts, equity) float64 pairs
+  YYYY-MM-DD.cols   a finished day: b"EQS1", count (uint64), ts[count], equity[count] (float64)
+Days are UTC. A .rows file from an earlier day is compacted into .cols on the next append
+or on startup.
+"""
+from __future__ import annotations
+import os, struct, threading, time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+MAGIC = b"EQS1"
+_HDR = struct.Struct("<4sQ")
+_ROW = struct.Struct("<dd")
+RING_CAPACITY = 86400  # one sample per second for a full day
+
+def _day(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d")
+
+def _day_start(day: str) -> float:
+    return datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()
+
+def _day_files(directory: Path, suffix: str) -> Dict[str, float]:
+    """{day: day start} for the `YYYY-MM-DD<suffix>` files in `directory`; other names are ignored."""
+    out: Dict[str, float] = {}
+    for p in directory.glob("*" + suffix):
+        try: out[p.stem] = _day_start(p.stem)
+        except ValueError: continue  # stray file (backup, editor temp, ...)
+    return out
+
+class _Ring:
+    """Fixed-capacity ring of (ts, equity) in two array('d'); oldest samples drop when full."""
+
+    def __init__(self, capacity: int):
+        self.cap = capacity
+        self.ts = array("d", bytes(8 * capacity)); self.eq = array("d", bytes(8 * capacity))
+        self.head = 0; self.n = 0
+
+    def append(self, t: float, v: float) -> None:
+        i = (self.head + self.n) % self.cap
+        self.ts[i] = t; self.eq[i] = v
+        if self.n < self.cap: self.n += 1
+        else: self.head = (self.head + 1) % self.cap
+
+    def clear(self) -> None:
+        self.head = 0; self.n = 0
+
+    def columns(self) -> Tuple[array, array]:
+        end = self.head + self.n
+        if end <= self.cap: return self.ts[self.head:end], self.eq[self.head:end]
+        k = end - self.cap
+        return self.ts[self.head:] + self.ts[:k], self.eq[self.head:] + self.eq[:k]
+
+def _write_cols(path: Path, ts: array, eq: array) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(_HDR.pack(MAGIC, len(ts)))
+        f.write(ts.tobytes()); f.write(eq.tobytes())
+        f.flush(); os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def read_cols(path: Path) -> Tuple[array, array]:
+    data = path.read_bytes()
+    magic, n = _HDR.unpack_from(data, 0)
+    if magic != MAGIC: raise ValueError(f"{path}: not an equity series file")
+    ts = array("d"); eq = array("d")
+    ts.frombytes(data[_HDR.size:_HDR.size + 8 * n]); eq.frombytes(data[_HDR.size + 8 * n:_HDR.size + 16 * n])
+    return ts, eq
+
+def _read_rows(path: Path) -> Tuple[array, array]:
+    data = path.read_bytes()
+    data = data[:len(data) - len(data) % _ROW.size]  # torn last row from a crash
+    flat = array("d"); flat.frombytes(data)
+    return flat[0::2], flat[1::2]
+
+class EquitySeriesStore:
+    def __init__(self, directory: Union[str, Path], ring_capacity: int = RING_CAPACITY):
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._ring = _Ring(ring_capacity)
+        self._today: Optional[str] = None
+        self._rows = None  # open append handle for today's .rows
+        self._cols_cache: Dict[str, Tuple[float, Tuple[array, array]]] = {}
+        self._recover()
+
+    def _recover(self) -> None:
+        today = _day(time.time())
+        for day in sorted(_day_files(self.dir, ".rows")):
+            if day != today: self._compact(self.dir / f"{day}.rows")
+        p = self.dir / f"{today}.rows"
+        if p.exists():
+            ts, eq = _read_rows(p)
+            for t, v in zip(ts, eq): self._ring.append(t, v)
+        self._today = today
+
+    def _compact(self, rows: Path) -> None:
+        ts, eq = _read_rows(rows)
+        if len(ts): _write_cols(rows.with_suffix(".cols"), ts, eq)
+        rows.unlink()
+
+    def append(self, equity: float, ts: Optional[float] = None) -> None:
+        t = time.time() if ts is None else float(ts)
+        day = _day(t)
+        with self._lock:
+            if day != self._today:
+                if self._rows is not None: self._rows.close(); self._rows = None
+                old = self.dir / f"{self._today}.rows"
+                if self._today and old.exists(): self._compact(old)
+                self._ring.clear(); self._today = day
+            if self._rows is None:
+                self._rows = open(self.dir / f"{day}.rows", "ab")
+            self._rows.write(_ROW.pack(t, float(equity))); self._rows.flush()
+            self._ring.append(t, float(equity))
+
+    def close(self) -> None:
+        with self._lock:
+            if self._rows is not None: self._rows.close(); self._rows = None
+
+    def _day_cols(self, day: str) -> Optional[Tuple[array, array]]:
+        p = self.dir / f"{day}.cols"
+        try: mtime = p.stat().st_mtime_ns
+        except OSError: return None
+        hit = self._cols_cache.get(day)
+        if hit is None or hit[0] != mtime:
+            hit = (mtime, read_cols(p))
+            self._cols_cache[day] = hit
+            while len(self._cols_cache) > 64: self._cols_cache.pop(next(iter(self._cols_cache)))
+        return hit[1]
+
+    def range(self, start: float, end: float) -> Tuple[array, array]:
+        """Samples with start <= ts <= end, oldest first."""
+        ts_out = array("d"); eq_out = array("d")
+        with self._lock:
+            today = self._today
+            ring = self._ring.columns() if today and _day_start(today) <= end else None
+        days = sorted(day for day, t0 in _day_files(self.dir, ".cols").items() if start < t0 + 86400 and t0 <= end)
+        for day in days:
+            cols = self._day_cols(day)
+            if cols is None: continue
+            ts, eq = cols
+            i, j = bisect_left(ts, start), bisect_right(ts, end)
+            ts_out.extend(ts[i:j]); eq_out.extend(eq[i:j])
+        if ring is not None:
+            ts, eq = ring
+            i, j = bisect_left(ts, start), bisect_right(ts, end)
+            ts_out.extend(ts[i:j]); eq_out.extend(eq[i:j])
+        return ts_out, eq_out
+
+# ---------- downsampling ----------
+
+def lttb(ts: List[float], ys: List[float], points: int) -> List[Tuple[float, float]]:
+    """Largest-Triangle-Three-Buckets: `points` samples that keep the visual shape of the line."""
+    n = len(ts)
+    if points >= n or points < 3: return list(zip(ts, ys))
+    out = [(ts[0], ys[0])]
+    every = (n - 2) / (points - 2)
+    a = 0
+    for i in range(points - 2):
+        lo = int(i * every) + 1; hi = int((i + 1) * every) + 1
+        nlo = hi; nhi = min(int((i + 2) * every) + 1, n)
+        if nlo >= nhi: nlo, nhi = n - 1, n
+        cnt = nhi - nlo
+        avg_t = sum(ts[nlo:nhi]) / cnt; avg_y = sum(ys[nlo:nhi]) / cnt
+        at, ay = ts[a], ys[a]
+        best, best_area = lo, -1.0
+        for k in range(lo, hi):
+            area = abs((at - avg_t) * (ys[k] - ay) - (at - ts[k]) * (avg_y - ay))
+            if area > best_area: best, best_area = k, area
+        out.append((ts[best], ys[best])); a = best
+    out.append((ts[-1], ys[-1]))
+    return out
+
+def ohlc(ts: List[float], ys: List[float], start: float, end: float, points: int) -> List[Dict[str, float]]:
+    """Equal-width time buckets over [start, end] (`ts` sorted, within the range); empty buckets are omitted."""
+    if not ts or points < 1: return []
+    width = max((end - start) / points, 1e-9)
+    bars: List[Dict[str, float]] = []
+    i, n = 0, len(ts)
+    for b in range(points):
+        j = bisect_left(ts, start + (b + 1) * width, i) if b < points - 1 else n
+        if j > i:
+            seg = ys[i:j]
+            bars.append({"t": start + b * width, "o": seg[0], "h": max(seg), "l": min(seg), "c": seg[-1], "n": j - i})
+            i = j
+    return bars
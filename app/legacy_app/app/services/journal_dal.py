@@ -0,0 +1,94 @@
+# File: backend/app/legacy_app/app/services/journal_dal.py
+"""
+Awaitable access to the journal SQLite DB for async endpoints.
+
+Work is passed in as a plain sync function `fn(con, *args)`. It runs off the event loop:
+  read(fn, ...)   on a small pool of reader threads. Each thread has its own long-lived
+                  connection opened with PRAGMA query_only, so WAL readers run in parallel.
+  write(fn, ...)  on one writer thread with one connection. Writes are serialized in
+                  process and never queue on SQLite's lock against each other. The unit
+                  is committed when `fn` returns and rolled back if it raises; the
+                  exception is re-raised to the awaiting caller.
+A slow checkpoint or busy wait therefore stalls only the DB threads, not every request
+on the loop.
+"""
+import asyncio
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+class JournalDAL:
+    def __init__(self, path: str, readers: int = 4, setup: Optional[Callable[[sqlite3.Connection], None]] = None,
+                 before_first_use: Optional[Callable[[], None]] = None):
+        self.path, self.setup = path, setup
+        self._before = before_first_use
+        self._ready = False
+        self.readers = max(1, readers)
+        self._readers: Optional[ThreadPoolExecutor] = None
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+        self._all: list = []
+        self._all_lock = threading.Lock()
+
+    def _connect(self, read_only: bool) -> sqlite3.Connection:
+        if not self._ready and self._before is not None:
+            self._before()  # e.g. the schema migration; idempotent and cheap once done
+        self._ready = True
+        con = sqlite3.connect(self.path, timeout=30, check_same_thread=False, cached_statements=256)
+        if self.setup is not None: self.setup(con)
+        if read_only: con.execute("PRAGMA query_only=ON")
+        with self._all_lock: self._all.append(con)
+        return con
+
+    def _con(self, read_only: bool) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = self._local.con = self._connect(read_only)
+        return con
+
+    def _run_read(self, fn: Callable[..., T], args: tuple) -> T:
+        con = self._con(True)
+        try:
+            return fn(con, *args)
+        finally:
+            if con.in_transaction: con.rollback()
+
+    def _run_write(self, fn: Callable[..., T], args: tuple) -> T:
+        con = self._con(False)
+        try:
+            out = fn(con, *args)
+            con.commit()
+            return out
+        except BaseException:
+            con.rollback()
+            raise
+
+    def _executor(self, write: bool) -> ThreadPoolExecutor:
+        with self._all_lock:  # created lazily, and again after close()
+            if write:
+                if self._writer is None:
+                    self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="journal-write")
+                return self._writer
+            if self._readers is None:
+                self._readers = ThreadPoolExecutor(max_workers=self.readers, thread_name_prefix="journal-read")
+            return self._readers
+
+    async def read(self, fn: Callable[..., T], *args: Any) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self._executor(False), self._run_read, fn, args)
+
+    async def write(self, fn: Callable[..., T], *args: Any) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self._executor(True), self._run_write, fn, args)
+
+    def close(self) -> None:
+        with self._all_lock:
+            pools, self._readers, self._writer = (self._readers, self._writer), None, None
+        for p in pools:
+            if p is not None: p.shutdown(wait=True)
+        with self._all_lock:
+            for con in self._all:
+                try: con.close()
+                except sqlite3.Error: pass
+            self._all.clear()
@@ -0,0 +1,66 @@
+# File: backend/app/legacy_app/app/services/sqlite_pool.py
+"""
+Bounded pool of long-lived SQLite connections.
+
+`acquire()` hands out an idle connection (or opens a new one when none is idle), and the
+connection's own `close()` puts it back. Existing `con = _db(); ...; con.close()` code
+therefore keeps working unchanged. Each connection keeps its own prepared-statement cache
+across requests. An open transaction is rolled back on return, which matches what a
+real close did. Idle connections above `size` are really closed. A connection that is
+never returned is simply garbage-collected, so the pool cannot run dry and block.
+"""
+import queue
+import sqlite3
+import threading
+from typing import Callable, Optional
+
+class PooledConnection(sqlite3.Connection):
+    _pool: Optional["ConnectionPool"] = None
+
+    def close(self) -> None:
+        pool = self._pool
+        if pool is None: return super().close()
+        pool.release(self)
+
+    def really_close(self) -> None:
+        self._pool = None
+        super().close()
+
+class ConnectionPool:
+    def __init__(self, path: str, size: int = 8, setup: Optional[Callable[[sqlite3.Connection], None]] = None,
+                 timeout: float = 30.0, cached_statements: int = 256):
+        self.path, self.size, self.setup = path, size, setup
+        self.timeout, self.cached_statements = timeout, cached_statements
+        self._idle: "queue.LifoQueue[PooledConnection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def _open(self) -> PooledConnection:
+        con = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False,
+                              cached_statements=self.cached_statements, factory=PooledConnection)
+        if self.setup is not None: self.setup(con)
+        with self._lock: self.opened += 1
+        con._pool = self
+        return con
+
+    def acquire(self) -> PooledConnection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._open()
+
+    def release(self, con: PooledConnection) -> None:
+        try:
+            if con.in_transaction: con.rollback()
+            con.row_factory = None
+        except sqlite3.Error:
+            con.really_close(); return
+        if self._idle.qsize() >= self.size:
+            con.really_close()
+        else:
+            self._idle.put(con)
+
+    def close_all(self) -> None:
+        while True:
+            try: self._idle.get_nowait().really_close()
+            except queue.Empty: return
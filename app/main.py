@@ -3,6 +3,7 @@ from __future__ import annotations
 
 import os
 import logging
+from contextlib import asynccontextmanager
 from importlib import import_module
 from typing import Optional, Tuple, List
 
@@ -30,10 +31,26 @@ if not logger.handlers:
 
 logger.info("Starting %s %s", APP_NAME, APP_VERSION)
 
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    from app.core import config_snapshot
+    config_snapshot.install_sighup()
+    # Warm the equity snapshot the daily-loss gate reads (app.pnl_service)
+    from app import pnl_service
+    if pnl_service.configured(): pnl_service.refresher.start()
+    yield
+    pnl_service.refresher.stop()
+    from app.services import lot_engine
+    if lot_engine._engine is not None: lot_engine._engine.stop()
+    # Drain queued audit records before the process exits
+    from app.core import audit
+    audit.shutdown()
+
 app = FastAPI(
     title=APP_NAME,
     version=APP_VERSION,
     contact={"name": "Orion", "url": "http://localhost"},
+    lifespan=lifespan,
 )
 
 def try_import_router(module_path: str) -> Optional[APIRouter]:
@@ -71,6 +88,7 @@ for m in (
     "app.routers.pnl",
     "app.routers.usage",   # <-- usage (tokens) we just stabilized
     "app.routers.auth",    # <-- NEW auth
+    "app.routers.audit",
 ):
     res = mount(m, prefix="/api")
     if res:
@@ -1,8 +1,9 @@
 # File: backend/app/pnl_service.py
 
 from __future__ import annotations
-import os, requests, time
-from typing import Optional, Tuple
+import os, requests, threading, time
+from requests.adapters import HTTPAdapter
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
 
 # Accept multiple env var names for compatibility
 def _get_env(names):
@@ -18,12 +19,10 @@ ALPACA_ENV    = (os.getenv("ALPACA_ENV") or "paper").strip().lower()
 BASE_DEFAULT  = "https://api.alpaca.markets/v2" if ALPACA_ENV == "live" else "https://paper-api.alpaca.markets/v2"
 ALPACA_BASE   = (os.getenv("ALPACA_BASE_URL") or BASE_DEFAULT).rstrip("/")
 
-# Simple in-process cache to avoid rate limits
-_last_fetch_ts: float = 0.0
-_last_equity: Optional[float] = None
-_equity: Optional[float] = None
-
-CACHE_SECONDS = int(os.getenv("PNL_CACHE_SECONDS", "5"))
+# Equity is refreshed by a background thread; the order path only reads the last snapshot.
+REFRESH_SECONDS = float(os.getenv("PNL_REFRESH_SECONDS", os.getenv("PNL_CACHE_SECONDS", "5")))
+MAX_STALENESS_SECONDS = float(os.getenv("PNL_MAX_STALENESS_SECONDS", "30"))
+STALE_POLICY = (os.getenv("PNL_STALE_POLICY") or "block").strip().lower()  # block | allow
 
 def _headers():
     if not (ALPACA_KEY and ALPACA_SECRET):
@@ -35,11 +34,26 @@ def _headers():
         "Content-Type": "application/json",
     }
 
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+def _http() -> requests.Session:
+    """One keep-alive session per process (TLS handshake once). Calls are serialized by the refresher."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                s = requests.Session()
+                s.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+                s.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+                _session = s
+    return _session
+
 def _fetch_account() -> Tuple[float, float]:
     """Return (last_equity, equity) as floats. last_equity is prior trading day end."""
     import json
     url = f"{ALPACA_BASE}/account"
-    r = requests.get(url, headers=_headers(), timeout=10)
+    r = _http().get(url, headers=_headers(), timeout=10)
     r.raise_for_status()
     data = r.json()
     try:
@@ -51,16 +65,121 @@ def _fetch_account() -> Tuple[float, float]:
         raise RuntimeError("Account missing last_equity/equity")
     return leq, eq
 
+class StaleEquityError(RuntimeError):
+    """No usable equity snapshot: never fetched, or older than MAX_STALENESS_SECONDS under the block policy."""
+
+class EquitySnapshot(NamedTuple):
+    last_equity: Optional[float] = None
+    equity: Optional[float] = None
+    fetched_at: float = 0.0          # epoch of the last successful fetch (0 = never)
+    error: Optional[str] = None      # last refresh error, cleared by the next success
+
+    @property
+    def loss(self) -> Optional[float]:
+        if self.last_equity is None or self.equity is None: return None
+        return max(0.0, self.last_equity - self.equity)
+
+    def age(self, now: Optional[float] = None) -> Optional[float]:
+        return None if not self.fetched_at else max(0.0, (time.time() if now is None else now) - self.fetched_at)
+
+    def report(self, now: Optional[float] = None) -> Dict[str, Any]:
+        age = self.age(now)
+        return {"loss": self.loss, "last_equity": self.last_equity, "equity": self.equity,
+                "age_s": None if age is None else round(age, 3),
+                "stale": age is None or age > MAX_STALENESS_SECONDS, "error": self.error}
+
+class EquityRefresher:
+    """
+    Keeps an EquitySnapshot of Alpaca /account fresh on a schedule (stale-while-revalidate).
+
+    `read()` never does I/O: it returns the current snapshot and, if it is older than the
+    refresh interval, wakes the background thread. Refreshes are single-flight; a caller of
+    `refresh()` that finds one in progress waits for it instead of issuing a second request.
+    Without Alpaca credentials (the default fetch and `configured()` false) no thread is started.
+    `read()` then reports the missing credentials as the snapshot error.
+    """
+
+    def __init__(self, interval: float = REFRESH_SECONDS, fetch: Optional[Callable[[], Tuple[float, float]]] = None):
+        self.interval = max(0.5, interval)
+        self._fetch = fetch or (lambda: _fetch_account())  # late-bound so tests can patch _fetch_account
+        self._enabled: Callable[[], bool] = (lambda: True) if fetch else (lambda: configured())
+        self._snap = EquitySnapshot()
+        self._flight = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.refreshes = 0
+        self.errors = 0
+
+    def start(self) -> None:
+        if not self._enabled(): return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="orion-equity-refresher", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self._stop.set(); self._wake.set()
+        t = self._thread
+        if t is not None: t.join(timeout=timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.refresh()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def refresh(self) -> EquitySnapshot:
+        if not self._flight.acquire(blocking=False):
+            with self._flight:  # somebody else is fetching: share their result
+                return self._snap
+        try:
+            try:
+                leq, eq = self._fetch()
+                self._snap = EquitySnapshot(leq, eq, time.time(), None)
+                self.refreshes += 1
+            except Exception as e:
+                self._snap = self._snap._replace(error=str(e))  # keep serving the last good values
+                self.errors += 1
+            return self._snap
+        finally:
+            self._flight.release()
+
+    def read(self) -> EquitySnapshot:
+        snap = self._snap
+        if not self._enabled():
+            return snap if snap.error else snap._replace(error="Alpaca credentials missing")
+        if self._thread is None or not self._thread.is_alive():
+            self.start()
+        else:
+            age = snap.age()
+            if age is None or age > self.interval: self._wake.set()
+        return snap
+
+refresher = EquityRefresher()
+
+def configured() -> bool:
+    return bool(ALPACA_KEY and ALPACA_SECRET)
+
+def snapshot() -> EquitySnapshot:
+    return refresher.read()
+
+def daily_loss(snap: EquitySnapshot, now: Optional[float] = None) -> Tuple[float, float, float]:
+    """Apply the staleness policy to `snap`; raises StaleEquityError when it must not be used."""
+    if snap.loss is None:
+        raise StaleEquityError(f"equity not available yet{': ' + snap.error if snap.error else ''}")
+    age = snap.age(now)
+    if STALE_POLICY != "allow" and age > MAX_STALENESS_SECONDS:
+        raise StaleEquityError(f"equity is {age:.0f}s old (max {MAX_STALENESS_SECONDS:.0f}s)"
+                               f"{': ' + snap.error if snap.error else ''}")
+    return snap.loss, float(snap.last_equity), float(snap.equity)
+
 def get_daily_loss() -> Tuple[float, float, float]:
     """
-    Returns (daily_loss, last_equity, equity).
+    Returns (daily_loss, last_equity, equity) from the in-memory snapshot (no network I/O).
     daily_loss = max(0, last_equity - equity). Positive = drawdown vs prior day close.
     """
-    global _last_fetch_ts, _last_equity, _equity
-    now = time.time()
-    if now - _last_fetch_ts > CACHE_SECONDS or _last_equity is None or _equity is None:
-        leq, eq = _fetch_account()
-        _last_equity, _equity = leq, eq
-        _last_fetch_ts = now
-    loss = max(0.0, float(_last_equity) - float(_equity))
-    return loss, float(_last_equity), float(_equity)
+    return daily_loss(snapshot())
@@ -5,13 +5,26 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, Any, List, Optional
 from datetime import datetime
-import json, threading
+import threading
 
 from app import pnl_service
+from app.core import audit, rules
+from app.core.rate_state import RateState, open_rate_state
+from app.core.settings import settings as core_settings
 from app.risk_settings import get_settings
 
-_last_order_lock = threading.Lock()
-_last_order_time: Optional[datetime] = None
+_rate_lock = threading.Lock()
+_rate: Optional[RateState] = None
+
+def _rate_state() -> RateState:
+    # last-order time shared by all workers; lives next to the audit log
+    global _rate
+    if _rate is None:
+        with _rate_lock:
+            if _rate is None:
+                path = Path(get_settings().AUDIT_LOG_PATH).parent / "rate_state_engine.bin"
+                _rate = open_rate_state(path, core_settings.RATE_STATE_BACKEND)
+    return _rate
 
 @dataclass
 class RiskResult:
@@ -28,69 +41,52 @@ def _audit_path() -> Path:
     return Path(get_settings().AUDIT_LOG_PATH)
 
 def write_audit(event: Dict[str, Any]) -> None:
-    path = _audit_path()
-    path.parent.mkdir(parents=True, exist_ok=True)
-    record = {"ts": _now_iso(), **event}
-    with path.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(record, ensure_ascii=False) + "\n")
-
-def evaluate_order(symbol: str, side: str, qty: float, price: Optional[float]) -> RiskResult:
-    s = get_settings()
-    reasons: List[str] = []
-    gates: Dict[str, bool] = {}
-    ctx: Dict[str, Any] = {}
-
-    # 1) session on?
-    gates["session_active"] = s.SESSION_ACTIVE
-    if not s.SESSION_ACTIVE:
-        reasons.append("Session is not active")
+    # queued to the shared background writer (app.core.audit)
+    audit.append(_audit_path(), {"ts": _now_iso(), "audit_id": audit.new_audit_id(), **event})
 
-    # 2) cool-off?
-    gates["cool_off"] = not s.COOL_OFF_ACTIVE
-    if s.COOL_OFF_ACTIVE:
-        reasons.append("Cool-off active")
+class _EngineSources:
+    """Rule-pipeline state adapter: risk.json flags, shared rate state and the broker-equity PnL."""
+    def __init__(self, s, ctx: Dict[str, Any]): self.s, self.ctx = s, ctx
+    def session_state(self, *a) -> str: return "ok"
+    def cooloff(self) -> bool: return bool(self.s.COOL_OFF_ACTIVE)
+    def circuit_breaker(self) -> bool: return False
+    def last_order_ts(self) -> Optional[float]: return _rate_state().last_order_ts()
+    def orders_in_window(self, seconds: int) -> int: return _rate_state().count(seconds)
+    def day_pnl(self) -> Optional[float]:
+        snap = pnl_service.snapshot()  # in-memory; the refresher thread does the /account calls
+        self.ctx["pnl"] = snap.report()
+        return -pnl_service.daily_loss(snap)[0]
 
-    # 3) throttle
-    global _last_order_time
-    with _last_order_lock:
-        if s.ORDER_THROTTLE_SECONDS > 0 and _last_order_time is not None:
-            delta = (datetime.utcnow() - _last_order_time).total_seconds()
-            if delta < s.ORDER_THROTTLE_SECONDS:
-                gates["throttle_ok"] = False
-                reasons.append(f"Order throttled ({s.ORDER_THROTTLE_SECONDS - int(delta)}s remaining)")
-            else:
-                gates["throttle_ok"] = True
-        else:
-            gates["throttle_ok"] = True
+# rule name -> this engine's historical gate key
+_GATE_KEYS = {"session": "session_active", "cooloff": "cool_off", "throttle": "throttle_ok",
+              "max_position_risk": "per_order_risk_ok", "daily_loss_limit": "daily_loss_limit_ok"}
 
-    # 4) per-order risk cap
-    if s.MAX_POSITION_RISK > 0 and price is not None and qty is not None:
-        order_risk = abs(qty) * float(price)
-        ctx["order_risk"] = order_risk
-        gates["per_order_risk_ok"] = order_risk <= s.MAX_POSITION_RISK
-        if not gates["per_order_risk_ok"]:
-            reasons.append(f"Per-order risk {order_risk:.2f} exceeds cap {s.MAX_POSITION_RISK:.2f}")
-    else:
-        gates["per_order_risk_ok"] = True
-
-    # 5) daily loss limit
-    if s.DAILY_LOSS_LIMIT > 0:
-        try:
-            loss, last_eq, eq = pnl_service.get_daily_loss()
-            ctx["pnl"] = {"loss": loss, "last_equity": last_eq, "equity": eq}
-            gates["daily_loss_limit_ok"] = loss <= s.DAILY_LOSS_LIMIT
-            if not gates["daily_loss_limit_ok"]:
-                reasons.append(f"Daily loss {loss:.2f} exceeds limit {s.DAILY_LOSS_LIMIT:.2f}")
-        except Exception as e:
-            gates["daily_loss_limit_ok"] = False
-            reasons.append(f"PnL unavailable: {e}")
-    else:
-        gates["daily_loss_limit_ok"] = True
-
-    ok = all(gates.values())
-    return RiskResult(ok=ok, reasons=reasons, gates=gates, context=ctx)
+def evaluate_order(symbol: str, side: str, qty: float, price: Optional[float], short_circuit: bool = False) -> RiskResult:
+    s = get_settings()
+    ctx: Dict[str, Any] = {}
+    cfg = {
+        "SESSION_ACTIVE": bool(s.SESSION_ACTIVE),
+        "ORDER_THROTTLE_SECONDS": s.ORDER_THROTTLE_SECONDS,
+        "MAX_POSITION_RISK": s.MAX_POSITION_RISK,
+        "DAILY_LOSS_LIMIT": s.DAILY_LOSS_LIMIT,
+    }
+    notional = abs(qty) * float(price) if price is not None and qty is not None else None
+    if notional is not None: ctx["order_risk"] = notional
+    outs = rules.evaluate(cfg, rules.Order(symbol, side, abs(qty or 0.0), notional), _EngineSources(s, ctx),
+                          short_circuit=short_circuit)
+    gates = {_GATE_KEYS.get(o.name, o.name): o.passed for o in outs}
+    reasons = [o.detail or o.reason for o in outs if not o.passed]
+    if all(gates.values()):
+        # claim the throttle slot atomically: of two workers that both saw it clear, one allows
+        got = _rate_state().try_acquire(1, None, 60, float(s.ORDER_THROTTLE_SECONDS or 0))
+        if got.throttled:
+            gates["throttle_ok"] = False
+            reasons.append("Throttle: another order was just allowed")
+    return RiskResult(ok=all(gates.values()), reasons=reasons, gates=gates, context=ctx)
 
 def mark_order_sent() -> None:
-    global _last_order_time
-    with _last_order_lock:
-        _last_order_time = datetime.utcnow()
+    """
+    Re-stamp the last-order time once the order has actually gone out. `evaluate_order` already
+    counted the order when it allowed it, so this only moves the throttle window.
+    """
+    _rate_state().record(0)
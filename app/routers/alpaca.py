@@ -2,13 +2,12 @@
 from __future__ import annotations
 
 import os
+import time
 from typing import Any, Dict, Optional
 
 from fastapi import APIRouter, HTTPException, status
 from pydantic import BaseModel
-from dotenv import load_dotenv
-
-load_dotenv(override=True)
+from app.core import config_snapshot  # noqa: F401 - loads .env once per process
 
 # IMPORTANT: standardized prefix (no '/api' here)
 router = APIRouter(prefix="/alpaca", tags=["alpaca"])
@@ -35,8 +34,9 @@ def get_clock() -> Dict[str, Any]:
     Client = _maybe_client()
     if Client:
         return Client().get_clock()  # type: ignore[call-arg]
-    # Safe fallback
-    return {"ok": True, "source": "fallback", "clock": {"is_open": False}}
+    # Fallback: answer from the local session calendar (risk preset timezone/hours + holiday file)
+    from app.core.risk import risk_state
+    return {"ok": True, "source": "fallback", "clock": risk_state.calendar(risk_state.preset).clock(time.time())}
 
 @router.get("/account")
 def get_account() -> Dict[str, Any]:
@@ -0,0 +1,84 @@
+# File: backend/app/routers/audit.py
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app.core import audit
+from app.core.audit_index import parse_ts
+from app.core.audit_segments import load_manifest, pending_raw, query_history, segment_dir
+
+# main.py includes this router with prefix="/api" => "/api/audit/*"
+router = APIRouter(prefix="/audit", tags=["audit"])
+
+
+@router.get("/stats")
+def audit_stats() -> Dict[str, Any]:
+    """Background audit writer counters: queue depth, back-pressure, batches, fsyncs, flush latency."""
+    return {"ok": True, "writer": audit.audit_writer.stats()}
+
+
+@router.post("/flush")
+def audit_flush() -> Dict[str, Any]:
+    return {"ok": audit.flush(), "writer": audit.audit_writer.stats()}
+
+
+def _source_path(source: str) -> Path:
+    if source == "risk":
+        from app.core import risk
+        return Path(risk.ORDERS_AUDIT_FILE)
+    if source == "preview":
+        from app.routers import orders
+        return Path(orders._paths(orders._env())["AUDIT_LOG_PATH"])
+    if source == "engine":
+        from app import risk_engine
+        return risk_engine._audit_path()
+    raise HTTPException(status_code=400, detail=f"unknown source: {source}")
+
+
+def _time_arg(name: str, value: Optional[str]) -> Optional[float]:
+    if value is None: return None
+    try: return float(value)
+    except ValueError: pass
+    t = parse_ts(value)
+    if t is None:
+        raise HTTPException(status_code=400, detail=f"{name}: expected ISO-8601 or epoch seconds")
+    return t
+
+
+@router.get("/query")
+def audit_query(
+    source: str = Query("risk", description="risk (/risk/evaluate) | preview (/orders/preview) | engine (risk_engine)"),
+    start: Optional[str] = Query(None, description="ISO-8601 or epoch seconds, inclusive"),
+    end: Optional[str] = Query(None, description="ISO-8601 or epoch seconds, inclusive"),
+    symbol: Optional[str] = None,
+    result: Optional[str] = Query(None, description="ALLOW | BLOCK"),
+    check: Optional[str] = Query(None, description="name of a failing check/gate"),
+    audit_id: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=5000),
+) -> Dict[str, Any]:
+    """
+    Filtered read of an audit log via its sidecar index: only matching records are read from disk.
+    Newest first, continuing into rotated segments (only blocks whose manifest entry can match are
+    decompressed). `more` means the limit was hit and older matches may exist.
+    """
+    path = _source_path(source)
+    t0, t1 = _time_arg("start", start), _time_arg("end", end)
+    res = result.upper() if result else None
+    if res not in (None, "ALLOW", "BLOCK"):
+        raise HTTPException(status_code=400, detail="result must be ALLOW or BLOCK")
+    audit.flush()  # include records still queued in the writer
+    out = query_history(path, start=t0, end=t1, symbol=symbol, result=res, check=check,
+                        audit_id=audit_id, limit=limit)
+    return {"ok": True, "source": source, "path": str(path), **out}
+
+
+@router.get("/segments")
+def audit_segments(source: str = "risk") -> Dict[str, Any]:
+    """Rotated history of an audit log: manifest (time range / record count per segment) and pending rotations."""
+    seg_dir = segment_dir(_source_path(source))
+    segments = [{**{k: v for k, v in seg.items() if k != "blocks"}, "blocks": len(seg.get("blocks", []))}
+                for seg in load_manifest(seg_dir).get("segments", [])]
+    return {"ok": True, "source": source, "dir": str(seg_dir), "segments": segments,
+            "pending": [p.name for p in pending_raw(seg_dir)]}
@@ -1,17 +1,16 @@
 from __future__ import annotations
 
-import json
-import os
-import time
+import hashlib, json, os, threading, time
+from collections import ChainMap, OrderedDict
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional, Literal, Dict, Any, List
+from types import MappingProxyType
+from typing import Optional, Literal, Dict, Any, List, Mapping, NamedTuple, Tuple
 
-from fastapi import APIRouter
-from pydantic import BaseModel, field_validator, constr, conint, confloat
-from dotenv import load_dotenv
+from fastapi import APIRouter, Header, HTTPException, Response
+from pydantic import BaseModel, Field, field_validator, constr, conint, confloat
 
-load_dotenv(override=True)
+from app.core import audit, config_snapshot, rules
 
 router = APIRouter(tags=["orders"])
 
@@ -30,7 +29,8 @@ class OrderPreviewRequest(BaseModel):
 
     # Optional metadata; tests/dev can pass overrides here
     # meta = { "overrides": { "MAX_POSITION_RISK": 10, "ORDER_THROTTLE_SECONDS": 60,
-    #                         "FORCE_THROTTLE_BLOCK": 1, "FORCE_COOLOFF_BLOCK": 1, ... } }
+    #                         "FORCE_THROTTLE_BLOCK": 1, "FORCE_COOLOFF_BLOCK": 1, ... },
+    #          "short_circuit": true }   # stop at the first failing check
     meta: Optional[Dict[str, Any]] = None
 
     @field_validator("limit_price")
@@ -60,7 +60,20 @@ class OrderPreviewResponse(BaseModel):
     timestamp_utc: str
 
 
-# ---------- Dynamic env & paths (NO import-time caching) ----------
+class OrderPreviewBatchRequest(BaseModel):
+    orders: List[OrderPreviewRequest] = Field(..., min_length=1, max_length=5000)
+    # Batch-level meta: overrides apply to every order (per-order meta is ignored here)
+    meta: Optional[Dict[str, Any]] = None
+
+
+class OrderPreviewBatchResponse(BaseModel):
+    ok: bool
+    status: Literal["PASSED", "PASSED_WITH_WARNINGS", "BLOCKED"]
+    results: List[OrderPreviewResponse]
+    aggregate: Dict[str, Any]
+
+
+# ---------- Config snapshot (built at startup, swapped on /api/system/reload or SIGHUP) ----------
 
 ENV_KEYS = (
     "APP_NAME",
@@ -76,10 +89,17 @@ ENV_KEYS = (
     "FORCE_THROTTLE_BLOCK",
     "FORCE_COOLOFF_BLOCK",
 )
+_FLOAT_KEYS = frozenset({"DAILY_LOSS_LIMIT", "MAX_POSITION_RISK"})
+_INT_KEYS = frozenset({"ORDER_THROTTLE_SECONDS", "COOLOFF_AFTER_DRAWDOWN", "SESSION_ENABLED",
+                       "FORCE_THROTTLE_BLOCK", "FORCE_COOLOFF_BLOCK"})
+_PATH_KEYS = frozenset({"LOG_DIR", "CONFIG_DIR", "AUDIT_LOG_PATH"})
 
-def _env(overrides: Dict[str, Any] | None = None) -> Dict[str, Any]:
-    # Read from environment each call; apply optional per-request overrides last.
-    e: Dict[str, Any] = {
+class PreviewConfig(NamedTuple):
+    env: Mapping[str, Any]     # read-only
+    paths: Mapping[str, str]   # read-only, directories already created
+
+def _read_env() -> Dict[str, Any]:
+    return {
         "APP_NAME": os.getenv("APP_NAME", "orion-backend"),
         "LOG_DIR": os.getenv("LOG_DIR", r"C:\AI files\Orion\orion-backend\logs"),
         "CONFIG_DIR": os.getenv("CONFIG_DIR", r"C:\AI files\Orion\orion-backend\config"),
@@ -89,24 +109,14 @@ def _env(overrides: Dict[str, Any] | None = None) -> Dict[str, Any]:
         "ORDER_THROTTLE_SECONDS": int(os.getenv("ORDER_THROTTLE_SECONDS", "5")),
         "COOLOFF_AFTER_DRAWDOWN": int(os.getenv("COOLOFF_AFTER_DRAWDOWN", "1")),
         "SESSION_ENABLED": int(os.getenv("SESSION_ENABLED", "1")),
+        # duplicate previews within this window (capped at ORDER_THROTTLE_SECONDS) replay the cached response
+        "PREVIEW_CACHE_TTL_SECONDS": float(os.getenv("PREVIEW_CACHE_TTL_SECONDS", "2.0")),
         # default off for force flags
         "FORCE_THROTTLE_BLOCK": 0,
         "FORCE_COOLOFF_BLOCK": 0,
     }
-    if overrides:
-        for k, v in overrides.items():
-            if k not in ENV_KEYS:
-                continue
-            if k in {"DAILY_LOSS_LIMIT", "MAX_POSITION_RISK"}:
-                e[k] = float(v)
-            elif k in {"ORDER_THROTTLE_SECONDS", "COOLOFF_AFTER_DRAWDOWN", "SESSION_ENABLED",
-                       "FORCE_THROTTLE_BLOCK", "FORCE_COOLOFF_BLOCK"}:
-                e[k] = int(v)
-            else:
-                e[k] = v
-    return e
-
-def _paths(e: Dict[str, Any]) -> Dict[str, str]:
+
+def _resolve_paths(e: Mapping[str, Any]) -> Dict[str, str]:
     log_dir = e["LOG_DIR"]
     cfg_dir = e["CONFIG_DIR"]
     Path(log_dir).mkdir(parents=True, exist_ok=True)
@@ -120,6 +130,30 @@ def _paths(e: Dict[str, Any]) -> Dict[str, str]:
         "COOLOFF_FLAG_FILE": os.path.join(cfg_dir, "cooloff_active.flag"),
     }
 
+def _build_config() -> PreviewConfig:
+    e = _read_env()
+    return PreviewConfig(MappingProxyType(e), MappingProxyType(_resolve_paths(e)))
+
+config_snapshot.register("orders.preview", _build_config)
+
+def _env(overrides: Dict[str, Any] | None = None) -> Mapping[str, Any]:
+    # Current snapshot; per-request overrides layer on top as a ChainMap (the snapshot is never copied).
+    base = config_snapshot.get("orders.preview").env
+    if not overrides:
+        return base
+    top: Dict[str, Any] = {}
+    for k, v in overrides.items():
+        if k not in ENV_KEYS:
+            continue
+        top[k] = float(v) if k in _FLOAT_KEYS else int(v) if k in _INT_KEYS else v
+    return ChainMap(top, base) if top else base
+
+def _paths(e: Mapping[str, Any]) -> Mapping[str, str]:
+    cfg = config_snapshot.get("orders.preview")
+    if e is cfg.env or not (isinstance(e, ChainMap) and _PATH_KEYS & e.maps[0].keys()):
+        return cfg.paths
+    return _resolve_paths(e)  # an override moved a directory: resolve (and create) it for this request
+
 # ---------- Utilities ----------
 
 def _now_utc_iso() -> str:
@@ -134,9 +168,6 @@ def _read_last_order_ts(path: str) -> Optional[float]:
     except Exception:
         return None
 
-def _cooloff_active(flag_path: str, enforce_flag: int) -> bool:
-    return enforce_flag == 1 and Path(flag_path).exists()
-
 def _estimate_notional(req: OrderPreviewRequest) -> Optional[float]:
     if req.order_type == "limit" and req.limit_price:
         return float(req.qty) * float(req.limit_price)
@@ -145,99 +176,62 @@ def _estimate_notional(req: OrderPreviewRequest) -> Optional[float]:
     return None
 
 def _append_audit(audit_path: str, entry: Dict[str, Any]) -> str:
-    Path(os.path.dirname(audit_path)).mkdir(parents=True, exist_ok=True)
-    audit_id = f"{int(time.time()*1000)}-{os.getpid()}"
-    entry = {"audit_id": audit_id, **entry}
-    with open(audit_path, "a", encoding="utf-8") as f:
-        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    # Queued to the shared background writer; the id is unique per process even at high rates
+    audit_id = audit.new_audit_id()
+    audit.append(audit_path, {"audit_id": audit_id, **entry})
     return audit_id
 
-# ---------- Risk evaluation (uses dynamic env) ----------
+def _append_audit_many(audit_path: str, entries: List[Dict[str, Any]]) -> List[str]:
+    ids = [audit.new_audit_id() for _ in entries]
+    audit.append_many(audit_path, ({"audit_id": i, **e} for i, e in zip(ids, entries)))
+    return ids
+
+# ---------- Risk evaluation (app.core.rules pipeline, config snapshot) ----------
+
+class _PreviewSources:
+    """Rule-pipeline state adapter over the preview's env-derived files (read at evaluation time)."""
+    def __init__(self, p: Mapping[str, str]): self.p = p
+    def session_state(self, *a) -> str: return "ok"  # preview gates on SESSION_ENABLED only
+    def cooloff(self) -> bool: return Path(self.p["COOLOFF_FLAG_FILE"]).exists()
+    def circuit_breaker(self) -> bool: return False
+    def last_order_ts(self) -> Optional[float]: return _read_last_order_ts(self.p["LAST_ORDER_TS_FILE"])
+    def orders_in_window(self, seconds: int) -> int: return 0
+    def day_pnl(self) -> Optional[float]:
+        from app.services.pnl_source import get_day_pnl  # local import to avoid cycles at startup
+        return get_day_pnl(self.p["LOG_DIR"])
+
+def _rule_config(e: Mapping[str, Any]) -> Dict[str, Any]:
+    return {
+        "SESSION_ACTIVE": e["SESSION_ENABLED"] == 1,
+        "COOLOFF_ENFORCED": e["COOLOFF_AFTER_DRAWDOWN"] == 1,
+        "FORCE_COOLOFF_BLOCK": int(e.get("FORCE_COOLOFF_BLOCK", 0)) == 1,
+        "FORCE_THROTTLE_BLOCK": int(e.get("FORCE_THROTTLE_BLOCK", 0)) == 1,
+        "ORDER_THROTTLE_SECONDS": e["ORDER_THROTTLE_SECONDS"],
+        "MAX_POSITION_RISK": e["MAX_POSITION_RISK"],
+        "DAILY_LOSS_LIMIT": e["DAILY_LOSS_LIMIT"],
+    }
+
+_CHECK_NAMES = {"session": "session_enabled"}  # preview's historical check names
 
-def evaluate_risk(req: OrderPreviewRequest, e: Dict[str, Any], p: Dict[str, str]) -> List[RiskCheckResult]:
-    checks: List[RiskCheckResult] = []
+def _to_checks(outs: List[rules.Outcome]) -> List[RiskCheckResult]:
+    return [RiskCheckResult(name=_CHECK_NAMES.get(o.name, o.name), passed=o.passed, detail=o.detail) for o in outs]
 
-    # 0) Force-blocks for deterministic tests/dev
-    if int(e.get("FORCE_COOLOFF_BLOCK", 0)) == 1:
-        checks.append(RiskCheckResult(name="cooloff", passed=False, detail="Forced cool-off block"))
-    if int(e.get("FORCE_THROTTLE_BLOCK", 0)) == 1:
-        checks.append(RiskCheckResult(name="throttle", passed=False, detail="Forced throttle block"))
+def _order(req: OrderPreviewRequest) -> rules.Order:
+    return rules.Order(req.symbol, req.side, float(req.qty), _estimate_notional(req))
 
-    # 1) Session enabled
-    if e["SESSION_ENABLED"] != 1:
-        checks.append(RiskCheckResult(name="session_enabled", passed=False, detail="Session disabled"))
-    else:
-        checks.append(RiskCheckResult(name="session_enabled", passed=True))
-
-    # 2) Cool-off after drawdown
-    if not any(c.name == "cooloff" and not c.passed for c in checks):  # skip real check if forced
-        if _cooloff_active(p["COOLOFF_FLAG_FILE"], e["COOLOFF_AFTER_DRAWDOWN"]):
-            checks.append(RiskCheckResult(name="cooloff", passed=False, detail="Cool-off active"))
-        else:
-            checks.append(RiskCheckResult(name="cooloff", passed=True))
-
-    # 3) Throttle
-    if not any(c.name == "throttle" and not c.passed for c in checks):  # skip real check if forced
-        last_ts = _read_last_order_ts(p["LAST_ORDER_TS_FILE"])
-        if last_ts is not None:
-            elapsed = time.time() - last_ts
-            if elapsed < e["ORDER_THROTTLE_SECONDS"]:
-                checks.append(RiskCheckResult(
-                    name="throttle",
-                    passed=False,
-                    detail=f"Throttle: wait {e['ORDER_THROTTLE_SECONDS'] - int(elapsed)}s"
-                ))
-            else:
-                checks.append(RiskCheckResult(name="throttle", passed=True, detail=f"Elapsed {int(elapsed)}s"))
-        else:
-            checks.append(RiskCheckResult(name="throttle", passed=True, detail="No prior order timestamp"))
-
-    # 4) Per-position risk
-    notional = _estimate_notional(req)
-    if notional is None:
-        checks.append(RiskCheckResult(
-            name="max_position_risk",
-            passed=True,
-            detail="Notional unknown (no limit_price / price_estimate); skipped strict check"
-        ))
-    else:
-        if notional > e["MAX_POSITION_RISK"]:
-            checks.append(RiskCheckResult(
-                name="max_position_risk",
-                passed=False,
-                detail=f"Notional {notional:.2f} exceeds MAX_POSITION_RISK {e['MAX_POSITION_RISK']:.2f}"
-            ))
-        else:
-            checks.append(RiskCheckResult(
-                name="max_position_risk",
-                passed=True,
-                detail=f"Notional {notional:.2f} ≤ {e['MAX_POSITION_RISK']:.2f}"
-            ))
-
-    # 5) Daily loss limit — enforced when PnL available
-    from app.services.pnl_source import get_day_pnl  # local import to avoid cycles at startup
-    day_pnl = get_day_pnl(p["LOG_DIR"])
-    if day_pnl is None:
-        checks.append(RiskCheckResult(
-            name="daily_loss_limit",
-            passed=True,
-            detail=f"PnL unknown; limit {e['DAILY_LOSS_LIMIT']:.2f} not enforced"
-        ))
-    else:
-        if day_pnl <= -abs(e["DAILY_LOSS_LIMIT"]):
-            checks.append(RiskCheckResult(
-                name="daily_loss_limit",
-                passed=False,
-                detail=f"Day PnL {day_pnl:.2f} ≤ -{e['DAILY_LOSS_LIMIT']:.2f} (blocked)"
-            ))
-        else:
-            checks.append(RiskCheckResult(
-                name="daily_loss_limit",
-                passed=True,
-                detail=f"Day PnL {day_pnl:.2f} within limit {e['DAILY_LOSS_LIMIT']:.2f}"
-            ))
-
-    return checks
+def evaluate_risk(req: OrderPreviewRequest, e: Mapping[str, Any], p: Mapping[str, str],
+                  short_circuit: bool = False) -> List[RiskCheckResult]:
+    return _to_checks(rules.evaluate(_rule_config(e), _order(req), _PreviewSources(p), short_circuit=short_circuit))
+
+def evaluate_risk_batch(reqs: List[OrderPreviewRequest], e: Mapping[str, Any], p: Mapping[str, str]) -> Tuple[List[List[RiskCheckResult]], List[Optional[float]]]:
+    """
+    Evaluate many previews against one env snapshot. Order-independent gates and the PnL lookup
+    run once; only the notional / MAX_POSITION_RISK comparison is per order.
+    Returns (per-order checks, per-order notional estimates).
+    """
+    orders = [_order(r) for r in reqs]
+    per_order = rules.evaluate_many(_rule_config(e), orders, _PreviewSources(p))
+    return [_to_checks(outs) for outs in per_order], [o.notional for o in orders]
 
 def _final_status(checks: List[RiskCheckResult]) -> Literal["PASSED", "PASSED_WITH_WARNINGS", "BLOCKED"]:
     any_fail = any(not c.passed for c in checks)
@@ -246,23 +240,78 @@ def _final_status(checks: List[RiskCheckResult]) -> Literal["PASSED", "PASSED_WI
     warn = any(c.name == "max_position_risk" and "skipped" in (c.detail or "").lower() for c in checks)
     return "PASSED_WITH_WARNINGS" if warn else "PASSED"
 
-# ---------- Routes ----------
+# ---------- Duplicate suppression (Idempotency-Key / canonical request hash) ----------
 
-@router.post("/orders/preview", response_model=OrderPreviewResponse, status_code=200)
-def orders_preview(req: OrderPreviewRequest):
+class _PreviewCache:
     """
-    DRY-RUN ONLY: evaluates risk gates and writes an audit line.
-    Does NOT submit to any broker. Does NOT update throttle state.
+    In-memory LRU of recent preview responses keyed by Idempotency-Key or by a hash of the
+    canonical request plus the state version. A duplicate arriving while the first is still
+    being evaluated waits for it (single-flight) instead of evaluating and auditing again.
     """
-    overrides = (req.meta or {}).get("overrides") if req.meta else None
-    e = _env(overrides=overrides)
-    p = _paths(e)
 
-    checks = evaluate_risk(req, e, p)
-    status_final = _final_status(checks)
-    notional = _estimate_notional(req)
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._d: "OrderedDict[str, Tuple[float, str, OrderPreviewResponse]]" = OrderedDict()
+        self._inflight: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def _get(self, key: str, now: float) -> Optional[Tuple[str, OrderPreviewResponse]]:
+        hit = self._d.get(key)
+        if hit is None: return None
+        if hit[0] <= now:
+            del self._d[key]
+            return None
+        self._d.move_to_end(key)
+        return hit[1], hit[2]
+
+    def get_or_claim(self, key: str, wait: float = 5.0) -> Tuple[Optional[Tuple[str, OrderPreviewResponse]], bool]:
+        """(cached (body_hash, response), False), or (None, True) after claiming `key` for release()."""
+        while True:
+            with self._lock:
+                hit = self._get(key, time.monotonic())
+                if hit is not None:
+                    self.hits += 1
+                    return hit, False
+                ev = self._inflight.get(key)
+                if ev is None:
+                    self._inflight[key] = threading.Event()
+                    self.misses += 1
+                    return None, True
+            if not ev.wait(wait):
+                return None, False  # the first request is stuck; evaluate independently
+
+    def release(self, key: str, body_hash: str, resp: Optional[OrderPreviewResponse], ttl: float) -> None:
+        with self._lock:
+            if resp is not None and ttl > 0:
+                self._d[key] = (time.monotonic() + ttl, body_hash, resp)
+                self._d.move_to_end(key)
+                while len(self._d) > self.max_entries: self._d.popitem(last=False)
+            ev = self._inflight.pop(key, None)
+        if ev is not None: ev.set()
+
+    def clear(self) -> None:
+        with self._lock: self._d.clear()
+
+_preview_cache = _PreviewCache()
+
+def _state_version(p: Mapping[str, str]) -> Tuple[int, ...]:
+    # config snapshot version plus the files the preview gates read (cool-off, throttle, PnL)
+    sig = [config_snapshot.current().version]
+    for path in (p["COOLOFF_FLAG_FILE"], p["LAST_ORDER_TS_FILE"], os.path.join(p["LOG_DIR"], "pnl.json")):
+        try: sig.append(os.stat(path).st_mtime_ns)
+        except OSError: sig.append(0)
+    return tuple(sig)
+
+def _request_hash(req: OrderPreviewRequest) -> str:
+    canon = json.dumps(req.model_dump(), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(canon.encode("utf-8"), digest_size=16).hexdigest()
+
+# ---------- Routes ----------
 
-    entry = {
+def _audit_entry(req: OrderPreviewRequest, e: Mapping[str, Any], p: Mapping[str, str], overrides: Optional[Dict[str, Any]],
+                 status_final: str, checks: List[RiskCheckResult], notional: Optional[float]) -> Dict[str, Any]:
+    return {
         "ts": datetime.now(timezone.utc).isoformat(),
         "app": e["APP_NAME"],
         "kind": "orders.preview",
@@ -272,16 +321,14 @@ def orders_preview(req: OrderPreviewRequest):
             "checks": [c.model_dump() for c in checks],
             "notional_estimate": notional,
         },
-        "paths": p,
+        "paths": dict(p),
         "overrides": overrides or {},
     }
-    audit_id = _append_audit(p["AUDIT_LOG_PATH"], entry)
-
-    any_fail = any(not c.passed for c in checks)
-    ok = not any_fail  # explicit
 
+def _preview_response(req: OrderPreviewRequest, status_final: str, checks: List[RiskCheckResult],
+                      notional: Optional[float], audit_id: str) -> OrderPreviewResponse:
     return OrderPreviewResponse(
-        ok=ok,
+        ok=not any(not c.passed for c in checks),  # explicit
         status=status_final,
         symbol=req.symbol,
         side=req.side,
@@ -293,6 +340,79 @@ def orders_preview(req: OrderPreviewRequest):
         timestamp_utc=datetime.now(timezone.utc).isoformat(),
     )
 
+@router.post("/orders/preview", response_model=OrderPreviewResponse, status_code=200)
+def orders_preview(req: OrderPreviewRequest, response: Response,
+                   idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key")):
+    """
+    DRY-RUN ONLY: evaluates risk gates and writes an audit line.
+    Does NOT submit to any broker. Does NOT update throttle state.
+
+    A repeat of the same request (same `Idempotency-Key`, or identical body while the gate
+    state is unchanged) within PREVIEW_CACHE_TTL_SECONDS, capped at ORDER_THROTTLE_SECONDS,
+    returns the first response (`Idempotent-Replayed: true`) without re-evaluating or
+    writing another audit line. Reusing a key with a different body is a 409.
+    """
+    overrides = (req.meta or {}).get("overrides") if req.meta else None
+    e = _env(overrides=overrides)
+    p = _paths(e)
+
+    ttl = min(e["PREVIEW_CACHE_TTL_SECONDS"], e["ORDER_THROTTLE_SECONDS"])
+    body_hash = _request_hash(req) if ttl > 0 else ""
+    key = (f"k:{idempotency_key}" if idempotency_key else f"h:{body_hash}:{_state_version(p)}") if ttl > 0 else None
+    hit, claimed = _preview_cache.get_or_claim(key) if key else (None, False)
+    if hit is not None:
+        if hit[0] != body_hash:
+            raise HTTPException(status_code=409, detail="Idempotency-Key was already used for a different request")
+        response.headers["Idempotent-Replayed"] = "true"
+        return hit[1]
+
+    resp: Optional[OrderPreviewResponse] = None
+    try:
+        checks = evaluate_risk(req, e, p, short_circuit=bool((req.meta or {}).get("short_circuit")))
+        status_final = _final_status(checks)
+        notional = _estimate_notional(req)
+
+        audit_id = _append_audit(p["AUDIT_LOG_PATH"], _audit_entry(req, e, p, overrides, status_final, checks, notional))
+        resp = _preview_response(req, status_final, checks, notional, audit_id)
+        return resp
+    finally:
+        if claimed: _preview_cache.release(key, body_hash, resp, ttl)
+
+@router.post("/orders/preview/batch", response_model=OrderPreviewBatchResponse, status_code=200)
+def orders_preview_batch(batch: OrderPreviewBatchRequest):
+    """
+    DRY-RUN ONLY: batch form of /orders/preview (e.g. all legs of a rebalance in one call).
+    Shared gates are evaluated once; one audit line per order, written in a single append.
+    """
+    overrides = (batch.meta or {}).get("overrides") if batch.meta else None
+    e = _env(overrides=overrides)
+    p = _paths(e)
+
+    per_order, notionals = evaluate_risk_batch(batch.orders, e, p)
+    statuses = [_final_status(c) for c in per_order]
+    entries = [_audit_entry(r, e, p, overrides, st, c, n)
+               for r, st, c, n in zip(batch.orders, statuses, per_order, notionals)]
+    audit_ids = _append_audit_many(p["AUDIT_LOG_PATH"], entries)
+    results = [_preview_response(r, st, c, n, a)
+               for r, st, c, n, a in zip(batch.orders, statuses, per_order, notionals, audit_ids)]
+
+    blocked = sum(1 for st in statuses if st == "BLOCKED")
+    if blocked:
+        status_final = "BLOCKED"
+    elif any(st == "PASSED_WITH_WARNINGS" for st in statuses):
+        status_final = "PASSED_WITH_WARNINGS"
+    else:
+        status_final = "PASSED"
+    known = [n for n in notionals if n is not None]
+    aggregate = {
+        "count": len(results),
+        "passed": len(results) - blocked,
+        "blocked": blocked,
+        "notional_total": float(sum(known)),
+        "notional_unknown": len(notionals) - len(known),
+    }
+    return OrderPreviewBatchResponse(ok=blocked == 0, status=status_final, results=results, aggregate=aggregate)
+
 @router.get("/orders/schema", tags=["orders"])
 def orders_schema():
     e = _env()
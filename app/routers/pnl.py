@@ -4,11 +4,10 @@ import os
 from typing import Dict, Any
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, confloat
-from dotenv import load_dotenv
+from app.core import config_snapshot  # noqa: F401 - loads .env once per process
+from app.services.lot_engine import get_engine
 from app.services.pnl_source import get_day_pnl, set_day_pnl
 
-load_dotenv(override=True)
-
 router = APIRouter(prefix="/pnl", tags=["pnl"])
 
 class PnLUpdate(BaseModel):
@@ -20,10 +19,18 @@ def pnl_current() -> Dict[str, Any]:
     pnl = get_day_pnl(log_dir)
     return {"ok": True, "day_pnl": pnl}
 
+@router.get("/positions")
+def pnl_positions() -> Dict[str, Any]:
+    """Per-symbol and total realized / unrealized / day PnL from the FIFO lot engine."""
+    engine = get_engine()
+    engine.refresh()
+    return {"ok": True, **engine.summary()}
+
 @router.post("/set")
 def pnl_set(payload: PnLUpdate) -> Dict[str, Any]:
     """
-    DEV/TEST ONLY: Persist current day PnL in LOG_DIR/pnl.json.
+    DEV/TEST ONLY: Persist current day PnL in LOG_DIR/pnl.json (atomic replace).
+    With PNL_INPROCESS=1 readers in this process get the new value without reading the file.
     """
     log_dir = os.getenv("LOG_DIR", r"C:\AI files\Orion\orion-backend\logs")
     path = set_day_pnl(log_dir, float(payload.day_pnl))
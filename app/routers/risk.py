@@ -1,8 +1,8 @@
 # File: app/routers/risk.py
 from __future__ import annotations
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 from fastapi import APIRouter
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 
 from app.core.risk import (
     current_preset,
@@ -11,6 +11,8 @@ from app.core.risk import (
     set_cooloff,
     clear_circuit_breaker,
 )
+from app.core.risk_batch import evaluate_batch
+from app.core.session_calendar import check_hhmm, check_timezone
 
 # IMPORTANT: prefix is ONLY "/risk" here.
 # main.py includes this router with prefix="/api"
@@ -31,6 +33,16 @@ class RiskPresetPatch(BaseModel):
     RTH_END: Optional[str] = None
     COOLOFF_AFTER_DRAWDOWN: Optional[int] = Field(None, ge=0)
 
+    @field_validator("TIMEZONE")
+    @classmethod
+    def _known_timezone(cls, v: Optional[str]) -> Optional[str]:
+        return None if v is None else check_timezone(v)
+
+    @field_validator("RTH_START", "RTH_END")
+    @classmethod
+    def _hhmm(cls, v: Optional[str]) -> Optional[str]:
+        return None if v is None else check_hhmm(v)
+
 
 @router.get("/state")
 def risk_state() -> Dict[str, Any]:
@@ -66,6 +78,29 @@ def evaluate(order: OrderPreview):
     return res.to_dict()
 
 
+class OrderPreviewBatch(BaseModel):
+    # Batch-level meta only: every order is evaluated against the same preset/overrides.
+    orders: List[OrderPreview] = Field(..., min_length=1, max_length=5000)
+    meta: Optional[Dict[str, Any]] = None
+
+
+@router.post("/evaluate/batch")
+def evaluate_many(batch: OrderPreviewBatch):
+    """
+    Evaluate all legs in one call. The batch is one submission for ORDER_THROTTLE_SECONDS (checked
+    once, not between legs); ORDERS_PER_MIN_LIMIT counts each allowed leg, in request order.
+    """
+    overrides = (batch.meta or {}).get("overrides", None)
+    results, aggregate = evaluate_batch(
+        [
+            {"symbol": o.symbol, "side": o.side, "qty": o.qty, "order_type": o.order_type, "price": o.limit_price}
+            for o in batch.orders
+        ],
+        overrides,
+    )
+    return {"ok": aggregate["blocked"] == 0, "results": [r.to_dict() for r in results], "aggregate": aggregate}
+
+
 @router.post("/cooloff/{active}")
 def toggle_cooloff(active: bool):
     set_cooloff(active)
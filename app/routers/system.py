@@ -8,6 +8,8 @@ from typing import Dict, Any
 
 from fastapi import APIRouter
 
+from app.core import config_snapshot
+
 router = APIRouter(tags=["system"])
 
 SENSITIVE_SUBSTRINGS = (
@@ -66,3 +68,13 @@ def system_env():
         "time_utc": datetime.now(timezone.utc).isoformat(),
         "env": masked_env_snapshot(),
     }
+
+@router.post("/system/reload")
+def system_reload():
+    """Re-read .env and swap in a new config snapshot (same as SIGHUP)."""
+    config_snapshot.reload()
+    return {"ok": True, **config_snapshot.describe()}
+
+@router.get("/system/config")
+def system_config():
+    return {"ok": True, **config_snapshot.describe()}
@@ -5,10 +5,14 @@ import os
 import json
 import datetime as dt
 from pathlib import Path
-from typing import List, Optional, Dict, Any, Tuple
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple, Union
 
-from fastapi import APIRouter, Query, HTTPException
-from pydantic import BaseModel, Field
+from fastapi import APIRouter, Query, HTTPException, Request
+from pydantic import BaseModel, Field, ValidationError
+from starlette.concurrency import run_in_threadpool
+
+from app.services.usage_counters import CounterStore, get_store
+from app.services.usage_sqlite import SqliteUsageStore, get_sqlite_store
 
 router = APIRouter(prefix="/usage", tags=["usage"])
 
@@ -25,6 +29,10 @@ def _config_dir() -> Path:
     p.mkdir(parents=True, exist_ok=True)
     return p
 
+def _backend() -> str:
+    # USAGE_BACKEND=json (files: counters log + snapshot, usage_tokens.json) | sqlite (<config>/usage.sqlite)
+    return os.getenv("USAGE_BACKEND", "json").lower()
+
 def _utc_now_iso() -> str:
     return dt.datetime.utcnow().isoformat() + "Z"  # tests depended on utcnow()
 
@@ -57,6 +65,8 @@ def _compute_avg(daily: List[float]) -> float:
     return float(sum(daily) / len(daily))
 
 def _read_tokens() -> Optional[dict]:
+    if _backend() == "sqlite":
+        return get_sqlite_store(_config_dir()).get_tokens("usage_tokens")
     path = _tokens_path()
     if not path.exists():
         return None
@@ -66,6 +76,9 @@ def _read_tokens() -> Optional[dict]:
         return None
 
 def _write_tokens(data: dict) -> None:
+    if _backend() == "sqlite":
+        get_sqlite_store(_config_dir()).set_tokens("usage_tokens", data)
+        return
     path = _tokens_path()
     path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
 
@@ -144,41 +157,15 @@ class CountersAddRequest(BaseModel):
 class CountersResetRequest(BaseModel):
     confirm: bool = Field(default=False)
 
-def _counters_path() -> Path:
-    return _config_dir() / "usage_counters.json"
+def _counters() -> Union[CounterStore, SqliteUsageStore]:
+    # json: snapshot usage_counters.json + append-only usage_counters.log (app.services.usage_counters)
+    # sqlite: upserts into <config>/usage.sqlite (app.services.usage_sqlite)
+    if _backend() == "sqlite":
+        return get_sqlite_store(_config_dir())
+    return get_store(_config_dir())
 
 def _read_counters() -> dict:
-    path = _counters_path()
-    if not path.exists():
-        return {
-            "as_of": _utc_now_iso(),
-            "currency": "USD",
-            "services": {},        # { service: { tokens, cost, requests } }
-            "daily": {},           # { YYYY-MM-DD: { tokens, cost, requests } }
-            "by_service_daily": {},# { service: { YYYY-MM-DD: { tokens, cost, requests } } }
-        }
-    try:
-        return json.loads(path.read_text(encoding="utf-8"))
-    except Exception:
-        # If corrupt, start fresh
-        return {
-            "as_of": _utc_now_iso(),
-            "currency": "USD",
-            "services": {},
-            "daily": {},
-            "by_service_daily": {},
-        }
-
-def _write_counters(data: dict) -> None:
-    data["as_of"] = _utc_now_iso()
-    _counters_path().write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
-
-def _add_to_bucket(bucket: dict, key: str, tokens: float, cost: float, requests: int) -> None:
-    entry = bucket.get(key) or {"tokens": 0.0, "cost": 0.0, "requests": 0}
-    entry["tokens"] = float(entry.get("tokens", 0.0)) + tokens
-    entry["cost"] = float(entry.get("cost", 0.0)) + cost
-    entry["requests"] = int(entry.get("requests", 0)) + requests
-    bucket[key] = entry
+    return _counters().state()
 
 def _sum_entries(entries: List[dict]) -> dict:
     out = {"tokens": 0.0, "cost": 0.0, "requests": 0}
@@ -188,23 +175,20 @@ def _sum_entries(entries: List[dict]) -> dict:
         out["requests"] += int(e.get("requests", 0))
     return out
 
-def _last_n_days(n: int) -> List[str]:
-    today = dt.datetime.utcnow().date()
-    return [(today - dt.timedelta(days=i)).strftime("%Y-%m-%d") for i in range(n)][::-1]
-
-def _rollup_daily(counters: dict, days: int = 7) -> Tuple[dict, float]:
-    # returns (per-day list, avg cost/day over window)
-    seq = []
-    selected = _last_n_days(days)
-    for day in selected:
-        d = counters.get("daily", {}).get(day, {})
-        seq.append({
-            "date": day,
-            "tokens": float(d.get("tokens", 0.0)),
-            "cost": float(d.get("cost", 0.0)),
-            "requests": int(d.get("requests", 0)),
-        })
-    avg_cost = (sum(x["cost"] for x in seq) / days) if days > 0 else 0.0
+def _window_bounds(days: int, end: Optional[str] = None) -> Tuple[str, str]:
+    """(first, last) YYYY-MM-DD of a `days`-long window ending on `end` (default: today UTC)."""
+    try:
+        last = dt.date.fromisoformat(end) if end else dt.datetime.utcnow().date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid end date {end!r}; expected YYYY-MM-DD")
+    return (last - dt.timedelta(days=days - 1)).isoformat(), last.isoformat()
+
+def _rollup_daily(days: int = 7, service: Optional[str] = None, end: Optional[str] = None) -> Tuple[dict, float]:
+    # returns (per-day list, avg cost/day over window); window sums come from the store's prefix sums
+    first, last = _window_bounds(days, end)
+    store = _counters()
+    seq = store.daily(first, last, service)
+    avg_cost = (store.window(first, last, service)["cost"] / days) if days > 0 else 0.0
     return ({"days": days, "series": seq}, avg_cost)
 
 def _counters_envelope(counters: dict, window_days: int = 7) -> Dict[str, Any]:
@@ -214,7 +198,7 @@ def _counters_envelope(counters: dict, window_days: int = 7) -> Dict[str, Any]:
     total = _sum_entries([*services.values()])
 
     # 7-day rollup (cost avg/day)
-    roll, avg_cost_per_day = _rollup_daily(counters, days=window_days)
+    roll, avg_cost_per_day = _rollup_daily(days=window_days)
 
     return {
         "ok": True,
@@ -236,10 +220,44 @@ def get_counters(window_days: int = Query(default=7, ge=1, le=60)) -> Dict[str,
     return _counters_envelope(counters, window_days=window_days)
 
 @router.get("/counters/history")
-def get_counters_history(days: int = Query(default=30, ge=1, le=365)) -> Dict[str, Any]:
-    counters = _read_counters()
-    seq, _ = _rollup_daily(counters, days=days)
-    return {"ok": True, "history": seq, "currency": counters.get("currency", "USD")}
+def get_counters_history(days: int = Query(default=30, ge=1, le=3660),
+                         service: Optional[str] = None, end: Optional[str] = None) -> Dict[str, Any]:
+    seq, _ = _rollup_daily(days=days, service=service, end=end)
+    return {"ok": True, "history": seq, "currency": _read_counters().get("currency", "USD")}
+
+@router.get("/counters/services")
+def get_counters_services(window_days: int = Query(default=30, ge=1, le=3660),
+                          end: Optional[str] = None) -> Dict[str, Any]:
+    """Per-service totals and average cost/day over one window (O(1) per service)."""
+    first, last = _window_bounds(window_days, end)
+    store = _counters()
+    services = store.service_windows(first, last)
+    for v in services.values():
+        v["avg_cost_per_day"] = v["cost"] / window_days
+    return {
+        "ok": True,
+        "currency": store.state().get("currency", "USD"),
+        "window": {"start": first, "end": last, "days": window_days},
+        "services": services,
+        "total": store.window(first, last),
+    }
+
+@router.get("/counters/services/{service}")
+def get_counters_service(service: str, window_days: int = Query(default=30, ge=1, le=3660),
+                         end: Optional[str] = None) -> Dict[str, Any]:
+    """One service's window totals plus its per-day series."""
+    first, last = _window_bounds(window_days, end)
+    store = _counters()
+    total = store.window(first, last, service)
+    roll, avg_cost = _rollup_daily(days=window_days, service=service, end=end)
+    return {
+        "ok": True,
+        "service": service,
+        "window": {"start": first, "end": last, "days": window_days},
+        "total": total,
+        "avg_cost_per_day": avg_cost,
+        "rollup": roll,
+    }
 
 @router.post("/counters/add")
 def add_counters(body: CountersAddRequest) -> Dict[str, Any]:
@@ -251,51 +269,115 @@ def add_counters(body: CountersAddRequest) -> Dict[str, Any]:
     if tokens == 0.0 and cost == 0.0 and requests == 0:
         raise HTTPException(status_code=400, detail="Nothing to add; provide at least one of tokens/cost/requests")
 
-    c = _read_counters()
-    # currency sticky: prefer explicit body.currency if given
-    c["currency"] = body.currency or c.get("currency", "USD")
-
-    # services
-    services = c.get("services") or {}
-    _add_to_bucket(services, body.service, tokens, cost, requests)
-    c["services"] = services
-
-    # daily overall
-    daily = c.get("daily") or {}
-    _add_to_bucket(daily, date_key, tokens, cost, requests)
-    c["daily"] = daily
+    store = _counters()
+    store.add(body.service, date_key, tokens, cost, requests, body.currency)
+    return _counters_envelope(store.state())
+
+BATCH_MAX = int(os.getenv("USAGE_BATCH_MAX", "100000"))
+_BATCH_ERRORS_SHOWN = 20
+
+async def _ndjson_chunks(stream: AsyncIterator[bytes]) -> AsyncIterator[List[bytes]]:
+    """Complete lines per network chunk (the last, unterminated line comes at the end)."""
+    buf = b""
+    async for chunk in stream:
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        if lines: yield lines
+    yield [buf]
+
+def _batch_record(raw: Any) -> dict:
+    rec = CountersAddRequest.model_validate(raw)
+    if not (rec.tokens or rec.cost or rec.requests):
+        raise ValueError("nothing to add; provide at least one of tokens/cost/requests")
+    return {"service": rec.service, "date": rec.date or _utc_date_str(), "tokens": rec.tokens,
+            "cost": rec.cost, "requests": rec.requests, "currency": rec.currency}
+
+class _Batch:
+    """Validated records plus per-index errors. Its parse/validate methods run in the threadpool."""
+
+    def __init__(self):
+        self.records: List[dict] = []
+        self.errors: List[Dict[str, Any]] = []
+        self.seen = 0
+
+    def _index(self) -> int:
+        if self.seen >= BATCH_MAX:
+            raise HTTPException(status_code=413, detail=f"Batch larger than USAGE_BATCH_MAX={BATCH_MAX}")
+        self.seen += 1
+        return self.seen - 1
+
+    def _take(self, raw: Any) -> None:
+        i = self._index()
+        try:
+            self.records.append(_batch_record(raw))
+        except (ValidationError, ValueError) as e:
+            msg = "; ".join(f"{'.'.join(map(str, x['loc']))}: {x['msg']}" for x in e.errors()) \
+                if isinstance(e, ValidationError) else str(e)
+            self.errors.append({"index": i, "error": msg})
+
+    def lines(self, lines: List[bytes]) -> None:
+        for line in lines:
+            if not line.strip(): continue
+            try: raw = json.loads(line)
+            except ValueError as e: self.errors.append({"index": self._index(), "error": f"invalid JSON: {e}"})
+            else: self._take(raw)
+
+    def body(self, data: bytes) -> None:
+        try: body = json.loads(data)
+        except ValueError as e: raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+        items = body.get("records") if isinstance(body, dict) else body
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array, {\"records\": [...]}, or NDJSON")
+        for raw in items: self._take(raw)
+
+@router.post("/counters/add_batch")
+async def add_counters_batch(request: Request) -> Dict[str, Any]:
+    """
+    Add many counters records in one call and one log write. Body: a JSON array of
+    CountersAddRequest objects, {"records": [...]}, or NDJSON (Content-Type
+    application/x-ndjson; read as a stream, one object per line). Every record is validated
+    first; if any is bad, nothing is written and the first errors are returned (422).
+    Parsing and validation run in the threadpool (NDJSON: one call per received chunk), so a
+    100k-record batch does not stall the event loop.
+    """
+    batch = _Batch()
+    ctype = request.headers.get("content-type", "")
+    if "ndjson" in ctype or "jsonl" in ctype:
+        async for lines in _ndjson_chunks(request.stream()):
+            await run_in_threadpool(batch.lines, lines)
+    else:
+        await run_in_threadpool(batch.body, await request.body())
 
-    # by_service_daily
-    by_sd = c.get("by_service_daily") or {}
-    svc_map = by_sd.get(body.service) or {}
-    _add_to_bucket(svc_map, date_key, tokens, cost, requests)
-    by_sd[body.service] = svc_map
-    c["by_service_daily"] = by_sd
+    records, errors = batch.records, batch.errors
+    if errors:
+        raise HTTPException(status_code=422, detail={"errors": errors[:_BATCH_ERRORS_SHOWN], "error_count": len(errors),
+                                                     "record_count": len(records) + len(errors)})
+    if not records:
+        raise HTTPException(status_code=400, detail="Nothing to add; empty batch")
 
-    _write_counters(c)
-    return _counters_envelope(c)
+    def apply() -> Dict[str, Any]:
+        store = _counters()
+        n = store.add_many(records)
+        return {**_counters_envelope(store.state()), "added": n}
+    return await run_in_threadpool(apply)
 
 @router.post("/counters/reset")
 def reset_counters(body: CountersResetRequest) -> Dict[str, Any]:
     if not body.confirm:
         raise HTTPException(status_code=400, detail="confirm=false; refusing to reset")
-    empty = {
-        "as_of": _utc_now_iso(),
-        "currency": "USD",
-        "services": {},
-        "daily": {},
-        "by_service_daily": {},
-    }
-    _write_counters(empty)
+    store = _counters()
+    store.reset()
+    empty = store.state()
     return {"ok": True, "summary": {"currency": "USD", "as_of": empty["as_of"], "total": {"tokens": 0.0, "cost": 0.0, "requests": 0}}}
 
 @router.get("/billing")
-def get_billing(window_days: int = Query(default=30, ge=1, le=365)) -> Dict[str, Any]:
+def get_billing(window_days: int = Query(default=30, ge=1, le=3660), service: Optional[str] = None) -> Dict[str, Any]:
     c = _read_counters()
     # Totals
-    total = _sum_entries([*c.get("services", {}).values()])
+    services = c.get("services", {})
+    total = _sum_entries([services.get(service, {})] if service else [*services.values()])
     # Window rollup
-    roll, avg_cost = _rollup_daily(c, days=window_days)
+    roll, avg_cost = _rollup_daily(days=window_days, service=service)
     return {
         "ok": True,
         "currency": c.get("currency", "USD"),
@@ -306,3 +388,10 @@ def get_billing(window_days: int = Query(default=30, ge=1, le=365)) -> Dict[str,
         "window": roll,
         "as_of": c.get("as_of", _utc_now_iso()),
     }
+
+@router.post("/export")
+def export_usage() -> Dict[str, Any]:
+    """sqlite backend: write usage_counters.json / usage_tokens.json (JSON-store formats) to the config dir."""
+    if _backend() != "sqlite":
+        raise HTTPException(status_code=400, detail="USAGE_BACKEND is json; the JSON files are already the store")
+    return {"ok": True, "paths": get_sqlite_store(_config_dir()).export_json(_config_dir())}
@@ -0,0 +1,249 @@
+# File: backend/app/services/lot_engine.py
+from __future__ import annotations
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+EPS = 1e-9
+
+def _ts(v: Any) -> float:
+    if isinstance(v, (int, float)): return float(v)
+    try: return datetime.fromisoformat(str(v).replace("Z", "+00:00")).timestamp()
+    except ValueError: return time.time()
+
+class Lot:
+    __slots__ = ("qty", "price", "ts")
+
+    def __init__(self, qty: float, price: float, ts: float):
+        self.qty, self.price, self.ts = qty, price, ts  # qty > 0 long, < 0 short
+
+class SymbolBook:
+    """FIFO lots for one symbol. Each lot is pushed once and popped once: O(1) amortized per fill."""
+
+    def __init__(self):
+        self.lots: Deque[Lot] = deque()
+        self.position = 0.0
+        self.realized = 0.0
+        self.realized_by_day: Dict[str, float] = {}
+        self.last_price: Optional[float] = None
+
+    def fill(self, qty: float, price: float, ts: float, day: str) -> float:
+        """Apply a signed fill (buy > 0, sell < 0); returns the realized PnL it produced."""
+        self.last_price = price
+        self.position += qty
+        realized = 0.0
+        lots = self.lots
+        while abs(qty) > EPS and lots and (lots[0].qty > 0) != (qty > 0):
+            head = lots[0]
+            take = min(abs(qty), abs(head.qty))
+            sign = 1.0 if head.qty > 0 else -1.0  # closing a long earns (price - cost)
+            realized += sign * take * (price - head.price)
+            head.qty -= sign * take
+            qty += sign * take
+            if abs(head.qty) <= EPS: lots.popleft()
+        if abs(qty) > EPS:
+            lots.append(Lot(qty, price, ts))
+        self.realized += realized
+        if realized: self.realized_by_day[day] = self.realized_by_day.get(day, 0.0) + realized
+        return realized
+
+    def cost_basis(self) -> Optional[float]:
+        if abs(self.position) <= EPS: return None
+        return sum(l.qty * l.price for l in self.lots) / self.position
+
+    def unrealized(self, mark: Optional[float]) -> Optional[float]:
+        if mark is None: return None if self.lots else 0.0
+        return sum(l.qty * (mark - l.price) for l in self.lots)
+
+    def day_unrealized(self, mark: Optional[float], day_start: float, ref_mark: Optional[float]) -> Optional[float]:
+        """Unrealized change today: lots opened today from cost, older lots from the prior close mark."""
+        if mark is None: return None if self.lots else 0.0
+        return sum(l.qty * (mark - (l.price if l.ts >= day_start or ref_mark is None else ref_mark)) for l in self.lots)
+
+class LotEngine:
+    """
+    Incremental position / FIFO lot engine over the journal DB (the legacy app's JOURNAL_DB).
+
+    Fills come from `entries` (kind 'fill' / 'order_filled', price = avg_fill_price or price)
+    and from spent `session_reservations` (filled_qty @ avg_fill_price); the same order_id is
+    only applied once. `refresh()` reads only rows it has not consumed yet. Marks default to
+    the last fill price per symbol; `set_marks()` overrides them.
+
+    The journal currently only holds buy fills (reservations are taken for buys) and nothing
+    calls `set_marks()`, so day PnL from this engine is partial. That is why get_day_pnl only
+    prefers it with PNL_SOURCE=lots. `start()` runs `refresh()` on a background thread, so
+    readers (`day_pnl`, `summary`) never open the journal themselves.
+    """
+
+    def __init__(self, db_path: str, tz: str = "America/New_York", min_refresh_seconds: float = 1.0):
+        self.db_path = db_path
+        self.tz = ZoneInfo(tz)
+        self.min_refresh_seconds = min_refresh_seconds
+        self.books: Dict[str, SymbolBook] = {}
+        self.marks: Dict[str, float] = {}
+        self.prev_close: Dict[str, float] = {}
+        self._mark_day: Optional[str] = None
+        self._seen: set = set()
+        self._entries_after = 0   # last consumed entries.id
+        self._res_floor = 0       # reservations below this id are final (spent/released) and consumed
+        self._last_refresh = 0.0
+        self._lock = threading.RLock()
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.fills = 0
+
+    # ---------- feeding ----------
+
+    def _day(self, ts: float) -> str:
+        return datetime.fromtimestamp(ts, self.tz).date().isoformat()
+
+    def _day_start(self, now: float) -> float:
+        d = datetime.fromtimestamp(now, self.tz)
+        return d.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+    def apply_fill(self, symbol: str, side: str, qty: float, price: float, ts: Optional[float] = None,
+                   key: Optional[str] = None) -> bool:
+        """Apply one fill; returns False for a duplicate `key` or an unusable row."""
+        if not symbol or not qty or not price: return False
+        ts = time.time() if ts is None else ts
+        signed = abs(float(qty)) * (-1.0 if str(side).lower().startswith("s") else 1.0)
+        with self._lock:
+            if key is not None:
+                if key in self._seen: return False
+                self._seen.add(key)
+            book = self.books.get(symbol.upper())
+            if book is None: book = self.books[symbol.upper()] = SymbolBook()
+            book.fill(signed, float(price), ts, self._day(ts))
+            self.fills += 1
+        return True
+
+    def _read_new(self, con: sqlite3.Connection) -> List[Tuple[float, str, str, float, float, str]]:
+        rows: List[Tuple[float, str, str, float, float, str]] = []
+        try:
+            mx = con.execute("SELECT MAX(id) FROM entries").fetchone()[0] or 0
+            for rid, ts, oid, sym, side, qty, price in con.execute(
+                    """SELECT id, ts, order_id, symbol, side, qty, COALESCE(avg_fill_price, price) FROM entries
+                       WHERE id > ? AND id <= ? AND kind IN ('fill', 'order_filled') ORDER BY id""",
+                    (self._entries_after, mx)):
+                rows.append((_ts(ts), sym, side, qty, price, f"o:{oid}" if oid else f"e:{rid}"))
+            self._entries_after = max(self._entries_after, mx)
+        except sqlite3.OperationalError:  # journal not migrated yet
+            pass
+        try:
+            floor = None
+            for rid, ts, oid, sym, side, fq, fp, status in con.execute(
+                    """SELECT id, ts, order_id, symbol, side, filled_qty, avg_fill_price, status
+                       FROM session_reservations WHERE id >= ? ORDER BY id""", (self._res_floor,)):
+                if status == "open":
+                    if floor is None: floor = rid
+                    continue
+                if status == "spent" and fq and fp:  # rows past the floor come back; keys dedupe them
+                    rows.append((_ts(ts), sym, side, fq, fp, f"o:{oid}" if oid else f"r:{rid}"))
+            last = con.execute("SELECT MAX(id) FROM session_reservations").fetchone()[0] or 0
+            self._res_floor = floor if floor is not None else last + 1
+        except sqlite3.OperationalError:
+            pass
+        rows.sort(key=lambda r: r[0])
+        return rows
+
+    def refresh(self, force: bool = False) -> int:
+        """Consume fills added since the last call; returns how many were applied."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_refresh < self.min_refresh_seconds: return 0
+            self._last_refresh = now
+            if not os.path.exists(self.db_path): return 0
+            con = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, timeout=5)
+            try:
+                rows = self._read_new(con)
+            finally:
+                con.close()
+            return sum(self.apply_fill(sym, side, qty, price, ts, key) for ts, sym, side, qty, price, key in rows)
+
+    def start(self) -> None:
+        """Refresh in the background every min_refresh_seconds (idempotent)."""
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="orion-lot-engine", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self._stop.set(); self._wake.set()
+        t = self._thread
+        if t is not None: t.join(timeout=timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try: self.refresh(force=True)
+            except Exception: pass  # locked or half-written journal: next tick retries
+            self._wake.wait(max(0.1, self.min_refresh_seconds))
+            self._wake.clear()
+
+    def set_marks(self, marks: Dict[str, float], now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        with self._lock:
+            day = self._day(now)
+            if self._mark_day is not None and day != self._mark_day:
+                self.prev_close = dict(self.marks)  # yesterday's last marks are today's reference
+            self._mark_day = day
+            self.marks.update({k.upper(): float(v) for k, v in marks.items()})
+
+    # ---------- reading ----------
+
+    def _mark(self, sym: str, book: SymbolBook) -> Optional[float]:
+        return self.marks.get(sym, book.last_price)
+
+    def symbol_pnl(self, symbol: str, now: Optional[float] = None) -> Dict[str, Any]:
+        now = time.time() if now is None else now
+        sym = symbol.upper()
+        with self._lock:
+            book = self.books.get(sym) or SymbolBook()
+            mark = self._mark(sym, book)
+            today = self._day(now)
+            realized_day = book.realized_by_day.get(today, 0.0)
+            day_unreal = book.day_unrealized(mark, self._day_start(now), self.prev_close.get(sym))
+            return {
+                "symbol": sym, "position": book.position, "avg_cost": book.cost_basis(), "mark": mark,
+                "realized": book.realized, "unrealized": book.unrealized(mark),
+                "day_realized": realized_day,
+                "day_pnl": None if day_unreal is None else realized_day + day_unreal,
+                "open_lots": len(book.lots),
+            }
+
+    def summary(self, now: Optional[float] = None) -> Dict[str, Any]:
+        now = time.time() if now is None else now
+        with self._lock:
+            per = [self.symbol_pnl(s, now) for s in sorted(self.books)]
+        def total(k: str) -> Optional[float]:
+            vals = [p[k] for p in per]
+            return None if any(v is None for v in vals) else float(sum(vals))
+        return {"symbols": per, "total": {k: total(k) for k in ("realized", "unrealized", "day_realized", "day_pnl")},
+                "fills": self.fills}
+
+    def day_pnl(self, now: Optional[float] = None) -> Optional[float]:
+        """Aggregate day PnL; None when no fills have been seen."""
+        with self._lock:
+            if not self.books: return None
+            return self.summary(now)["total"]["day_pnl"]
+
+_engine: Optional[LotEngine] = None
+_engine_lock = threading.Lock()
+
+def get_engine() -> LotEngine:
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = LotEngine(os.getenv("JOURNAL_DB", "journal.db"),
+                                    os.getenv("SESSION_TZ", "America/New_York"),
+                                    float(os.getenv("PNL_LOTS_REFRESH_SECONDS", "1.0")))
+    return _engine
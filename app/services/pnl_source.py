@@ -2,8 +2,9 @@
 from __future__ import annotations
 import json
 import os
+import threading
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
 def _coerce_float(val: str | float | int | None) -> Optional[float]:
     if val is None:
@@ -13,6 +14,52 @@ def _coerce_float(val: str | float | int | None) -> Optional[float]:
     except Exception:
         return None
 
+# path -> ((mtime_ns, size, inode), day_pnl); a stat() that matches skips the read + parse
+_file_cache: Dict[str, Tuple[Tuple[int, int, int], Optional[float]]] = {}
+# path -> value last set in this process (PNL_INPROCESS=1: readers skip the disk entirely)
+_inproc: Dict[str, Optional[float]] = {}
+_lock = threading.Lock()
+
+def _inprocess() -> bool:
+    return os.getenv("PNL_INPROCESS", "0").lower() in ("1", "true", "yes")
+
+def _stat_key(st: os.stat_result) -> Tuple[int, int, int]:
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def _read_file(path: Path) -> Optional[float]:
+    key = str(path)
+    try:
+        st = os.stat(key)
+    except OSError:
+        return None
+    sk = _stat_key(st)
+    hit = _file_cache.get(key)
+    if hit is not None and hit[0] == sk:
+        return hit[1]
+    try:
+        value = _coerce_float(json.loads(path.read_text(encoding="utf-8")).get("day_pnl"))
+    except Exception:
+        return None  # not cached: the next call retries
+    with _lock:
+        _file_cache[key] = (sk, value)
+    return value
+
+def _lots_pnl() -> Optional[float]:
+    # in-memory read; the engine's own thread consumes the journal
+    from app.services.lot_engine import get_engine
+    engine = get_engine()
+    engine.start()
+    return engine.day_pnl()
+
+def _file_pnl(log_dir: str) -> Optional[float]:
+    # cached on (mtime, size, inode); PNL_INPROCESS=1 serves the last set value from memory
+    path = Path(log_dir) / "pnl.json"
+    if _inprocess():
+        hit = _inproc.get(str(path), _inproc)
+        if hit is not _inproc:
+            return hit
+    return _read_file(path)
+
 def get_day_pnl(log_dir: str) -> Optional[float]:
     """
     Return current day PnL as a float (positive = profit, negative = loss).
@@ -20,30 +67,46 @@ def get_day_pnl(log_dir: str) -> Optional[float]:
       1) ENV override: PNL_OVERRIDE (string/number)
       2) File JSON: { "day_pnl": <float> } at <LOG_DIR>/pnl.json
       3) None (unknown)
+    PNL_SOURCE=auto adds the FIFO lot engine (app.services.lot_engine) after the file, and
+    PNL_SOURCE=lots puts it ahead of the file. Either way the engine is read from memory; it
+    refreshes from the journal on its own thread. The default, file, never consults it: the
+    engine only sees buy fills so far, so on its own it understates losses.
     """
     # 1) ENV override
     env_pnl = _coerce_float(os.getenv("PNL_OVERRIDE"))
     if env_pnl is not None:
         return env_pnl
 
-    # 2) File source
-    path = Path(log_dir) / "pnl.json"
-    if path.exists():
-        try:
-            data = json.loads(path.read_text(encoding="utf-8"))
-            return _coerce_float(data.get("day_pnl"))
-        except Exception:
-            return None
+    source = os.getenv("PNL_SOURCE", "file").lower()
+    if source == "lots":
+        lots_pnl = _lots_pnl()
+        if lots_pnl is not None:
+            return lots_pnl
 
-    # 3) unknown
-    return None
+    # 2) File source
+    value = _file_pnl(log_dir)
+    if value is None and source == "auto":
+        return _lots_pnl()
+    return value  # 3) None when missing / unreadable
 
 def set_day_pnl(log_dir: str, value: float) -> str:
     """
     Save PnL to <LOG_DIR>/pnl.json for local dev/tests; returns path.
+    Written to a temp file and renamed over the old one, so readers see the old or the new
+    value, never a torn file. The reader caches are primed with the new value.
     """
     Path(log_dir).mkdir(parents=True, exist_ok=True)
     path = Path(log_dir) / "pnl.json"
-    payload = {"day_pnl": float(value)}
-    path.write_text(json.dumps(payload), encoding="utf-8")
+    value = float(value)
+    tmp = path.with_name(f"pnl.json.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"day_pnl": value}, f)
+        f.flush(); os.fsync(f.fileno())
+    os.replace(tmp, path)
+    with _lock:
+        _inproc[str(path)] = value
+        try:
+            _file_cache[str(path)] = (_stat_key(os.stat(path)), value)
+        except OSError:
+            _file_cache.pop(str(path), None)
     return str(path)
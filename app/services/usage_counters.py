@@ -0,0 +1,319 @@
+# File: app/services/usage_counters.py
+"""
+Usage counters as an append-only event log plus a compacted snapshot.
+
+On disk (ORION_CONFIG_DIR):
+  usage_counters.json   the compacted state, in the same shape the router has always written
+                        ({as_of, currency, services, daily, by_service_daily}) plus
+                        "log_offset": how many bytes of the log it already includes
+  usage_counters.log    one JSON event per line: an increment, or {"op": "reset"}
+
+`add()` / `add_many()` are one O_APPEND write (one line per increment), so workers never
+overwrite each other.
+Readers load the snapshot once, then apply only the log bytes they have not seen yet.
+Every COMPACT_EVERY applied events, the state is written back as a new snapshot
+(temp file + rename). The log itself is never rewritten.
+
+Alongside the nested dicts, every applied event also lands in dense per-day arrays (one
+for the total and one per service) with prefix sums. Window totals are then two lookups,
+and history slices are memoryviews of the arrays.
+"""
+from __future__ import annotations
+import datetime as dt
+import json
+import os
+import threading
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+SNAPSHOT = "usage_counters.json"
+LOG = "usage_counters.log"
+COMPACT_EVERY = int(os.getenv("USAGE_COMPACT_EVERY", "500"))
+
+def _utc_now_iso() -> str:
+    return dt.datetime.utcnow().isoformat() + "Z"
+
+def empty_counters() -> Dict[str, Any]:
+    return {
+        "as_of": _utc_now_iso(),
+        "currency": "USD",
+        "services": {},        # { service: { tokens, cost, requests } }
+        "daily": {},           # { YYYY-MM-DD: { tokens, cost, requests } }
+        "by_service_daily": {},# { service: { YYYY-MM-DD: { tokens, cost, requests } } }
+    }
+
+def _add_to_bucket(bucket: dict, key: str, tokens: float, cost: float, requests: int) -> None:
+    entry = bucket.get(key) or {"tokens": 0.0, "cost": 0.0, "requests": 0}
+    entry["tokens"] = float(entry.get("tokens", 0.0)) + tokens
+    entry["cost"] = float(entry.get("cost", 0.0)) + cost
+    entry["requests"] = int(entry.get("requests", 0)) + requests
+    bucket[key] = entry
+
+def apply_event(c: Dict[str, Any], ev: Dict[str, Any]) -> Dict[str, Any]:
+    """Fold one log event into `c` (in place for increments); returns the new state."""
+    if ev.get("op") == "reset":
+        c = empty_counters()
+        c["as_of"] = ev.get("ts") or c["as_of"]
+        return c
+    svc, day = ev["service"], ev["date"]
+    tokens, cost, requests = float(ev.get("tokens", 0.0)), float(ev.get("cost", 0.0)), int(ev.get("requests", 0))
+    c["currency"] = ev.get("currency") or c.get("currency", "USD")  # sticky: last add wins
+    _add_to_bucket(c.setdefault("services", {}), svc, tokens, cost, requests)
+    _add_to_bucket(c.setdefault("daily", {}), day, tokens, cost, requests)
+    _add_to_bucket(c.setdefault("by_service_daily", {}).setdefault(svc, {}), day, tokens, cost, requests)
+    c["as_of"] = ev.get("ts") or c.get("as_of")
+    return c
+
+FIELDS = ("tokens", "cost", "requests")
+
+def _ordinal(day: str) -> Optional[int]:
+    try: return dt.date.fromisoformat(day).toordinal()
+    except (TypeError, ValueError): return None
+
+class DaySeries:
+    """
+    Dense per-day (tokens, cost, requests) from day ordinal `first`, plus prefix sums
+    (cum[k][j] = sum of days [first, first + j)). An add only invalidates prefix sums from
+    that day onwards, so appending today is O(1) and back-dated adds cost O(days after).
+    """
+
+    def __init__(self):
+        self.first: Optional[int] = None
+        self.cols = [array("d") for _ in FIELDS]
+        self.cum = [array("d", [0.0]) for _ in FIELDS]
+        self._valid = 0  # cum[k][j] is correct for j <= _valid
+
+    def __len__(self) -> int:
+        return len(self.cols[0])
+
+    def add(self, day: int, values: Tuple[float, float, float]) -> None:
+        if self.first is None: self.first = day
+        if day < self.first:
+            pad = bytes(8 * (self.first - day))
+            self.cols = [array("d", pad) + col for col in self.cols]
+            self.first, self._valid = day, 0
+        i = day - self.first
+        if i >= len(self):
+            for col in self.cols: col.frombytes(bytes(8 * (i + 1 - len(col))))
+        for col, v in zip(self.cols, values): col[i] += v
+        self._valid = min(self._valid, i)
+
+    def _prefix(self) -> None:
+        n, start = len(self), self._valid
+        if start >= n: return
+        for col, cum in zip(self.cols, self.cum):
+            del cum[start + 1:]
+            run = cum[start]
+            for x in col[start:]:
+                run += x; cum.append(run)
+        self._valid = n
+
+    def _clip(self, start: int, end: int) -> Tuple[int, int]:
+        if self.first is None: return 0, 0
+        return max(start - self.first, 0), max(min(end - self.first + 1, len(self)), 0)
+
+    def window(self, start: int, end: int) -> Dict[str, float]:
+        """Totals over day ordinals [start, end] in O(1) (after any pending prefix rebuild)."""
+        self._prefix()
+        i, j = self._clip(start, end)
+        out = {f: (cum[j] - cum[i] if j > i else 0.0) for f, cum in zip(FIELDS, self.cum)}
+        out["cost"] = round(out["cost"], 9)  # prefix differences carry float noise
+        out["requests"] = int(round(out["requests"]))
+        return out
+
+    def view(self, start: int, end: int) -> Tuple[int, List[memoryview]]:
+        """
+        (first ordinal covered, per-field memoryviews) for the stored days within [start, end].
+        The views pin the arrays (they cannot grow while one is alive): use them under the store lock.
+        """
+        i, j = self._clip(start, end)
+        if j <= i: return start, [memoryview(array("d")) for _ in FIELDS]
+        return self.first + i, [memoryview(col)[i:j] for col in self.cols]
+
+    def daily(self, start: int, end: int) -> List[Dict[str, Any]]:
+        """One row per day in [start, end], zeros where nothing was recorded."""
+        first, views = self.view(start, end)
+        n = len(views[0])
+        rows = []
+        for d in range(start, end + 1):
+            k = d - first
+            t, c, r = (v[k] for v in views) if 0 <= k < n else (0.0, 0.0, 0.0)
+            rows.append({"date": dt.date.fromordinal(d).isoformat(), "tokens": t, "cost": c, "requests": int(r)})
+        return rows
+
+class Rollups:
+    def __init__(self):
+        self.total = DaySeries()
+        self.by_service: Dict[str, DaySeries] = {}
+
+    def add(self, service: str, day: str, values: Tuple[float, float, float]) -> None:
+        o = _ordinal(day)
+        if o is None: return  # kept in the dicts, but not a calendar day
+        self.total.add(o, values)
+        s = self.by_service.get(service)
+        if s is None: s = self.by_service[service] = DaySeries()
+        s.add(o, values)
+
+    @classmethod
+    def from_counters(cls, c: Dict[str, Any]) -> "Rollups":
+        r = cls()
+        for svc, days in (c.get("by_service_daily") or {}).items():
+            for day, e in days.items():
+                r.add(svc, day, (float(e.get("tokens", 0.0)), float(e.get("cost", 0.0)), float(e.get("requests", 0))))
+        return r
+
+def _stat_key(path: Path) -> Optional[Tuple[int, int, int]]:
+    try: st = os.stat(path)
+    except OSError: return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+class CounterStore:
+    def __init__(self, directory: Path, compact_every: int = COMPACT_EVERY):
+        self.dir = Path(directory)
+        self.snapshot_path = self.dir / SNAPSHOT
+        self.log_path = self.dir / LOG
+        self.compact_every = compact_every
+        self._lock = threading.Lock()
+        self._c: Optional[Dict[str, Any]] = None
+        self._offset = 0                  # log bytes folded into self._c
+        self._snap_key: Optional[Tuple[int, int, int]] = None
+        self._pending = 0                 # events applied since the last snapshot
+        self._roll = Rollups()
+
+    # ---------- writing ----------
+
+    @staticmethod
+    def _line(ev: Dict[str, Any]) -> bytes:
+        return (json.dumps(ev, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+    def _append(self, data: bytes) -> None:
+        self.dir.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            view = memoryview(data)
+            while view:  # one write in practice: concurrent appenders do not interleave
+                view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
+
+    def add(self, service: str, date: str, tokens: float = 0.0, cost: float = 0.0, requests: int = 0,
+            currency: str = "USD") -> None:
+        self.add_many([{"service": service, "date": date, "tokens": tokens, "cost": cost,
+                        "requests": requests, "currency": currency}])
+
+    def add_many(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Append many increments (service, date, tokens, cost, requests, currency) as one write."""
+        ts = _utc_now_iso()
+        buf = bytearray(); n = 0
+        for r in records:
+            buf += self._line({"ts": ts, "service": r["service"], "date": r["date"],
+                               "tokens": float(r.get("tokens") or 0.0), "cost": float(r.get("cost") or 0.0),
+                               "requests": int(r.get("requests") or 0), "currency": r.get("currency") or "USD"})
+            n += 1
+        if n: self._append(bytes(buf))
+        return n
+
+    def reset(self) -> None:
+        self._append(self._line({"ts": _utc_now_iso(), "op": "reset"}))
+
+    # ---------- reading ----------
+
+    def _load_snapshot(self) -> Tuple[Dict[str, Any], int]:
+        try:
+            raw = json.loads(self.snapshot_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            raw = None  # missing or corrupt: start fresh, as before
+        if not isinstance(raw, dict):
+            return empty_counters(), 0
+        offset = int(raw.pop("log_offset", 0) or 0)
+        for k, v in empty_counters().items(): raw.setdefault(k, v)
+        return raw, offset
+
+    def _sync(self) -> None:
+        snap_key = _stat_key(self.snapshot_path)
+        log_key = _stat_key(self.log_path)
+        log_size = log_key[1] if log_key else 0
+        if self._c is None or snap_key != self._snap_key or log_size < self._offset:
+            self._c, self._offset = self._load_snapshot()
+            self._snap_key, self._pending = snap_key, 0
+            self._roll = Rollups.from_counters(self._c)
+            if log_size < self._offset: self._offset = 0  # log was replaced under the snapshot
+        if log_size <= self._offset: return
+        with open(self.log_path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read(log_size - self._offset)
+        end = data.rfind(b"\n") + 1  # leave a half-written last line for the next read
+        c = self._c
+        for line in data[:end].splitlines():
+            if not line.strip(): continue
+            try: ev = json.loads(line)
+            except ValueError: continue
+            c = apply_event(c, ev)
+            if ev.get("op") == "reset": self._roll = Rollups()
+            else: self._roll.add(ev["service"], ev["date"], (float(ev.get("tokens", 0.0)), float(ev.get("cost", 0.0)),
+                                                             float(ev.get("requests", 0))))
+            self._pending += 1
+        self._c, self._offset = c, self._offset + end
+
+    def compact(self) -> None:
+        """Write the current state (and the log offset it covers) as the new snapshot."""
+        with self._lock:
+            self._sync()
+            self._write_snapshot()
+
+    def _write_snapshot(self) -> None:
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.snapshot_path.with_name(f"{SNAPSHOT}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({**self._c, "log_offset": self._offset}, f, ensure_ascii=False, indent=2)
+            f.flush(); os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        self._snap_key, self._pending = _stat_key(self.snapshot_path), 0
+
+    def state(self) -> Dict[str, Any]:
+        """Current counters (snapshot + log tail) as a copy the caller may keep."""
+        with self._lock:
+            self._sync()
+            if self._pending >= self.compact_every: self._write_snapshot()
+            c = self._c
+            return {
+                "as_of": c.get("as_of"), "currency": c.get("currency", "USD"),
+                "services": {k: dict(v) for k, v in c.get("services", {}).items()},
+                "daily": {k: dict(v) for k, v in c.get("daily", {}).items()},
+                "by_service_daily": {s: {d: dict(v) for d, v in m.items()}
+                                     for s, m in c.get("by_service_daily", {}).items()},
+            }
+
+    def window(self, start: str, end: str, service: Optional[str] = None) -> Dict[str, float]:
+        """Totals for [start, end] (YYYY-MM-DD, inclusive), overall or for one service."""
+        a, b = _ordinal(start), _ordinal(end)
+        with self._lock:
+            self._sync()
+            s = self._roll.total if service is None else self._roll.by_service.get(service, DaySeries())
+            return s.window(a, b)
+
+    def service_windows(self, start: str, end: str) -> Dict[str, Dict[str, float]]:
+        """{service: totals over [start, end]}: O(1) per service."""
+        a, b = _ordinal(start), _ordinal(end)
+        with self._lock:
+            self._sync()
+            return {svc: s.window(a, b) for svc, s in sorted(self._roll.by_service.items())}
+
+    def daily(self, start: str, end: str, service: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Dense per-day rows for [start, end], overall or for one service."""
+        a, b = _ordinal(start), _ordinal(end)
+        with self._lock:
+            self._sync()
+            s = self._roll.total if service is None else self._roll.by_service.get(service, DaySeries())
+            return s.daily(a, b)
+
+_stores: Dict[str, CounterStore] = {}
+_stores_lock = threading.Lock()
+
+def get_store(directory: Path) -> CounterStore:
+    key = str(Path(directory).resolve())
+    with _stores_lock:
+        s = _stores.get(key)
+        if s is None: s = _stores[key] = CounterStore(Path(directory))
+        return s
@@ -0,0 +1,254 @@
+# File: app/services/usage_sqlite.py
+"""
+SQLite (WAL) storage for the usage module: counters, and token balance states.
+
+Same read/write surface as app.services.usage_counters.CounterStore. Increments are
+upserts (`ON CONFLICT(service, day) DO UPDATE SET x = x + excluded.x`) inside one
+BEGIN IMMEDIATE transaction per batch, so concurrent workers serialize on SQLite's write
+lock instead of overwriting each other's files.
+
+Tables:
+  usage_counters (service, day) PRIMARY KEY + tokens, cost, requests
+      usage_counters_day: (day, service, tokens, cost, requests), a covering index
+      for windows and per-day rollups
+  usage_tokens   name PRIMARY KEY ("usage_tokens" = /usage/tokens, "core" = app.core.usage)
+  usage_meta     currency, as_of, and migrated:<source> markers
+
+On first open, the JSON files (snapshot + log via CounterStore, usage_tokens.json) are
+imported once. `export_json()` writes them back in their original formats.
+"""
+from __future__ import annotations
+import datetime as dt
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from app.services.usage_counters import LOG, SNAPSHOT, CounterStore, _utc_now_iso
+
+DB_NAME = "usage.sqlite"
+TOKENS_JSON = "usage_tokens.json"
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS usage_counters (
+           service TEXT NOT NULL, day TEXT NOT NULL,
+           tokens REAL NOT NULL DEFAULT 0, cost REAL NOT NULL DEFAULT 0, requests INTEGER NOT NULL DEFAULT 0,
+           PRIMARY KEY (service, day))""",
+    "CREATE INDEX IF NOT EXISTS usage_counters_day ON usage_counters(day, service, tokens, cost, requests)",
+    """CREATE TABLE IF NOT EXISTS usage_tokens (
+           name TEXT PRIMARY KEY, current_balance REAL NOT NULL, daily_used TEXT NOT NULL,
+           currency TEXT NOT NULL, as_of TEXT)""",
+    "CREATE TABLE IF NOT EXISTS usage_meta (k TEXT PRIMARY KEY, v TEXT)",
+)
+
+_UPSERT = """INSERT INTO usage_counters(service, day, tokens, cost, requests) VALUES (?, ?, ?, ?, ?)
+             ON CONFLICT(service, day) DO UPDATE SET tokens = tokens + excluded.tokens,
+                 cost = cost + excluded.cost, requests = requests + excluded.requests"""
+_SET_META = "INSERT INTO usage_meta(k, v) VALUES (?, ?) ON CONFLICT(k) DO UPDATE SET v = excluded.v"
+
+def _row(tokens: Any, cost: Any, requests: Any) -> Dict[str, Any]:
+    return {"tokens": float(tokens or 0.0), "cost": float(cost or 0.0), "requests": int(requests or 0)}
+
+class SqliteUsageStore:
+    backend = "sqlite"
+
+    def __init__(self, path: Union[str, Path], migrate_from: Optional[Path] = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), timeout=10.0, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        for stmt in _SCHEMA: self._db.execute(stmt)
+        if migrate_from is not None: self.migrate_json(migrate_from)
+
+    def _tx(self, fn) -> Any:
+        with self._lock:
+            db = self._db
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                out = fn(db)
+                db.execute("COMMIT")
+                return out
+            except Exception:
+                db.execute("ROLLBACK"); raise
+
+    def _meta(self, k: str) -> Optional[str]:
+        row = self._db.execute("SELECT v FROM usage_meta WHERE k = ?", (k,)).fetchone()
+        return row[0] if row else None
+
+    # ---------- migration / export ----------
+
+    def migrate_json(self, directory: Path) -> bool:
+        """Import usage_counters.json/.log and usage_tokens.json from `directory` once."""
+        directory = Path(directory)
+        def run(db: sqlite3.Connection) -> bool:
+            if db.execute("SELECT 1 FROM usage_meta WHERE k = 'migrated:json'").fetchone(): return False
+            if (directory / SNAPSHOT).exists() or (directory / LOG).exists():
+                c = CounterStore(directory).state()
+                db.executemany(_UPSERT, [(svc, day, e.get("tokens", 0.0), e.get("cost", 0.0), e.get("requests", 0))
+                                         for svc, days in c["by_service_daily"].items() for day, e in days.items()])
+                db.execute(_SET_META, ("currency", c.get("currency") or "USD"))
+                db.execute(_SET_META, ("as_of", c.get("as_of")))
+            tokens = _read_json(directory / TOKENS_JSON)
+            if tokens is not None: self._put_tokens(db, "usage_tokens", tokens)
+            db.execute(_SET_META, ("migrated:json", _utc_now_iso()))
+            return True
+        return self._tx(run)
+
+    def migrate_tokens_file(self, name: str, path: Path) -> bool:
+        """Import one legacy tokens JSON file under `name` once (app.core.usage's tokens.json)."""
+        def run(db: sqlite3.Connection) -> bool:
+            if db.execute("SELECT 1 FROM usage_meta WHERE k = ?", (f"migrated:{name}",)).fetchone(): return False
+            data = _read_json(Path(path))
+            if data is not None and not db.execute("SELECT 1 FROM usage_tokens WHERE name = ?", (name,)).fetchone():
+                self._put_tokens(db, name, data)
+            db.execute(_SET_META, (f"migrated:{name}", _utc_now_iso()))
+            return True
+        return self._tx(run)
+
+    def export_json(self, directory: Path) -> List[str]:
+        """
+        Write usage_counters.json and usage_tokens.json in their JSON-store formats. The
+        counters snapshot is marked as covering the whole current log (which was imported).
+        """
+        directory = Path(directory); directory.mkdir(parents=True, exist_ok=True)
+        written = []
+        c = self.state()
+        log = directory / LOG
+        c["log_offset"] = log.stat().st_size if log.exists() else 0
+        written.append(_write_json(directory / SNAPSHOT, c))
+        tokens = self.get_tokens("usage_tokens")
+        if tokens is not None: written.append(_write_json(directory / TOKENS_JSON, tokens))
+        return written
+
+    # ---------- counters ----------
+
+    def add(self, service: str, date: str, tokens: float = 0.0, cost: float = 0.0, requests: int = 0,
+            currency: str = "USD") -> None:
+        self.add_many([{"service": service, "date": date, "tokens": tokens, "cost": cost,
+                        "requests": requests, "currency": currency}])
+
+    def add_many(self, records: Iterable[Dict[str, Any]]) -> int:
+        """All records in one transaction."""
+        rows, currency = [], None
+        for r in records:
+            rows.append((r["service"], r["date"], float(r.get("tokens") or 0.0), float(r.get("cost") or 0.0),
+                         int(r.get("requests") or 0)))
+            currency = r.get("currency") or "USD"  # sticky: last add wins
+        if not rows: return 0
+        def run(db: sqlite3.Connection) -> int:
+            db.executemany(_UPSERT, rows)
+            db.execute(_SET_META, ("currency", currency))
+            db.execute(_SET_META, ("as_of", _utc_now_iso()))
+            return len(rows)
+        return self._tx(run)
+
+    def reset(self) -> None:
+        def run(db: sqlite3.Connection) -> None:
+            db.execute("DELETE FROM usage_counters")
+            db.execute(_SET_META, ("currency", "USD"))
+            db.execute(_SET_META, ("as_of", _utc_now_iso()))
+        self._tx(run)
+
+    def compact(self) -> None:
+        pass  # nothing to fold: every write already lands in the tables
+
+    def state(self) -> Dict[str, Any]:
+        with self._lock:
+            db = self._db
+            services = {s: _row(t, c, r) for s, t, c, r in db.execute(
+                "SELECT service, SUM(tokens), SUM(cost), SUM(requests) FROM usage_counters GROUP BY service")}
+            daily = {d: _row(t, c, r) for d, t, c, r in db.execute(
+                "SELECT day, SUM(tokens), SUM(cost), SUM(requests) FROM usage_counters GROUP BY day")}
+            by_sd: Dict[str, Dict[str, Any]] = {}
+            for s, d, t, c, r in db.execute("SELECT service, day, tokens, cost, requests FROM usage_counters"):
+                by_sd.setdefault(s, {})[d] = _row(t, c, r)
+            return {"as_of": self._meta("as_of") or _utc_now_iso(), "currency": self._meta("currency") or "USD",
+                    "services": services, "daily": daily, "by_service_daily": by_sd}
+
+    def window(self, start: str, end: str, service: Optional[str] = None) -> Dict[str, float]:
+        """Totals for [start, end] (YYYY-MM-DD, inclusive): one range scan on the covering index."""
+        sql = "SELECT SUM(tokens), SUM(cost), SUM(requests) FROM usage_counters WHERE day BETWEEN ? AND ?"
+        args: tuple = (start, end)
+        if service is not None: sql += " AND service = ?"; args += (service,)
+        with self._lock:
+            t, c, r = self._db.execute(sql, args).fetchone()
+        return _row(t, c, r)
+
+    def service_windows(self, start: str, end: str) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            rows = self._db.execute(
+                """SELECT service, SUM(tokens), SUM(cost), SUM(requests) FROM usage_counters
+                   WHERE day BETWEEN ? AND ? GROUP BY service ORDER BY service""", (start, end)).fetchall()
+            known = [s for (s,) in self._db.execute("SELECT DISTINCT service FROM usage_counters ORDER BY service")]
+        got = {s: _row(t, c, r) for s, t, c, r in rows}
+        return {s: got.get(s, _row(0, 0, 0)) for s in known}
+
+    def daily(self, start: str, end: str, service: Optional[str] = None) -> List[Dict[str, Any]]:
+        sql = "SELECT day, SUM(tokens), SUM(cost), SUM(requests) FROM usage_counters WHERE day BETWEEN ? AND ?"
+        args: tuple = (start, end)
+        if service is not None: sql += " AND service = ?"; args += (service,)
+        with self._lock:
+            got = {d: (t, c, r) for d, t, c, r in self._db.execute(sql + " GROUP BY day", args)}
+        a, b = dt.date.fromisoformat(start).toordinal(), dt.date.fromisoformat(end).toordinal()
+        out = []
+        for o in range(a, b + 1):
+            day = dt.date.fromordinal(o).isoformat()
+            out.append({"date": day, **_row(*got.get(day, (0.0, 0.0, 0)))})
+        return out
+
+    # ---------- token balance states ----------
+
+    @staticmethod
+    def _put_tokens(db: sqlite3.Connection, name: str, data: Dict[str, Any]) -> None:
+        db.execute("""INSERT INTO usage_tokens(name, current_balance, daily_used, currency, as_of) VALUES (?, ?, ?, ?, ?)
+                      ON CONFLICT(name) DO UPDATE SET current_balance = excluded.current_balance,
+                          daily_used = excluded.daily_used, currency = excluded.currency, as_of = excluded.as_of""",
+                   (name, float(data.get("current_balance", 0.0)),
+                    json.dumps([float(x) for x in data.get("daily_used", [])]),
+                    str(data.get("currency", "USD")), data.get("as_of")))
+
+    def get_tokens(self, name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT current_balance, daily_used, currency, as_of FROM usage_tokens WHERE name = ?",
+                                   (name,)).fetchone()
+        if row is None: return None
+        out = {"current_balance": row[0], "daily_used": json.loads(row[1]), "currency": row[2]}
+        if row[3]: out["as_of"] = row[3]
+        return out
+
+    def set_tokens(self, name: str, data: Dict[str, Any]) -> None:
+        self._tx(lambda db: self._put_tokens(db, name, data))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+def _read_json(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+def _write_json(path: Path, data: Dict[str, Any]) -> str:
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush(); os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return str(path)
+
+_stores: Dict[str, SqliteUsageStore] = {}
+_stores_lock = threading.Lock()
+
+def get_sqlite_store(directory: Path) -> SqliteUsageStore:
+    """The store at <directory>/usage.sqlite, importing that directory's JSON files on first open."""
+    key = str(Path(directory).resolve())
+    with _stores_lock:
+        s = _stores.get(key)
+        if s is None: s = _stores[key] = SqliteUsageStore(Path(directory) / DB_NAME, migrate_from=Path(directory))
+        return s
@@ -0,0 +1,180 @@
+"""
+In-process latency / throughput benchmark for the risk, preview, usage and PnL endpoints.
+
+    python -m benchmarks.api_latency                     # run and compare with benchmarks/baseline.json
+    python -m benchmarks.api_latency --update-baseline   # run and store the result as the new baseline
+    python -m benchmarks.api_latency --concurrency 1,8 --requests 500 --threshold 0.3 --only preview
+
+Requests go through the ASGI app (httpx.ASGITransport, no sockets) with config/log dirs in a
+temp directory, as tests/conftest.py does. Exits 1 when any case's p95 latency grew, or its
+throughput fell, by more than the threshold (a fraction; --threshold or BENCH_THRESHOLD).
+Baselines are machine-specific: re-baseline on the host that runs the comparison.
+"""
+from __future__ import annotations
+import argparse, asyncio, json, math, os, platform, shutil, sys, tempfile, time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import httpx
+
+BASELINE_FILE = Path(__file__).with_name("baseline.json")
+DEFAULT_CONCURRENCY = (1, 4, 16)
+DEFAULT_REQUESTS = 400
+DEFAULT_THRESHOLD = float(os.getenv("BENCH_THRESHOLD", "0.25"))
+
+_ORDER = {"symbol": "AAPL", "side": "buy", "qty": 1, "order_type": "limit", "limit_price": 10.0}
+
+# name -> (method, path, json body); bodies keep every gate passing so the full pipeline runs
+CASES: Dict[str, Tuple[str, str, Optional[Dict[str, Any]]]] = {
+    "preview": ("POST", "/api/orders/preview", {**_ORDER, "meta": {"overrides": {"ORDER_THROTTLE_SECONDS": 0}}}),
+    "risk_evaluate": ("POST", "/api/risk/evaluate", _ORDER),
+    "usage_add": ("POST", "/api/usage/counters/add", {"service": "bench", "tokens": 100, "cost": 0.01, "requests": 1}),
+    "pnl_current": ("GET", "/api/pnl/current", None),
+}
+
+# risk preset for /api/risk/evaluate: no session window, throttle or per-minute cap in the way
+BENCH_PRESET = {"SESSION_ENABLED": False, "ORDER_THROTTLE_SECONDS": 0, "ORDERS_PER_MIN_LIMIT": 10**9}
+
+@contextmanager
+def sandbox() -> Iterator[Any]:
+    """Fresh import of app.main with every config/log path under a temp dir; yields the ASGI app."""
+    base = Path(tempfile.mkdtemp(prefix="orion_bench_"))
+    cfg, logs = base / "config", base / "logs"
+    cfg.mkdir(); logs.mkdir()
+    env = {"LOG_DIR": logs, "CONFIG_DIR": cfg, "ORION_CONFIG_DIR": cfg, "ORION_LOG_DIR": logs,
+           "AUDIT_LOG_PATH": logs / "orders_audit.jsonl"}
+    saved = {k: os.environ.get(k) for k in env}
+    os.environ.update({k: str(v) for k, v in env.items()})
+    try:
+        for mod in list(sys.modules):
+            if mod.startswith("app."): sys.modules.pop(mod, None)
+        from app.main import app
+        os.environ.update({k: str(v) for k, v in env.items()})  # routers load .env with override=True
+
+        import app.core.risk as risk
+        from app.core import audit
+        from app.core.rate_state import open_rate_state
+        for w in risk.risk_state._files:
+            w.path = base / w.path.name
+            w.invalidate()
+        risk.ORDERS_AUDIT_FILE = logs / "orders_audit.jsonl"
+        risk.CIRCUIT_BREAKER_FILE = base / "cfg_circuit_breaker.lock"
+        risk.rate_state = open_rate_state(logs / "rate_state.bin")
+        (base / "risk_preset.json").write_text(json.dumps(BENCH_PRESET), encoding="utf-8")
+        try:
+            yield app
+        finally:
+            audit.flush()
+    finally:
+        for k, v in saved.items():
+            if v is None: os.environ.pop(k, None)
+            else: os.environ[k] = v
+        shutil.rmtree(base, ignore_errors=True)
+
+def percentile(sorted_vals: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending sequence."""
+    if not sorted_vals: return 0.0
+    k = max(0, min(len(sorted_vals) - 1, math.ceil(q / 100.0 * len(sorted_vals)) - 1))
+    return sorted_vals[k]
+
+async def _run_case(client: httpx.AsyncClient, case: str, concurrency: int, requests: int, warmup: int) -> Dict[str, Any]:
+    method, url, body = CASES[case]
+    for _ in range(warmup):
+        await client.request(method, url, json=body)
+    lat: List[float] = []
+    errors = 0
+    todo = iter(range(requests))
+
+    async def worker() -> None:
+        nonlocal errors
+        for _ in todo:
+            t0 = time.perf_counter()
+            r = await client.request(method, url, json=body)
+            lat.append(time.perf_counter() - t0)
+            if r.status_code >= 400: errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - t0
+    lat.sort()
+    return {"p50_ms": round(percentile(lat, 50) * 1e3, 3), "p95_ms": round(percentile(lat, 95) * 1e3, 3),
+            "p99_ms": round(percentile(lat, 99) * 1e3, 3), "rps": round(len(lat) / wall, 1), "errors": errors}
+
+async def _run_all(app: Any, cases: Sequence[str], concurrency: Sequence[int], requests: int,
+                   warmup: int) -> Dict[str, Dict[str, Any]]:
+    out: Dict[str, Dict[str, Any]] = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for case in cases:
+            out[case] = {}
+            for c in concurrency:
+                out[case][str(c)] = await _run_case(client, case, c, requests, warmup)
+    return out
+
+def run(cases: Sequence[str] = tuple(CASES), concurrency: Sequence[int] = DEFAULT_CONCURRENCY,
+        requests: int = DEFAULT_REQUESTS, warmup: int = 20) -> Dict[str, Any]:
+    """Benchmark `cases` at each concurrency level; returns the baseline-shaped result."""
+    with sandbox() as app:
+        results = asyncio.run(_run_all(app, cases, concurrency, requests, warmup))
+    return {"meta": {"created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                     "python": platform.python_version(), "platform": platform.platform(),
+                     "requests": requests, "concurrency": list(concurrency)},
+            "results": results}
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Regressions beyond `threshold` (fraction) for cases present in both runs; errors always count."""
+    problems: List[str] = []
+    base = baseline.get("results", {})
+    for case, levels in current["results"].items():
+        for c, cur in levels.items():
+            if cur["errors"]:
+                problems.append(f"{case}@{c}: {cur['errors']} error responses")
+            ref = base.get(case, {}).get(c)
+            if not ref: continue
+            if cur["p95_ms"] > ref["p95_ms"] * (1 + threshold):
+                problems.append(f"{case}@{c}: p95 {cur['p95_ms']:.2f}ms vs baseline {ref['p95_ms']:.2f}ms")
+            if cur["rps"] < ref["rps"] / (1 + threshold):
+                problems.append(f"{case}@{c}: {cur['rps']:.0f} req/s vs baseline {ref['rps']:.0f} req/s")
+    return problems
+
+def _table(current: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> str:
+    rows = [f"{'case':<15}{'conc':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'base p95':>10}"]
+    base = (baseline or {}).get("results", {})
+    for case, levels in current["results"].items():
+        for c, r in levels.items():
+            ref = base.get(case, {}).get(c)
+            rows.append(f"{case:<15}{c:>5}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['rps']:>10.0f}"
+                        f"{(ref['p95_ms'] if ref else float('nan')):>10.2f}")
+    return "\n".join(rows)
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--concurrency", default=",".join(map(str, DEFAULT_CONCURRENCY)))
+    ap.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="requests per case and concurrency level")
+    ap.add_argument("--warmup", type=int, default=20)
+    ap.add_argument("--only", action="append", choices=sorted(CASES), help="run just these cases")
+    ap.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    ap.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    ap.add_argument("--update-baseline", action="store_true")
+    ap.add_argument("--json", type=Path, help="also write this run's result here")
+    a = ap.parse_args(argv)
+
+    current = run(a.only or tuple(CASES), [int(x) for x in a.concurrency.split(",") if x.strip()], a.requests, a.warmup)
+    baseline = json.loads(a.baseline.read_text(encoding="utf-8")) if a.baseline.exists() else None
+    print(_table(current, baseline))
+    if a.json: a.json.write_text(json.dumps(current, indent=2), encoding="utf-8")
+    if a.update_baseline:
+        a.baseline.write_text(json.dumps(current, indent=2) + "\n", encoding="utf-8")
+        print(f"baseline written to {a.baseline}")
+        return 0
+    if baseline is None:
+        print(f"no baseline at {a.baseline}; run with --update-baseline first")
+        return 0
+    problems = compare(current, baseline, a.threshold)
+    for p in problems: print("REGRESSION", p)
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
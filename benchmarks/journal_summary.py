@@ -0,0 +1,113 @@
+"""
+Session budget summary latency on a large legacy journal.
+
+    python -m benchmarks.journal_summary                       # 1M reservations
+    python -m benchmarks.journal_summary --rows 200000 --iterations 100 --compare-unindexed
+
+Builds a temp JOURNAL_DB with --rows session_reservations spread over --sessions sessions
+(the last one active). It then times the queries behind /session (summary), the
+/session/log totals, and the /order per-symbol limit check, reporting p50/p95/p99 in ms.
+session_summary reads the budget ledger. The *_sums* cases are the aggregates the ledger
+replaces, and ledger_symbol_totals is the lookup the order path now makes.
+--compare-unindexed times the same calls again after dropping the v2 journal indexes.
+"""
+from __future__ import annotations
+import argparse, importlib, json, os, random, shutil, sys, tempfile, time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Sequence
+
+from benchmarks.api_latency import percentile
+
+DEFAULT_ROWS = 1_000_000
+INDEXES = ("session_reservations_session", "session_reservations_order", "entries_kind")
+
+def _load_alpaca(db: Path) -> Any:
+    os.environ["JOURNAL_DB"] = str(db)
+    sys.modules.pop("app.legacy_app.app.routers.alpaca", None)
+    return importlib.import_module("app.legacy_app.app.routers.alpaca")
+
+def build(alpaca: Any, rows: int, sessions: int, symbols: int = 50, seed: int = 7) -> int:
+    """Fill the journal; returns the active session id."""
+    alpaca.migrate_once()
+    con = alpaca._connect()
+    con.execute("PRAGMA synchronous=OFF")
+    con.executemany("INSERT INTO sessions (start_ts, status, budget_total) VALUES ('2024-01-01T00:00:00Z', ?, 1e9)",
+                    [("stopped",)] * (sessions - 1) + [("active",)])
+    rnd = random.Random(seed)
+    statuses = ("open", "spent", "spent", "released")
+    def gen():
+        for i in range(rows):
+            sym = f"SYM{rnd.randrange(symbols)}"
+            yield (1 + i % sessions, f"o{i}", sym, rnd.choice(statuses), 1.0, 100.0)
+    con.executemany("""INSERT INTO session_reservations (session_id, ts, order_id, symbol, side, status, qty, amount)
+                       VALUES (?, '2024-01-01T00:00:00Z', ?, ?, 'buy', ?, ?, ?)""", gen())
+    con.commit()
+    con.execute("ANALYZE")
+    con.close()
+    return sessions
+
+def _time(fn: Callable[[], Any], iterations: int) -> Dict[str, float]:
+    fn()  # warm the page cache
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter(); fn(); samples.append((time.perf_counter() - t0) * 1000.0)
+    samples.sort()
+    return {"p50_ms": round(percentile(samples, 50), 3), "p95_ms": round(percentile(samples, 95), 3),
+            "p99_ms": round(percentile(samples, 99), 3)}
+
+def measure(alpaca: Any, sid: int, iterations: int) -> Dict[str, Dict[str, float]]:
+    con = alpaca._connect()
+    try:
+        cases = {
+            "session_summary": lambda: alpaca._session_summary(con),
+            "session_sums_aggregate": lambda: alpaca._sums_by_status(con, sid),
+            "order_symbol_sums": lambda: alpaca._sums_by_status(con, sid, "SYM7"),
+            "ledger_symbol_totals": lambda: alpaca.ledger.totals(con, sid, "SYM7"),
+        }
+        return {name: _time(fn, iterations) for name, fn in cases.items()}
+    finally:
+        con.close()
+
+def run(rows: int = DEFAULT_ROWS, sessions: int = 20, iterations: int = 50,
+        compare_unindexed: bool = False) -> Dict[str, Any]:
+    base = Path(tempfile.mkdtemp(prefix="orion_journal_bench_"))
+    saved = os.environ.get("JOURNAL_DB")
+    try:
+        alpaca = _load_alpaca(base / "journal.db")
+        t0 = time.perf_counter()
+        sid = build(alpaca, rows, sessions)
+        out: Dict[str, Any] = {"rows": rows, "sessions": sessions, "iterations": iterations,
+                               "build_s": round(time.perf_counter() - t0, 2),
+                               "indexed": measure(alpaca, sid, iterations)}
+        if compare_unindexed:
+            con = alpaca._connect()
+            for name in INDEXES: con.execute(f"DROP INDEX IF EXISTS {name}")
+            con.commit(); con.close()
+            out["unindexed"] = measure(alpaca, sid, iterations)
+        alpaca._pool.close_all()
+        return out
+    finally:
+        if saved is None: os.environ.pop("JOURNAL_DB", None)
+        else: os.environ["JOURNAL_DB"] = saved
+        sys.modules.pop("app.legacy_app.app.routers.alpaca", None)
+        shutil.rmtree(base, ignore_errors=True)
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--rows", type=int, default=DEFAULT_ROWS)
+    ap.add_argument("--sessions", type=int, default=20)
+    ap.add_argument("--iterations", type=int, default=50)
+    ap.add_argument("--compare-unindexed", action="store_true")
+    ap.add_argument("--json", type=Path, help="also write the result here")
+    args = ap.parse_args(argv)
+    res = run(args.rows, args.sessions, args.iterations, args.compare_unindexed)
+    print(f"{res['rows']:,} reservations over {res['sessions']} sessions (built in {res['build_s']}s)")
+    print(f"{'case':<22}{'variant':<11}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for variant in ("indexed", "unindexed"):
+        for case, r in res.get(variant, {}).items():
+            print(f"{case:<22}{variant:<11}{r['p50_ms']:>9.3f}{r['p95_ms']:>9.3f}{r['p99_ms']:>9.3f}")
+    if args.json: args.json.write_text(json.dumps(res, indent=2), encoding="utf-8")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import json
+
+from app.core.audit import AuditWriter
+from app.core.audit_index import AuditIndex, index_fields
+
+
+def _risk_rec(i, symbol, ok, ts):
+    reasons = {"session": "ok", "throttle": "ok", "orders_per_min": "ok",
+               "max_position_risk": "ok" if ok else "9000.00>2500.00", "daily_loss_limit": "ok", "cooloff": "ok"}
+    return {"ts": ts, "audit_id": f"id-{i}", "symbol": symbol, "result": "ALLOW" if ok else "BLOCK", "reasons": reasons}
+
+
+def test_index_fields_understands_all_audit_shapes():
+    preview = {"ts": "2025-01-02T15:00:00+00:00", "request": {"symbol": "msft"},
+               "result": {"status": "BLOCKED", "checks": [{"name": "throttle", "passed": False},
+                                                          {"name": "session", "passed": True}]}}
+    assert index_fields(preview) == {"t": 1735830000.0, "s": "MSFT", "r": "BLOCK", "f": ["throttle"], "id": None}
+    engine = {"ts": "2025-01-02T15:00:00Z", "symbol": "SPY", "ok": False, "gates": {"throttle": True, "cooloff": False}}
+    assert index_fields(engine)["f"] == ["cooloff"]
+    assert index_fields(_risk_rec(1, "AAPL", False, 0))["f"] == ["max_position_risk"]
+
+
+def test_writer_maintains_sidecar_and_query_seeks(tmp_path):
+    path = tmp_path / "orders_audit.jsonl"
+    w = AuditWriter(batch_max=16)
+    base = 1_700_000_000
+    recs = [_risk_rec(i, "AAPL" if i % 3 else "MSFT", i % 4 != 0, base + i * 600) for i in range(200)]
+    w.submit_many(path, recs)
+    assert w.flush(timeout=5)
+
+    idx = AuditIndex(path, w.io_lock)
+    q = idx.query(symbol="msft", result="BLOCK", limit=1000)
+    expect = [r["audit_id"] for r in reversed(recs) if r["symbol"] == "MSFT" and r["result"] == "BLOCK"]
+    assert [r["audit_id"] for r in q["records"]] == expect and q["total"] == len(expect)
+
+    q = idx.query(start=base + 6000, end=base + 9600, check="max_position_risk")
+    assert {r["audit_id"] for r in q["records"]} == {"id-12", "id-16"}
+    assert idx.query(audit_id="id-7")["records"] == [recs[7]]
+
+    # incremental: new appends show up without re-reading what was already indexed
+    w.submit(path, _risk_rec(999, "TSLA", True, base))
+    assert w.flush(timeout=5)
+    assert idx.query(symbol="TSLA")["total"] == 1
+    assert idx.stats()["records"] == 201
+    w.close()
+
+
+def test_unindexed_tail_is_caught_up(tmp_path):
+    path = tmp_path / "legacy.jsonl"
+    path.write_text("".join(json.dumps(_risk_rec(i, "SPY", True, 1_700_000_000 + i)) + "\n" for i in range(5)),
+                    encoding="utf-8")
+    idx = AuditIndex(path)
+    assert idx.query(symbol="SPY")["total"] == 5
+    assert len((tmp_path / "legacy.jsonl.idx").read_text(encoding="utf-8").splitlines()) == 5
+
+    # a truncated/replaced file is re-indexed from scratch
+    path.write_text(json.dumps(_risk_rec(9, "QQQ", False, 1_700_000_000)) + "\n", encoding="utf-8")
+    assert idx.query()["total"] == 1
+    assert idx.query(result="BLOCK")["records"][0]["symbol"] == "QQQ"
+
+
+def test_audit_query_endpoint(test_client, tmp_path, monkeypatch):
+    for k in ("LOG_DIR", "CONFIG_DIR"): monkeypatch.setenv(k, str(tmp_path))
+    assert test_client.post("/api/system/reload").status_code == 200
+    r = test_client.post("/api/orders/preview", json={"symbol": "NVDA", "side": "buy", "qty": 1, "price_estimate": 1.0,
+                                                      "meta": {"overrides": {"FORCE_THROTTLE_BLOCK": 1}}})
+    assert r.status_code == 200
+    audit_id = r.json()["audit_id"]
+
+    r = test_client.get("/api/audit/query", params={"source": "preview", "symbol": "NVDA", "result": "BLOCK",
+                                                     "check": "throttle"})
+    body = r.json()
+    assert r.status_code == 200 and body["total"] == 1
+    assert body["records"][0]["audit_id"] == audit_id
+    assert test_client.get("/api/audit/query", params={"source": "nope"}).status_code == 400
+    assert test_client.get("/api/audit/query", params={"source": "preview", "start": "yesterday"}).status_code == 400
+
+
+def test_rotation_compacts_into_seekable_segments(tmp_path):
+    import gzip
+    from app.core.audit_segments import load_manifest, query_history, segment_dir
+
+    path = tmp_path / "orders_audit.jsonl"
+    w = AuditWriter(batch_max=8, rotate_max_bytes=4000, segment_block_records=10)
+    base = 1_700_000_000
+    recs = [_risk_rec(i, "AAPL" if i % 2 else "MSFT", i % 5 != 0, base + i) for i in range(120)]
+    for r in recs: w.submit(path, r)
+    assert w.flush(timeout=5) and w.compactor.join(timeout=10)
+
+    seg_dir = segment_dir(path)
+    segs = load_manifest(seg_dir)["segments"]
+    assert w.stats()["rotations"] == len(segs) >= 2
+    assert not path.exists() or path.stat().st_size < 4000 + 200  # live file stays small
+    assert not list(seg_dir.glob("*.jsonl"))  # raw segments compacted away
+    first = segs[0]
+    assert first["t0"] == base and first["records"] == sum(b["count"] for b in first["blocks"])
+    with gzip.open(seg_dir / first["file"]) as f:  # plain gzip readers see every member
+        assert len(f.read().splitlines()) == first["records"]
+
+    q = query_history(path, symbol="msft", result="BLOCK", limit=1000)
+    expect = [r["audit_id"] for r in reversed(recs) if r["symbol"] == "MSFT" and r["result"] == "BLOCK"]
+    assert [r["audit_id"] for r in q["records"]] == expect and not q["more"]
+    assert query_history(path, audit_id="id-3")["records"] == [recs[3]]
+    q = query_history(path, limit=5, newest_first=False)
+    assert [r["audit_id"] for r in q["records"]] == [f"id-{i}" for i in range(5)] and q["more"]
+    w.close()
+
+
+def _worker_appends(path, wid, n):
+    w = AuditWriter(batch_max=3, fsync_every_n=0, fsync_interval_ms=0)
+    for i in range(n):
+        w.submit(path, {"w": wid, "i": i, "pad": "x" * (i % 17)})
+    w.close()
+
+
+def test_sidecar_offsets_hold_with_several_processes(tmp_path):
+    import multiprocessing as mp
+    import pytest
+    if "fork" not in mp.get_all_start_methods():
+        pytest.skip("needs fork")
+    path = tmp_path / "audit.jsonl"
+    procs = [mp.get_context("fork").Process(target=_worker_appends, args=(str(path), k, 300)) for k in range(4)]
+    for p in procs: p.start()
+    for p in procs: p.join(30)
+    data = path.read_bytes()
+    entries = [json.loads(x) for x in (tmp_path / "audit.jsonl.idx").read_text(encoding="utf-8").splitlines()]
+    assert len(entries) == 1200
+    seen = set()
+    for e in entries:
+        rec = json.loads(data[e["o"]:e["o"] + e["n"]])
+        seen.add((rec["w"], rec["i"]))
+    assert len(seen) == 1200
+
+
+def test_age_rotation_counts_from_the_first_record_across_restarts(tmp_path):
+    import time
+    from app.core.audit_segments import segment_dir
+
+    path = tmp_path / "audit.jsonl"
+    old = AuditWriter(rotate_max_seconds=0)
+    old.submit(path, _risk_rec(0, "AAPL", True, time.time() - 7200)); old.close()
+    w = AuditWriter(rotate_max_seconds=3600)  # a restarted worker: the file is already two hours old
+    w.submit(path, _risk_rec(1, "AAPL", True, time.time()))
+    assert w.flush(timeout=5) and w.compactor.join(timeout=10)
+    assert w.stats()["rotations"] == 1 and not path.exists()
+    assert len(list(segment_dir(path).glob("*.jsonl.gz"))) == 1
+    w.close()
+
+
+def _worker_rotating(path, wid, n):
+    w = AuditWriter(batch_max=4, rotate_max_bytes=3000, segment_block_records=10)
+    for i in range(n):
+        w.submit(path, {"audit_id": f"{wid}-{i}", "symbol": "AAPL", "result": "ALLOW", "ts": 1_700_000_000 + i})
+    w.close()
+
+
+def test_rotation_by_one_worker_is_seen_by_the_others(tmp_path):
+    import multiprocessing as mp
+    import pytest
+    from app.core.audit_segments import load_manifest, pending_raw, segment_dir
+    if "fork" not in mp.get_all_start_methods():
+        pytest.skip("needs fork")
+    path = tmp_path / "audit.jsonl"
+    procs = [mp.get_context("fork").Process(target=_worker_rotating, args=(str(path), k, 250)) for k in range(3)]
+    for p in procs: p.start()
+    for p in procs: p.join(60)
+    seg_dir = segment_dir(path)
+    assert not pending_raw(seg_dir) and not list(seg_dir.glob("*.idx"))
+    segs = load_manifest(seg_dir)["segments"]
+    live = len(path.read_bytes().splitlines()) if path.exists() else 0
+    assert sum(s["records"] for s in segs) + live == 750  # nothing written into an already-rotated file
+    assert len({s["seq"] for s in segs}) == len(segs) >= 3
+
+
+def test_history_reads_of_raw_segments_do_not_write_sidecars(tmp_path):
+    raw = tmp_path / "audit.000001.jsonl"
+    raw.write_text(json.dumps(_risk_rec(0, "AAPL", True, 1_700_000_000)) + "\n", encoding="utf-8")
+    assert AuditIndex(raw, persist=False).query()["total"] == 1
+    assert not (tmp_path / "audit.000001.jsonl.idx").exists()
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+
+from app.core.audit import AuditWriter, new_audit_id
+
+
+def _lines(path):
+    return [json.loads(x) for x in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_group_commit_writes_all_records_in_order(tmp_path):
+    w = AuditWriter(queue_max=1000, batch_max=64, fsync_every_n=10, fsync_interval_ms=50)
+    path = tmp_path / "audit.jsonl"
+    for i in range(300):
+        assert w.submit(path, {"i": i})
+    assert w.flush(timeout=5)
+    assert [r["i"] for r in _lines(path)] == list(range(300))
+    st = w.stats()
+    assert st["records_written"] == 300 and st["pending"] == 0
+    assert st["fsyncs"] >= 1
+    w.close()
+
+
+class _StalledWriter(AuditWriter):
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self.release = threading.Event()
+
+    def _commit(self, batch):
+        self.release.wait(5)
+        super()._commit(batch)
+
+
+def test_backpressure_blocks_and_keeps_order(tmp_path):
+    w = _StalledWriter(queue_max=2, batch_max=1, enqueue_timeout_ms=0)
+    path = tmp_path / "audit.jsonl"
+    results = []
+    producer = threading.Thread(target=lambda: results.extend(w.submit(path, {"i": i}) for i in range(6)))
+    producer.start()
+    deadline = time.time() + 5
+    while w.stats()["backpressure_events"] == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    assert w.stats()["backpressure_events"] >= 1
+    w.release.set()
+    producer.join(5)
+    assert False in results
+    assert w.flush(timeout=5)
+    assert [r["i"] for r in _lines(path)] == list(range(6))
+    w.close()
+
+
+def test_submit_racing_close_is_not_lost(tmp_path):
+    path = tmp_path / "audit.jsonl"
+    for _ in range(20):
+        w = AuditWriter(queue_max=4, batch_max=2)
+        ts = [threading.Thread(target=w.submit, args=(path, {"i": i})) for i in range(8)]
+        for t in ts: t.start()
+        w.close()
+        for t in ts: t.join(5)
+        assert w.flush(timeout=1)
+    assert len(_lines(path)) == 160
+
+
+def test_close_flushes_pending(tmp_path):
+    w = AuditWriter(fsync_interval_ms=0, fsync_every_n=0)
+    path = tmp_path / "audit.jsonl"
+    w.submit_many(path, [{"i": i} for i in range(50)])
+    w.close()
+    assert len(_lines(path)) == 50
+
+
+def test_audit_ids_unique_across_threads():
+    ids = []
+    def worker():
+        ids.extend(new_audit_id() for _ in range(2000))
+    ts = [threading.Thread(target=worker) for _ in range(4)]
+    for t in ts: t.start()
+    for t in ts: t.join()
+    assert len(set(ids)) == len(ids) == 8000
+
+
+def test_audit_stats_endpoint(test_client):
+    r = test_client.get("/api/audit/stats")
+    assert r.status_code == 200
+    assert "queue_depth" in r.json()["writer"]
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from benchmarks import api_latency as bench
+
+
+def test_percentile_nearest_rank():
+    vals = [float(i) for i in range(1, 101)]
+    assert (bench.percentile(vals, 50), bench.percentile(vals, 95), bench.percentile(vals, 99)) == (50.0, 95.0, 99.0)
+    assert bench.percentile([], 50) == 0.0
+
+
+def test_compare_flags_only_regressions_past_threshold():
+    base = {"results": {"preview": {"4": {"p95_ms": 10.0, "rps": 1000.0}}}}
+    ok = {"results": {"preview": {"4": {"p95_ms": 12.0, "rps": 850.0, "errors": 0}},
+                      "new_case": {"1": {"p95_ms": 99.0, "rps": 1.0, "errors": 0}}}}
+    assert bench.compare(ok, base, 0.25) == []
+    slow = {"results": {"preview": {"4": {"p95_ms": 13.0, "rps": 700.0, "errors": 2}}}}
+    assert len(bench.compare(slow, base, 0.25)) == 3
+
+
+def test_run_is_sandboxed_and_error_free(tmp_path):
+    res = bench.run(concurrency=(1, 2), requests=5, warmup=1)
+    assert set(res["results"]) == set(bench.CASES)
+    for levels in res["results"].values():
+        assert set(levels) == {"1", "2"}
+        assert all(r["errors"] == 0 and r["p50_ms"] <= r["p99_ms"] for r in levels.values())
+    assert bench.main(["--concurrency", "1", "--requests", "3", "--only", "pnl_current",
+                       "--baseline", str(tmp_path / "b.json"), "--update-baseline"]) == 0
+    assert (tmp_path / "b.json").exists()
+
+
+def test_journal_summary_runs_small(tmp_path):
+    from benchmarks import journal_summary
+    res = journal_summary.run(rows=500, sessions=3, iterations=3, compare_unindexed=True)
+    assert res["rows"] == 500 and set(res["indexed"]) == set(res["unindexed"])
+    assert all(r["p50_ms"] <= r["p99_ms"] for r in res["indexed"].values())
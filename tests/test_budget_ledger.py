@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import importlib
+import json
+import sqlite3
+import sys
+
+import pytest
+from fastapi import HTTPException
+
+
+def _alpaca(tmp_path, monkeypatch):
+    monkeypatch.setenv("JOURNAL_DB", str(tmp_path / "journal.db"))
+    sys.modules.pop("app.legacy_app.app.routers.alpaca", None)
+    return importlib.import_module("app.legacy_app.app.routers.alpaca")
+
+
+def _ledger_matches_aggregate(alpaca, con, sid, symbols):
+    fresh = type(alpaca.ledger)()
+    assert fresh.totals(con, sid) == {st: alpaca._sums_by_status(con, sid).get(st, {"amount": 0.0, "qty": 0.0})
+                                      for st in ("open", "spent", "released")}
+    for sym in symbols:
+        agg = alpaca._sums_by_status(con, sid, sym)
+        assert fresh.totals(con, sid, sym) == {st: agg.get(st, {"amount": 0.0, "qty": 0.0})
+                                               for st in ("open", "spent", "released")}
+
+
+def test_triggers_track_every_reservation_write(tmp_path, monkeypatch):
+    alpaca = _alpaca(tmp_path, monkeypatch)
+    alpaca.migrate_once()
+    con = alpaca._connect()
+    con.execute("INSERT INTO sessions (start_ts, status, budget_total) VALUES ('t', 'active', 1000)")
+    for oid, sym, qty, amt in (("a", "AAPL", 1, 100.0), ("b", "AAPL", 2, 50.0), ("c", "MSFT", 3, 30.0), ("d", "MSFT", 1, 9.0)):
+        alpaca._reserve(con, 1, oid, sym, "buy", amt / qty, qty, amt)
+    alpaca._spend_by_order(con, "b", 2, 26.0)      # amount re-priced on fill
+    alpaca._spend_by_order(con, "c", None, None)
+    alpaca._release_by_order(con, "d")
+    _ledger_matches_aggregate(alpaca, con, 1, ("AAPL", "MSFT"))
+    assert alpaca.ledger.totals(con, 1)["spent"] == {"amount": 82.0, "qty": 5.0}
+
+    alpaca._release_all_open(con); con.commit()
+    con.execute("DELETE FROM session_reservations WHERE order_id='c'"); con.commit()
+    _ledger_matches_aggregate(alpaca, con, 1, ("AAPL", "MSFT"))
+    assert alpaca.ledger.totals(con, 1, "MSFT") == {"open": {"amount": 0.0, "qty": 0.0}, "spent": {"amount": 0.0, "qty": 0.0},
+                                                    "released": {"amount": 9.0, "qty": 1.0}}
+    con.close()
+
+
+def test_upgrade_rebuilds_the_ledger_from_existing_reservations(tmp_path, monkeypatch):
+    alpaca = _alpaca(tmp_path, monkeypatch)
+    alpaca.migrate_once()
+    con = alpaca._connect()
+    for t in ("session_budget_ins", "session_budget_upd", "session_budget_del"):
+        con.execute(f"DROP TRIGGER {t}")
+    con.execute("DROP TABLE session_budget"); con.execute("DROP TABLE session_symbol_budget")
+    con.execute("INSERT INTO sessions (start_ts, status, budget_total) VALUES ('t', 'active', 1000)")
+    con.execute("""INSERT INTO session_reservations (session_id, ts, order_id, symbol, status, qty, amount)
+                   VALUES (1, 't', 'a', 'AAPL', 'open', 2, 40.0), (1, 't', 'b', NULL, 'spent', 1, 5.0)""")
+    con.execute("UPDATE schema_version SET version=2")
+    con.commit(); con.close()
+
+    alpaca = _alpaca(tmp_path, monkeypatch)
+    alpaca.migrate_once()
+    con = alpaca._connect()
+    _ledger_matches_aggregate(alpaca, con, 1, ("AAPL",))
+    assert alpaca.ledger.totals(con, 1, "")["spent"]["amount"] == 5.0
+    con.close()
+
+
+def test_order_check_uses_the_mirror_without_aggregates(tmp_path, monkeypatch):
+    alpaca = _alpaca(tmp_path, monkeypatch)
+    alpaca.migrate_once()
+    con = alpaca._connect()
+    con.execute("INSERT INTO sessions (start_ts, status, budget_total) VALUES ('t', 'active', 1000)")
+    con.execute("INSERT INTO session_symbol_limits (session_id, symbol, max_dollars) VALUES (1, 'AAPL', 300)")
+    alpaca._reserve(con, 1, "a", "AAPL", "buy", 100.0, 2, 200.0)
+
+    seen = []
+    con.set_trace_callback(seen.append)
+    alpaca._order_session_check(con, "aapl", "buy", 1, None, 50.0, None, True)
+    assert not any("SUM(" in q.upper() for q in seen)
+    seen.clear()
+    alpaca._order_session_check(con, "aapl", "buy", 1, None, 50.0, None, True)
+    assert not any("_budget" in q for q in seen)  # second check: served from memory
+    with pytest.raises(HTTPException) as e:
+        alpaca._order_session_check(con, "AAPL", "buy", 3, None, 50.0, None, True)
+    assert json.loads(e.value.detail)["error"] == "symbol_limit_dollars"
+
+    # a commit from another connection invalidates the mirror
+    other = alpaca._connect()
+    other.execute("UPDATE session_reservations SET status='released' WHERE order_id='a'"); other.commit(); other.close()
+    alpaca._order_session_check(con, "AAPL", "buy", 3, None, 50.0, None, True)
+    assert alpaca._session_summary(con)["remaining"] == 1000.0
+    con.set_trace_callback(None)
+    con.close()
+
+
+def test_mirror_is_shared_across_connections(tmp_path, monkeypatch):
+    alpaca = _alpaca(tmp_path, monkeypatch)
+    alpaca.migrate_once()
+    a, b = alpaca._connect(), alpaca._connect()
+    a.execute("INSERT INTO sessions (start_ts, status, budget_total) VALUES ('t', 'active', 1000)")
+    alpaca._reserve(a, 1, "x", "AAPL", "buy", 10.0, 2, 20.0)
+    ledger = type(alpaca.ledger)()
+    ledger.totals(a, 1); ledger.totals(b, 1)  # first lookup per connection
+
+    seen = []
+    for con in (a, b): con.set_trace_callback(seen.append)
+    for _ in range(5):
+        assert ledger.totals(a, 1)["open"]["amount"] == 20.0
+        assert ledger.totals(b, 1)["open"]["amount"] == 20.0
+    assert not any("_budget" in q for q in seen)  # alternating pooled connections stays in memory
+
+    other = sqlite3.connect(tmp_path / "journal.db")
+    other.execute("UPDATE session_reservations SET status='spent' WHERE order_id='x'"); other.commit(); other.close()
+    assert ledger.totals(b, 1)["spent"]["amount"] == 20.0  # external commit seen through either connection
+    assert ledger.totals(a, 1)["open"]["amount"] == 0.0
+    for con in (a, b): con.set_trace_callback(None); con.close()
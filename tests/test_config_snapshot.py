@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import os
+import signal
+
+import pytest
+
+
+def _preview(client, **overrides):
+    body = {"symbol": "AAPL", "side": "buy", "qty": 1, "order_type": "limit", "limit_price": 5.0,
+            "meta": {"overrides": {"ORDER_THROTTLE_SECONDS": 0, "COOLOFF_AFTER_DRAWDOWN": 0, **overrides}}}
+    r = client.post("/api/orders/preview", json=body)
+    assert r.status_code == 200
+    return {c["name"]: c["passed"] for c in r.json()["checks"]}
+
+
+def test_preview_reads_snapshot_until_reload(test_client, tmp_path, monkeypatch):
+    for k in ("LOG_DIR", "CONFIG_DIR"): monkeypatch.setenv(k, str(tmp_path))
+    monkeypatch.setenv("MAX_POSITION_RISK", "50")
+    v0 = test_client.post("/api/system/reload").json()["version"]
+    assert _preview(test_client)["max_position_risk"] is True
+
+    monkeypatch.setenv("MAX_POSITION_RISK", "1")
+    assert _preview(test_client)["max_position_risk"] is True  # env edits alone change nothing
+    r = test_client.post("/api/system/reload").json()
+    assert r["version"] == v0 + 1 and "orders.preview" in r["configs"]
+    assert _preview(test_client)["max_position_risk"] is False
+    assert _preview(test_client, MAX_POSITION_RISK=100)["max_position_risk"] is True
+
+
+def test_overrides_are_a_view_over_the_snapshot(test_client):
+    from app.routers import orders
+
+    base = orders._env()
+    assert orders._env() is base and orders._paths(base) is orders._paths(orders._env())
+    e = orders._env({"MAX_POSITION_RISK": "7", "NOT_A_KEY": 1})
+    assert e["MAX_POSITION_RISK"] == 7.0 and "NOT_A_KEY" not in e
+    assert orders._paths(e) is orders._paths(base)  # no path override -> pre-resolved paths
+    with pytest.raises(TypeError):
+        base["MAX_POSITION_RISK"] = 1.0
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGHUP"), reason="POSIX only")
+def test_sighup_reloads(test_client):
+    from app.core import config_snapshot
+
+    old = signal.getsignal(signal.SIGHUP)
+    try:
+        assert config_snapshot.install_sighup()
+        v = config_snapshot.current().version
+        os.kill(os.getpid(), signal.SIGHUP)
+        assert config_snapshot.current().version == v + 1
+    finally:
+        signal.signal(signal.SIGHUP, old)
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import math
+
+DAY = 86400.0
+T0 = 1_700_000_000.0 - (1_700_000_000.0 % DAY)  # a UTC midnight
+
+
+def _store(tmp_path, **kw):
+    from app.legacy_app.app.services.equity_series import EquitySeriesStore
+    return EquitySeriesStore(tmp_path / "eq", **kw)
+
+
+def test_days_roll_into_columnar_files(tmp_path):
+    from app.legacy_app.app.services.equity_series import read_cols
+    s = _store(tmp_path)
+    for i in range(100): s.append(1000 + i, T0 + i * 60)        # day 1
+    for i in range(10): s.append(2000 + i, T0 + DAY + i * 60)   # day 2 (today for the store)
+    s.close()
+
+    files = sorted(p.name for p in (tmp_path / "eq").iterdir())
+    assert files == ["2023-11-14.cols", "2023-11-15.rows"]
+    ts, eq = read_cols(tmp_path / "eq" / "2023-11-14.cols")
+    assert len(ts) == 100 and eq[-1] == 1099.0
+
+    ts, eq = s.range(T0 + 90 * 60, T0 + DAY + 60)
+    assert list(eq) == [1090.0 + i for i in range(10)] + [2000.0, 2001.0]
+
+    # a restart on a later day compacts the leftover .rows
+    s2 = _store(tmp_path)
+    assert sorted(p.suffix for p in (tmp_path / "eq").iterdir()) == [".cols", ".cols"]
+    assert len(s2.range(T0, T0 + 2 * DAY)[0]) == 110
+
+
+def test_ring_keeps_the_latest_samples(tmp_path):
+    import time
+    s = _store(tmp_path, ring_capacity=5)
+    now = time.time()
+    for i in range(8): s.append(float(i), now - 8 + i)
+    ts, eq = s.range(now - 100, now)
+    assert list(eq) == [3.0, 4.0, 5.0, 6.0, 7.0]
+
+
+def test_lttb_and_ohlc():
+    from app.legacy_app.app.services.equity_series import lttb, ohlc
+    ts = [float(i) for i in range(10_000)]
+    ys = [math.sin(i / 500.0) * 100 for i in range(10_000)]
+    ys[4321] = 500.0  # a spike must survive downsampling
+    pts = lttb(ts, ys, 200)
+    assert len(pts) == 200 and pts[0] == (0.0, ys[0]) and pts[-1] == (9999.0, ys[-1])
+    assert (4321.0, 500.0) in pts
+    assert lttb(ts[:10], ys[:10], 50) == list(zip(ts[:10], ys[:10]))
+
+    bars = ohlc(ts, ys, 0.0, 10_000.0, 10)
+    assert len(bars) == 10 and sum(b["n"] for b in bars) == 10_000
+    assert bars[4]["h"] == 500.0 and bars[0]["o"] == ys[0] and bars[-1]["c"] == ys[-1]
+
+
+def test_series_endpoint(tmp_path, monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.legacy_app.app.routers import alpaca
+
+    s = _store(tmp_path)
+    for i in range(1000): s.append(1000 + (i % 50), T0 + i * 30)
+    monkeypatch.setattr(alpaca, "_equity_series", s)
+    api = FastAPI(); api.include_router(alpaca.router)
+    c = TestClient(api)
+
+    r = c.get("/alpaca/journal/equity/series", params={"from": T0, "to": T0 + DAY, "points": 100}).json()
+    assert r["samples"] == 1000 and len(r["points"]) == 100
+    r = c.get("/alpaca/journal/equity/series",
+              params={"from": "2023-11-14T00:00:00Z", "to": T0 + 3000, "points": 10, "mode": "ohlc"}).json()
+    assert r["samples"] == 101 and len(r["bars"]) == 10 and r["bars"][0]["o"] == 1000.0
+    assert c.get("/alpaca/journal/equity/series", params={"from": "soon"}).status_code == 400
+
+
+def test_stray_files_are_ignored(tmp_path):
+    s = _store(tmp_path)
+    for i in range(10): s.append(1000 + i, T0 + i * 60)
+    s.append(2000, T0 + DAY)
+    s.close()
+    (tmp_path / "eq" / "backup.cols").write_bytes(b"junk")
+    (tmp_path / "eq" / "2023-11-14.old.rows").write_bytes(b"junk")
+    s2 = _store(tmp_path)
+    assert len(s2.range(T0, T0 + 2 * DAY)[0]) == 11
+    assert (tmp_path / "eq" / "2023-11-14.old.rows").exists()  # not compacted away
+
+
+def test_missing_equity_is_not_a_zero_sample(tmp_path, monkeypatch):
+    import httpx
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.legacy_app.app.routers import alpaca
+
+    monkeypatch.setenv("ALPACA_KEY", "k"); monkeypatch.setenv("ALPACA_SECRET", "s")
+    real = httpx.AsyncClient
+    transport = httpx.MockTransport(lambda req: httpx.Response(200, json={"status": "ACTIVE"}))
+    monkeypatch.setattr(alpaca.httpx, "AsyncClient", lambda **kw: real(transport=transport, **kw))
+    s = _store(tmp_path)
+    monkeypatch.setattr(alpaca, "_equity_series", s)
+    api = FastAPI(); api.include_router(alpaca.router)
+    r = TestClient(api).post("/alpaca/journal/snapshot_equity")
+    assert r.status_code == 502 and "no usable equity" in r.json()["detail"]
+    assert len(s.range(0, 2 * T0)[0]) == 0
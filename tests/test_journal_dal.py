@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import asyncio
+import importlib
+import sys
+import threading
+import time
+
+import pytest
+
+
+def _alpaca(tmp_path, monkeypatch):
+    monkeypatch.setenv("JOURNAL_DB", str(tmp_path / "journal.db"))
+    sys.modules.pop("app.legacy_app.app.routers.alpaca", None)
+    return importlib.import_module("app.legacy_app.app.routers.alpaca")
+
+
+def test_dal_reads_in_parallel_and_serializes_writes(tmp_path):
+    from app.legacy_app.app.services.journal_dal import JournalDAL
+
+    dal = JournalDAL(str(tmp_path / "j.db"), readers=3)
+    seen = {"read": set(), "write": set()}
+
+    def mk(con): con.execute("CREATE TABLE IF NOT EXISTS t (v INTEGER)")
+    def put(con, v):
+        seen["write"].add(threading.get_ident()); con.execute("INSERT INTO t VALUES (?)", (v,))
+    def boom(con):
+        con.execute("INSERT INTO t VALUES (99)"); raise ValueError("nope")
+    def count(con):
+        seen["read"].add(threading.get_ident()); time.sleep(0.05)
+        return con.execute("SELECT COUNT(*), COALESCE(SUM(v), 0) FROM t").fetchone()
+    def sneaky(con): con.execute("INSERT INTO t VALUES (1)")
+
+    async def main():
+        await dal.write(mk)
+        await asyncio.gather(*(dal.write(put, i) for i in range(20)))
+        with pytest.raises(ValueError):
+            await dal.write(boom)  # rolled back
+        ticks = 0
+        async def ticker():
+            nonlocal ticks
+            while True: ticks += 1; await asyncio.sleep(0.005)
+        t = asyncio.create_task(ticker())
+        res = await asyncio.gather(*(dal.read(count) for _ in range(6)))
+        t.cancel()
+        with pytest.raises(Exception, match="readonly"):
+            await dal.read(sneaky)
+        return res, ticks
+
+    res, ticks = asyncio.run(main())
+    assert set(res) == {(20, sum(range(20)))}
+    assert len(seen["write"]) == 1 and len(seen["read"]) > 1
+    assert ticks >= 5  # the loop kept running while the reads slept
+    dal.close()
+
+
+def test_session_and_journal_endpoints_use_the_dal(tmp_path, monkeypatch):
+    from fastapi import FastAPI, HTTPException
+    from fastapi.testclient import TestClient
+
+    alpaca = _alpaca(tmp_path, monkeypatch)
+    api = FastAPI(); api.include_router(alpaca.router)
+    with TestClient(api) as c:
+        assert c.post("/alpaca/session/symbol_limit", params={"symbol": "spy", "max_dollars": 10}).status_code == 400
+        sid = c.post("/alpaca/session/start", params={"budget": 100}).json()["session_id"]
+        assert c.get("/alpaca/session").json()["summary"]["remaining"] == 100.0
+        assert c.post("/alpaca/session/symbol_limit", params={"symbol": "spy", "max_dollars": 10}).json() == {"ok": True}
+        assert c.get("/alpaca/session/symbol_limits").json()["limits"][0]["symbol"] == "SPY"
+        c.post("/alpaca/journal/log", params={"kind": "note", "note": "hello"})
+        assert c.get("/alpaca/journal/entries").json()["entries"][0]["note"] == "hello"
+
+        async def check(**kw):
+            return await alpaca.dal.write(alpaca._order_session_check, "SPY", "buy", kw.get("qty"), kw.get("notional"),
+                                          kw.get("price"), None, True)
+        assert asyncio.run(check(qty=1, price=5.0))["id"] == sid
+        with pytest.raises(HTTPException, match="symbol_limit_dollars"):
+            asyncio.run(check(qty=3, price=5.0))
+        with pytest.raises(HTTPException, match="session_budget"):
+            asyncio.run(check(notional=500.0, price=5.0))
+        assert c.post("/alpaca/session/stop").json()["stopped_session_id"] == sid
+
+
+def test_session_sums_are_one_indexed_pass(tmp_path, monkeypatch):
+    alpaca = _alpaca(tmp_path, monkeypatch)
+    alpaca.migrate_once()
+    con = alpaca._connect()
+    con.execute("INSERT INTO sessions (start_ts, status, budget_total) VALUES ('t', 'active', 1000)")
+    con.executemany("""INSERT INTO session_reservations (session_id, ts, order_id, symbol, side, status, qty, amount)
+                       VALUES (1, 't', ?, ?, 'buy', ?, ?, ?)""",
+                    [("a", "AAPL", "open", 1, 100.0), ("b", "AAPL", "spent", 2, 50.0),
+                     ("c", "MSFT", "spent", 3, 30.0), ("d", "MSFT", "released", 4, 7.0)])
+    con.commit()
+    sums = alpaca._sums_by_status(con, 1)
+    assert sums["spent"] == {"amount": 80.0, "qty": 5.0}
+    assert alpaca._sum_status(sums, ("open", "spent"), "amount") == 180.0
+    assert alpaca._sum_status(sums, ("missing",), "qty") == 0.0
+    assert alpaca._sums_by_status(con, 1, "MSFT") == {"spent": {"amount": 30.0, "qty": 3.0},
+                                                      "released": {"amount": 7.0, "qty": 4.0}}
+    plan = " ".join(str(r[-1]) for r in con.execute(
+        "EXPLAIN QUERY PLAN SELECT status, SUM(amount), SUM(qty) FROM session_reservations "
+        "WHERE session_id=? GROUP BY status", (1,)))
+    assert "COVERING INDEX session_reservations_session" in plan
+    assert alpaca._schema_version(con) == alpaca.SCHEMA_VERSION >= 2
+    con.close()
+    alpaca._pool.close_all()
+
+
+def test_session_reads_use_the_read_pool_and_expire_separately(tmp_path, monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    alpaca = _alpaca(tmp_path, monkeypatch)
+    writes = []
+    real_write = alpaca.dal.write
+    async def counting_write(fn, *a):
+        writes.append(fn.__name__)
+        return await real_write(fn, *a)
+    monkeypatch.setattr(alpaca.dal, "write", counting_write)
+
+    api = FastAPI(); api.include_router(alpaca.router)
+    with TestClient(api) as c:
+        sid = c.post("/alpaca/session/start", params={"budget": 100, "duration_min": 5}).json()["session_id"]
+        c.post("/alpaca/session/symbol_limit", params={"symbol": "spy", "max_dollars": 10})
+        writes.clear()
+        assert c.get("/alpaca/session").json()["active"] is True
+        assert c.get("/alpaca/session/log").json()["session_id"] == sid
+        assert c.get("/alpaca/session/symbol_limits").json()["active"] is True
+        assert writes == []  # read endpoints never take the writer
+
+        con = alpaca._connect()
+        con.execute("UPDATE sessions SET start_ts='2020-01-01T00:00:00Z' WHERE id=?", (sid,)); con.commit()
+        r = c.get("/alpaca/session").json()
+        assert r["expired"] is True and writes == ["_expire_session_tx"]
+        assert con.execute("SELECT status FROM sessions WHERE id=?", (sid,)).fetchone()[0] == "expired"
+        con.close()
+        assert c.get("/alpaca/session/symbol_limits").json() == {"active": False, "limits": []}
+        assert c.get("/alpaca/session/log").json()["session_id"] == sid  # latest_if_none
+        assert writes == ["_expire_session_tx"]
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import importlib
+import sqlite3
+import sys
+
+
+def _alpaca(tmp_path, monkeypatch):
+    monkeypatch.setenv("JOURNAL_DB", str(tmp_path / "journal.db"))
+    sys.modules.pop("app.legacy_app.app.routers.alpaca", None)
+    return importlib.import_module("app.legacy_app.app.routers.alpaca")
+
+
+def test_connections_are_reused_and_schema_migrates_once(tmp_path, monkeypatch):
+    alpaca = _alpaca(tmp_path, monkeypatch)
+    con = alpaca._db()
+    con.execute("INSERT INTO entries (ts, kind) VALUES ('t', 'note')")  # left uncommitted
+    con.close()
+    again = alpaca._db()
+    assert again is con and alpaca._pool.opened == 1
+    assert again.execute("SELECT COUNT(*) FROM entries").fetchone()[0] == 0  # rolled back on return
+    assert again.execute("SELECT version FROM schema_version").fetchone()[0] == alpaca.SCHEMA_VERSION
+    again.close()
+
+    # a new process on a current schema does not run _migrate at all
+    alpaca = _alpaca(tmp_path, monkeypatch)
+    monkeypatch.setattr(alpaca, "_migrate", lambda con: (_ for _ in ()).throw(AssertionError("migrated again")))
+    alpaca._db().close()
+
+
+def test_pool_bounds_idle_connections(tmp_path):
+    from app.legacy_app.app.services.sqlite_pool import ConnectionPool
+
+    pool = ConnectionPool(str(tmp_path / "x.db"), size=2)
+    held = [pool.acquire() for _ in range(4)]
+    assert pool.opened == 4
+    for c in held: c.close()
+    assert pool._idle.qsize() == 2
+    try:
+        held[-1].execute("SELECT 1")  # beyond the bound: really closed
+        assert False, "expected a closed connection"
+    except sqlite3.ProgrammingError:
+        pass
+    pool.close_all()
+    assert pool._idle.qsize() == 0
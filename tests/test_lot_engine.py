@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import sqlite3
+
+import pytest
+
+NOW = 1_700_000_000.0  # 2023-11-14 17:13 America/New_York
+
+
+def _engine(db=":memory:"):
+    from app.services.lot_engine import LotEngine
+    return LotEngine(str(db), min_refresh_seconds=0)
+
+
+def test_fifo_realized_unrealized_and_shorts():
+    e = _engine()
+    e.apply_fill("aapl", "buy", 10, 100.0, NOW - 60)
+    e.apply_fill("AAPL", "buy", 10, 110.0, NOW - 50)
+    e.apply_fill("AAPL", "sell", 15, 120.0, NOW - 40)  # closes 10@100 and 5@110
+    e.set_marks({"AAPL": 130.0}, NOW)
+    p = e.symbol_pnl("AAPL", NOW)
+    assert p["realized"] == pytest.approx(250.0) and p["position"] == 5 and p["avg_cost"] == 110.0
+    assert p["unrealized"] == pytest.approx(100.0) and p["day_pnl"] == pytest.approx(350.0)
+
+    e.apply_fill("AAPL", "sell", 8, 125.0, NOW - 30)  # closes 5@110, opens a 3-share short
+    p = e.symbol_pnl("AAPL", NOW)
+    assert p["realized"] == pytest.approx(325.0) and p["position"] == -3 and p["avg_cost"] == 125.0
+    assert p["unrealized"] == pytest.approx(-15.0) and p["open_lots"] == 1
+
+
+def test_day_pnl_uses_prior_close_for_carried_lots():
+    e = _engine()
+    e.apply_fill("MSFT", "buy", 10, 300.0, NOW - 3 * 86400)
+    e.set_marks({"MSFT": 310.0}, NOW - 86400)   # yesterday's close
+    e.set_marks({"MSFT": 305.0}, NOW)
+    p = e.symbol_pnl("MSFT", NOW)
+    assert p["unrealized"] == pytest.approx(50.0) and p["day_pnl"] == pytest.approx(-50.0)
+    assert e.day_pnl(NOW) == pytest.approx(-50.0)
+
+
+def _journal(path):
+    from app.legacy_app.app.routers import alpaca
+    con = sqlite3.connect(path)
+    alpaca._migrate(con)
+    con.execute("INSERT INTO sessions (start_ts, status, budget_total) VALUES ('2023-11-14T15:00:00Z', 'active', 1000)")
+    return con
+
+
+def test_journal_is_consumed_incrementally(tmp_path):
+    db = tmp_path / "journal.db"
+    con = _journal(db)
+    res = """INSERT INTO session_reservations (session_id, ts, order_id, symbol, side, qty, filled_qty,
+             avg_fill_price, status) VALUES (1, '2023-11-14T15:00:00Z', ?, ?, ?, ?, ?, ?, ?)"""
+    con.execute(res, ("o1", "SPY", "buy", 2, 2, 400.0, "spent"))
+    con.execute(res, ("o2", "SPY", "sell", 1, None, None, "open"))
+    con.execute("INSERT INTO entries (ts, kind, order_id, symbol, side, qty, avg_fill_price) "
+                "VALUES ('2023-11-14T15:01:00Z', 'fill', 'o1', 'SPY', 'buy', 2, 400.0)")  # same order: applied once
+    con.execute("INSERT INTO entries (ts, kind, note) VALUES ('2023-11-14T15:02:00Z', 'note', 'hi')")
+    con.commit()
+
+    e = _engine(db)
+    assert e.refresh() == 1 and e.symbol_pnl("SPY")["position"] == 2
+    assert e.refresh() == 0
+
+    con.execute("UPDATE session_reservations SET status='spent', filled_qty=1, avg_fill_price=410.0 WHERE order_id='o2'")
+    con.execute("INSERT INTO entries (ts, kind, symbol, side, qty, price) "
+                "VALUES ('2023-11-14T15:03:00Z', 'fill', 'QQQ', 'buy', 5, 350.0)")
+    con.commit(); con.close()
+    assert e.refresh() == 2
+    spy = e.symbol_pnl("SPY")
+    assert spy["position"] == 1 and spy["realized"] == pytest.approx(10.0)
+    assert e.summary()["total"]["realized"] == pytest.approx(10.0)
+
+
+def test_get_day_pnl_keeps_the_file_ahead_of_a_buy_only_engine(tmp_path, monkeypatch):
+    from app.services import lot_engine, pnl_source
+
+    (tmp_path / "pnl.json").write_text('{"day_pnl": -900}', encoding="utf-8")
+    monkeypatch.delenv("PNL_OVERRIDE", raising=False)
+    monkeypatch.delenv("PNL_SOURCE", raising=False)
+    eng = _engine(tmp_path / "missing.db")
+    eng.apply_fill("AAPL", "buy", 10, 100.0)
+    eng.apply_fill("AAPL", "buy", 10, 80.0)  # no sells, mark = last fill: the engine says -200
+    monkeypatch.setattr(lot_engine, "_engine", eng)
+    monkeypatch.setattr(eng, "start", lambda: None)
+    monkeypatch.setattr(lot_engine.sqlite3, "connect", lambda *a, **k: pytest.fail("journal read on the hot path"))
+
+    assert pnl_source.get_day_pnl(str(tmp_path)) == -900.0  # default: file
+    monkeypatch.setenv("PNL_SOURCE", "auto")
+    assert pnl_source.get_day_pnl(str(tmp_path)) == -900.0  # file still ahead of the engine
+    monkeypatch.setenv("PNL_SOURCE", "lots")
+    assert pnl_source.get_day_pnl(str(tmp_path)) == pytest.approx(-200.0)
+    (tmp_path / "pnl.json").unlink()
+    monkeypatch.setenv("PNL_SOURCE", "auto")
+    assert pnl_source.get_day_pnl(str(tmp_path)) == pytest.approx(-200.0)  # engine only without a file
+
+
+def test_background_refresh_consumes_the_journal(tmp_path):
+    import time
+
+    db = tmp_path / "journal.db"
+    con = _journal(db)
+    con.execute("INSERT INTO entries (ts, kind, order_id, symbol, side, qty, avg_fill_price) "
+                "VALUES ('2023-11-14T15:01:00Z', 'fill', 'o1', 'SPY', 'buy', 2, 400.0)")
+    con.commit(); con.close()
+    e = _engine(db)
+    e.start()
+    deadline = time.time() + 5
+    while e.fills == 0 and time.time() < deadline: time.sleep(0.01)
+    e.stop()
+    assert e.fills == 1 and e.symbol_pnl("SPY")["position"] == 2
@@ -69,3 +69,55 @@ def test_preview_blocked_by_max_position_risk(test_client):
     data = r.json()
     assert data["ok"] is False
     assert data["status"] == "BLOCKED"
+
+def test_preview_batch_mixed(test_client):
+    body = {
+        "orders": [
+            {"symbol": "AAPL", "side": "buy", "qty": 1, "order_type": "limit", "limit_price": 5.0},
+            {"symbol": "MSFT", "side": "buy", "qty": 1, "order_type": "limit", "limit_price": 35.0},
+            {"symbol": "SPY", "side": "sell", "qty": 2, "order_type": "market"},
+        ],
+        "meta": {"overrides": {"MAX_POSITION_RISK": 10.0, "ORDER_THROTTLE_SECONDS": 0}},
+    }
+    r = test_client.post(ORDERS_PREVIEW + "/batch", json=body)
+    assert r.status_code == 200
+    data = r.json()
+    assert data["status"] == "BLOCKED"
+    assert [x["ok"] for x in data["results"]] == [True, False, True]
+    assert data["results"][2]["status"] == "PASSED_WITH_WARNINGS"
+    assert data["aggregate"]["blocked"] == 1 and data["aggregate"]["notional_unknown"] == 1
+    assert len({x["audit_id"] for x in data["results"]}) == 3
+
+def test_preview_duplicates_replay_cached_response(test_client):
+    from concurrent.futures import ThreadPoolExecutor
+    from app.routers import orders
+
+    body = {"symbol": "IBM", "side": "buy", "qty": 3, "order_type": "limit", "limit_price": 2.0,
+            "meta": {"overrides": {"ORDER_THROTTLE_SECONDS": 30}}}
+    calls = []
+    real = orders.evaluate_risk
+    orders.evaluate_risk = lambda *a, **k: calls.append(1) or real(*a, **k)
+    try:
+        with ThreadPoolExecutor(4) as pool:
+            rs = list(pool.map(lambda _: test_client.post(ORDERS_PREVIEW, json=body), range(4)))
+    finally:
+        orders.evaluate_risk = real
+    assert len(calls) == 1 and len({r.json()["audit_id"] for r in rs}) == 1
+    assert sum(r.headers.get("Idempotent-Replayed") == "true" for r in rs) == 3
+
+    # no caching when the throttle window is 0
+    body["meta"]["overrides"]["ORDER_THROTTLE_SECONDS"] = 0
+    a, b = (test_client.post(ORDERS_PREVIEW, json=body).json()["audit_id"] for _ in range(2))
+    assert a != b
+
+
+def test_preview_idempotency_key(test_client):
+    body = {"symbol": "IBM", "side": "buy", "qty": 1, "order_type": "limit", "limit_price": 2.0}
+    h = {"Idempotency-Key": "click-42"}
+    first = test_client.post(ORDERS_PREVIEW, json=body, headers=h)
+    again = test_client.post(ORDERS_PREVIEW, json=body, headers=h)
+    assert again.headers.get("Idempotent-Replayed") == "true"
+    assert again.json()["audit_id"] == first.json()["audit_id"]
+    assert test_client.post(ORDERS_PREVIEW, json={**body, "qty": 2}, headers=h).status_code == 409
+    assert test_client.post(ORDERS_PREVIEW, json=body, headers={"Idempotency-Key": "click-43"}).json()["audit_id"] \
+        != first.json()["audit_id"]
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import importlib
+import sys
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+
+def _alpaca(tmp_path, monkeypatch):
+    monkeypatch.setenv("JOURNAL_DB", str(tmp_path / "journal.db"))
+    sys.modules.pop("app.legacy_app.app.routers.alpaca", None)
+    return importlib.import_module("app.legacy_app.app.routers.alpaca")
+
+
+def _broker(alpaca, orders, calls):
+    """Alpaca /orders + /orders/{id} over a fixed order list: status, after (exclusive), until, asc, limit."""
+    def handler(req: httpx.Request) -> httpx.Response:
+        path = req.url.path.rsplit("/orders", 1)[1]
+        if path:
+            oid = path.strip("/")
+            calls.append(("get", oid))
+            if oid == "o5": return httpx.Response(500)
+            o = next((o for o in orders if o["id"] == oid), None)
+            return httpx.Response(200, json=o) if o else httpx.Response(404)
+        q = dict(req.url.params)
+        calls.append(("list", q))
+        after, until = alpaca._parse_ts(q.get("after")), alpaca._parse_ts(q["until"])
+        rows = [o for o in orders if (o["status"] in ("new", "accepted")) == (q["status"] == "open")
+                and (after is None or alpaca._parse_ts(o["submitted_at"]) > after)
+                and alpaca._parse_ts(o["submitted_at"]) <= until]
+        rows.sort(key=lambda o: o["submitted_at"])
+        assert q["direction"] == "asc"
+        return httpx.Response(200, json=rows[:int(q["limit"])])
+    return handler
+
+
+def test_sync_pages_from_watermark_and_applies_one_batch(tmp_path, monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setenv("ALPACA_KEY", "k"); monkeypatch.setenv("ALPACA_SECRET", "s")
+    alpaca = _alpaca(tmp_path, monkeypatch)
+    monkeypatch.setattr(alpaca, "ORDERS_SYNC_PAGE_SIZE", 2)
+    base = datetime.now(timezone.utc) - timedelta(minutes=2)
+    ts = lambda i: (base + timedelta(seconds=i)).strftime("%Y-%m-%dT%H:%M:%S.%f") + "123Z"
+    orders = [{"id": f"x{i}", "status": "filled", "submitted_at": ts(i)} for i in range(7)]  # not ours
+    orders += [{"id": "old", "status": "filled", "submitted_at": ts(-600)},                  # before the cursor
+               {"id": "o1", "status": "filled", "submitted_at": ts(1), "filled_qty": "2", "filled_avg_price": "11.5"},
+               {"id": "o2", "status": "canceled", "submitted_at": ts(3)},
+               {"id": "o3", "status": "new", "submitted_at": ts(4)},
+               {"id": "o6", "status": "partially_filled", "submitted_at": ts(5)}]
+    calls = []
+    real = httpx.AsyncClient
+    monkeypatch.setattr(alpaca.httpx, "AsyncClient",
+                        lambda **kw: real(transport=httpx.MockTransport(_broker(alpaca, orders, calls)), **kw))
+
+    api = FastAPI(); api.include_router(alpaca.router)
+    with TestClient(api) as c:
+        c.post("/alpaca/session/start", params={"budget": 1000})
+        con = alpaca._connect()
+        for oid in ("o1", "o2", "o3", "o4", "o5", "o6"):
+            alpaca._reserve(con, 1, oid, "SPY", "buy", 10.0, 2, 20.0)
+        con.close()
+
+        res = c.post("/alpaca/orders/sync").json()
+        assert res["updated"] == 4 and res["looked_up"] == 2
+        lists = [q for kind, q in calls if kind == "list"]
+        closed = [q for q in lists if q["status"] == "closed"]
+        cursors = [alpaca._parse_ts(q["after"]) for q in closed]
+        assert len(closed) >= 5 and cursors == sorted(cursors)          # followed the cursor over 9 closed orders
+        assert res["fetched"] == 11                                     # o1 shares x1's timestamp and is not skipped
+        assert sorted(oid for kind, oid in calls if kind == "get") == ["o4", "o5"]
+
+        con = alpaca._connect()
+        status = dict(con.execute("SELECT order_id, status FROM session_reservations"))
+        assert status == {"o1": "spent", "o2": "released", "o3": "open", "o4": "released", "o5": "open", "o6": "spent"}
+        assert con.execute("SELECT amount FROM session_reservations WHERE order_id='o1'").fetchone()[0] == 23.0
+        watermark = con.execute("SELECT value FROM settings WHERE key=?", (alpaca.SYNC_WATERMARK_KEY,)).fetchone()[0]
+        assert alpaca._parse_ts(watermark) == alpaca._parse_ts(ts(4))  # earliest order still open
+        con.close()
+        assert c.get("/alpaca/session").json()["summary"]["open"] == 40.0  # ledger saw the batch
+
+        calls.clear()
+        res = c.post("/alpaca/orders/sync").json()
+        assert res["updated"] == 0
+        first = alpaca._parse_ts([q for kind, q in calls if kind == "list"][0]["after"])
+        assert first == alpaca._parse_ts(ts(4)) - alpaca.SYNC_SKEW  # cursor from the stored watermark
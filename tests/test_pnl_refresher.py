@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+
+def _slow_fetch(calls, delay=0.2, values=(1000.0, 900.0)):
+    def fetch():
+        calls.append(time.time())
+        time.sleep(delay)
+        return values
+    return fetch
+
+
+def test_refresh_is_single_flight():
+    from app.pnl_service import EquityRefresher
+    calls = []
+    r = EquityRefresher(fetch=_slow_fetch(calls))
+    threads = [threading.Thread(target=r.refresh) for _ in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert len(calls) == 1
+    assert r.read().loss == 100.0
+    r.stop()
+
+
+def test_read_never_waits_for_the_upstream():
+    from app import pnl_service
+    calls = []
+    r = pnl_service.EquityRefresher(fetch=_slow_fetch(calls, delay=0.5))
+    t0 = time.perf_counter()
+    snap = r.read()  # starts the background thread, returns the (empty) snapshot at once
+    assert time.perf_counter() - t0 < 0.1
+    with pytest.raises(pnl_service.StaleEquityError, match="not available yet"):
+        pnl_service.daily_loss(snap)
+    deadline = time.time() + 5
+    while r.read().fetched_at == 0 and time.time() < deadline: time.sleep(0.01)
+    assert pnl_service.daily_loss(r.read()) == (100.0, 1000.0, 900.0)
+    r.stop()
+
+
+def test_staleness_policy_and_errors_keep_last_value(monkeypatch):
+    from app import pnl_service
+    state = {"fail": False}
+
+    def fetch():
+        if state["fail"]: raise RuntimeError("upstream 503")
+        return 1000.0, 950.0
+
+    r = pnl_service.EquityRefresher(fetch=fetch)
+    r.refresh()
+    state["fail"] = True
+    snap = r.refresh()
+    assert snap.equity == 950.0 and snap.error == "upstream 503" and r.errors == 1
+
+    later = snap.fetched_at + pnl_service.MAX_STALENESS_SECONDS + 5
+    assert snap.report(later)["stale"] is True
+    with pytest.raises(pnl_service.StaleEquityError, match="upstream 503"):
+        pnl_service.daily_loss(snap, later)
+    monkeypatch.setattr(pnl_service, "STALE_POLICY", "allow")
+    assert pnl_service.daily_loss(snap, later)[0] == 50.0
+
+
+def test_risk_engine_reports_equity_staleness(monkeypatch):
+    from app import pnl_service, risk_engine
+    from app.core.rate_state import RateState
+    from app.risk_settings import RiskSettings
+
+    monkeypatch.setattr(risk_engine, "_rate", RateState())
+    monkeypatch.setattr(risk_engine, "get_settings", lambda: RiskSettings(DAILY_LOSS_LIMIT=100.0))
+    r = pnl_service.EquityRefresher(fetch=lambda: (1000.0, 850.0))
+    r.refresh()
+    monkeypatch.setattr(pnl_service, "refresher", r)
+    monkeypatch.setattr(r, "start", lambda: None)  # no background thread in this test
+
+    res = risk_engine.evaluate_order("AAPL", "buy", 1, 1.0)
+    assert res.gates["daily_loss_limit_ok"] is False
+    assert res.context["pnl"]["loss"] == 150.0 and res.context["pnl"]["stale"] is False
+
+    r._snap = r._snap._replace(fetched_at=time.time() - 3600)
+    res = risk_engine.evaluate_order("AAPL", "buy", 1, 1.0)
+    assert res.gates["daily_loss_limit_ok"] is False and "old" in res.reasons[-1]
+    assert res.context["pnl"]["stale"] is True
+
+
+def test_unconfigured_refresher_never_starts(monkeypatch):
+    from app import pnl_service
+
+    monkeypatch.setattr(pnl_service, "ALPACA_KEY", None)
+    r = pnl_service.EquityRefresher()
+    snap = r.read()
+    assert r._thread is None and snap.error == "Alpaca credentials missing"
+    with pytest.raises(pnl_service.StaleEquityError, match="credentials missing"):
+        pnl_service.daily_loss(snap)
+    r.start()
+    assert r._thread is None
+    assert pnl_service._http() is pnl_service._http()
+
+
+def test_fetch_account_uses_pooled_session(monkeypatch):
+    from app import pnl_service
+
+    class _Resp:
+        def raise_for_status(self): pass
+        def json(self): return {"last_equity": "1000", "equity": "990.5"}
+
+    class _Sess:
+        def __init__(self): self.urls = []
+        def get(self, url, **kw):
+            self.urls.append(url)
+            return _Resp()
+
+    sess = _Sess()
+    monkeypatch.setattr(pnl_service, "_session", sess)
+    monkeypatch.setattr(pnl_service, "_headers", lambda: {})
+    assert pnl_service._fetch_account() == (1000.0, 990.5)
+    assert pnl_service._fetch_account() == (1000.0, 990.5)
+    assert sess.urls == [f"{pnl_service.ALPACA_BASE}/account"] * 2
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+
+
+def _src(monkeypatch):
+    from app.services import pnl_source
+    monkeypatch.delenv("PNL_OVERRIDE", raising=False)
+    monkeypatch.setenv("PNL_SOURCE", "file")
+    parses = []
+    real = json.loads
+    monkeypatch.setattr(pnl_source.json, "loads", lambda s, *a, **k: parses.append(1) or real(s, *a, **k))
+    return pnl_source, parses
+
+
+def test_reader_caches_on_stat_and_sees_external_writes(tmp_path, monkeypatch):
+    pnl_source, parses = _src(monkeypatch)
+    path = tmp_path / "pnl.json"
+    path.write_text('{"day_pnl": -5}', encoding="utf-8")
+    assert [pnl_source.get_day_pnl(str(tmp_path)) for _ in range(3)] == [-5.0] * 3
+    assert len(parses) == 1
+
+    path.write_text('{"day_pnl": -123.5}', encoding="utf-8")  # different size -> new key
+    assert pnl_source.get_day_pnl(str(tmp_path)) == -123.5 and len(parses) == 2
+
+    path.write_text("{torn", encoding="utf-8")
+    assert pnl_source.get_day_pnl(str(tmp_path)) is None
+    path.unlink()
+    assert pnl_source.get_day_pnl(str(tmp_path)) is None
+
+
+def test_set_is_atomic_and_primes_the_cache(tmp_path, monkeypatch):
+    pnl_source, parses = _src(monkeypatch)
+    stop, seen = threading.Event(), []
+
+    def reader():
+        while not stop.is_set():
+            seen.append(pnl_source.get_day_pnl(str(tmp_path)))
+
+    pnl_source.set_day_pnl(str(tmp_path), 0)
+    t = threading.Thread(target=reader); t.start()
+    for i in range(200):
+        pnl_source.set_day_pnl(str(tmp_path), -float(i))
+    stop.set(); t.join()
+    assert seen and None not in seen
+    assert pnl_source.get_day_pnl(str(tmp_path)) == -199.0
+    assert [p for p in os.listdir(tmp_path) if p.endswith(".tmp")] == []
+
+
+def test_inprocess_fast_path_skips_disk(tmp_path, monkeypatch):
+    pnl_source, parses = _src(monkeypatch)
+    monkeypatch.setenv("PNL_INPROCESS", "1")
+    pnl_source.set_day_pnl(str(tmp_path), -42)
+    monkeypatch.setattr(pnl_source.os, "stat", lambda *a, **k: (_ for _ in ()).throw(AssertionError("disk")))
+    assert pnl_source.get_day_pnl(str(tmp_path)) == -42.0 and parses == []
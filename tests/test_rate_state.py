@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import multiprocessing as mp
+
+import pytest
+
+from app.core.rate_state import SLOTS, MmapRateState, RateState, SqliteRateState, open_rate_state
+
+
+def _backends(tmp_path):
+    return [RateState(), MmapRateState(tmp_path / "rate.bin"), SqliteRateState(tmp_path / "rate.sqlite")]
+
+
+def test_sliding_window_crosses_minute_boundaries(tmp_path):
+    t = 1_700_000_000 - (1_700_000_000 % 60) + 50  # 10s before a clock minute rolls over
+    for rs in _backends(tmp_path):
+        rs.record(3, now=t)
+        rs.record(2, now=t + 15)  # next clock minute
+        assert rs.count(60, now=t + 15) == 5, rs.backend  # a fixed-minute counter would say 2
+        assert rs.count(60, now=t + 59) == 5
+        assert rs.count(60, now=t + 60) == 2  # first bucket slid out
+        assert rs.count(10, now=t + 15) == 2
+        assert rs.last_order_ts() == t + 15
+        rs.close()
+
+
+def test_ring_slots_are_recycled(tmp_path):
+    for rs in _backends(tmp_path):
+        rs.record(7, now=1000)
+        rs.record(1, now=1000 + SLOTS)  # same ring slot, a full lap later
+        assert rs.count(60, now=1000 + SLOTS) == 1, rs.backend
+        with pytest.raises(ValueError):
+            rs.count(SLOTS)
+        rs.close()
+
+
+def test_mmap_state_survives_reopen(tmp_path):
+    a = MmapRateState(tmp_path / "rate.bin")
+    a.record(4, now=2000.5)
+    b = open_rate_state(tmp_path / "rate.bin")
+    assert b.backend == "mmap" and b.count(60, now=2001) == 4 and b.last_order_ts() == 2000.5
+    a.close(); b.close()
+
+
+def _hammer(path, n):
+    rs = MmapRateState(path)
+    for _ in range(n):
+        rs.record(1, now=5000)
+    rs.close()
+
+
+def test_mmap_counts_are_shared_across_processes(tmp_path):
+    path = tmp_path / "rate.bin"
+    ctx = mp.get_context("spawn")
+    procs = [ctx.Process(target=_hammer, args=(path, 500)) for _ in range(4)]
+    for p in procs: p.start()
+    for p in procs: p.join(60)
+    assert all(p.exitcode == 0 for p in procs)
+    rs = MmapRateState(path)
+    assert rs.count(60, now=5000) == 2000  # no lost updates
+    rs.close()
+
+
+def test_try_acquire_checks_and_records_in_one_step(tmp_path):
+    for rs in _backends(tmp_path):
+        rs.record(3, now=3000)
+        got = rs.try_acquire(4, limit=5, now=3010)
+        assert (got.granted, got.count, got.throttled) == (2, 3, False), rs.backend  # only what fits
+        assert rs.count(60, now=3010) == 5 and rs.last_order_ts() == 3010
+        assert rs.try_acquire(1, limit=5, now=3011).granted == 0
+        assert rs.last_order_ts() == 3010  # a refused claim stamps nothing
+        assert rs.try_acquire(1, throttle_seconds=30, now=3020).throttled
+        got = rs.try_acquire(2, throttle_seconds=30, now=3040)  # no limit: all of n
+        assert got.granted == 2 and rs.count(60, now=3040) == 7
+        rs.close()
+
+
+def _claim(backend, path, n, out):
+    rs = MmapRateState(path) if backend == "mmap" else SqliteRateState(path)
+    out.put(sum(rs.try_acquire(1, limit=50, now=6000).granted for _ in range(n)))
+    rs.close()
+
+
+@pytest.mark.parametrize("backend", ["mmap", "sqlite"])
+def test_try_acquire_never_overshoots_the_limit_across_processes(tmp_path, backend):
+    path = tmp_path / f"rate.{backend}"
+    ctx = mp.get_context("spawn")
+    out = ctx.Queue()
+    procs = [ctx.Process(target=_claim, args=(backend, path, 40, out)) for _ in range(4)]
+    for p in procs: p.start()
+    granted = [out.get(timeout=60) for _ in procs]
+    for p in procs: p.join(60)
+    assert sum(granted) == 50
+    rs = MmapRateState(path) if backend == "mmap" else SqliteRateState(path)
+    assert rs.count(60, now=6000) == 50
+    rs.close()
+
+
+def test_risk_engine_throttle_uses_shared_state(tmp_path, monkeypatch):
+    from app import risk_engine
+
+    monkeypatch.setattr(risk_engine, "_rate", MmapRateState(tmp_path / "engine.bin"))
+    monkeypatch.setattr(risk_engine, "get_settings", lambda: _settings(ORDER_THROTTLE_SECONDS=30, DAILY_LOSS_LIMIT=0.0))
+    assert risk_engine.evaluate_order("AAPL", "buy", 1, 1.0).gates["throttle_ok"] is True
+    # another worker marks an order through its own mapping of the same file
+    MmapRateState(tmp_path / "engine.bin").record(1)
+    res = risk_engine.evaluate_order("AAPL", "buy", 1, 1.0)
+    assert res.gates["throttle_ok"] is False and res.reasons[0].startswith("Throttle: wait")
+
+
+def _settings(**kw):
+    from app.risk_settings import RiskSettings
+    return RiskSettings(**kw)
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import time
+
+
+QTY = [1, 1, 100, 1, 1]
+PRICE = [10.0, 20.0, 50.0, 30.0, 40.0]
+
+
+def _run_gates():
+    import app.core.risk_batch as rb
+    return rb._vector_gates(QTY, PRICE, max_pos=1000.0, common_ok=True, opm_now=1, opm_limit=4)
+
+
+def test_vector_gates_pure_python(monkeypatch):
+    import app.core.risk_batch as rb
+
+    monkeypatch.setattr(rb, "np", None)
+    notional, notional_ok, opm_count, ok = _run_gates()
+    assert notional == [10.0, 20.0, 5000.0, 30.0, 40.0]
+    assert notional_ok == [True, True, False, True, True]
+    # the oversized order does not consume a per-minute slot
+    assert opm_count == [1, 2, 3, 3, 4]
+    assert ok == [True, True, False, True, False]
+
+
+def test_vector_gates_numpy_matches_pure_python(monkeypatch):
+    import app.core.risk_batch as rb
+
+    if rb.np is None:
+        return  # numpy is optional; the pure-Python path is covered above
+    with_np = _run_gates()
+    monkeypatch.setattr(rb, "np", None)
+    assert with_np == _run_gates()
+
+
+def _isolate(monkeypatch, tmp_path):
+    import app.core.risk as risk
+    import app.core.risk_batch as rb
+    from app.core.rate_state import open_rate_state
+
+    for w in risk.risk_state._files:
+        monkeypatch.setattr(w, "path", tmp_path / w.path.name)
+        w.invalidate()
+    monkeypatch.setattr(rb, "ORDERS_AUDIT_FILE", tmp_path / "orders_audit.jsonl")
+    monkeypatch.setattr(risk, "rate_state", open_rate_state(tmp_path / "rate_state.bin"))
+    return risk
+
+
+BASE = {"SESSION_ENABLED": False, "MAX_POSITION_RISK": 100.0, "ORDERS_PER_MIN_LIMIT": 1000, "DAILY_LOSS_LIMIT": 0}
+
+
+def test_risk_evaluate_batch_endpoint(test_client, monkeypatch, tmp_path):
+    _isolate(monkeypatch, tmp_path)
+    body = {
+        "orders": [
+            {"symbol": "AAPL", "side": "buy", "qty": 1, "order_type": "limit", "limit_price": 5.0},
+            {"symbol": "MSFT", "side": "buy", "qty": 10, "order_type": "limit", "limit_price": 50.0},
+        ],
+        "meta": {"overrides": {**BASE, "ORDER_THROTTLE_SECONDS": 0}},
+    }
+    r = test_client.post("/api/risk/evaluate/batch", json=body)
+    assert r.status_code == 200
+    data = r.json()
+    assert [x["ok"] for x in data["results"]] == [True, False]
+    assert data["results"][1]["reasons"]["max_position_risk"] == "500.00>100.00"
+    assert data["aggregate"]["allowed"] == 1
+    assert data["aggregate"]["blocked_by"] == {"max_position_risk": 1}
+
+
+def test_batch_is_one_throttle_submission(test_client, monkeypatch, tmp_path):
+    risk = _isolate(monkeypatch, tmp_path)
+    import app.core.risk_batch as rb
+
+    overrides = {**BASE, "ORDER_THROTTLE_SECONDS": 60}
+    legs = [{"symbol": s, "side": "buy", "qty": 1, "order_type": "limit", "price": 1.0} for s in ("A", "B", "C")]
+    minute_before = risk._orders_in_last_minute()
+
+    # no prior submission: every leg passes, even though they are < 60s apart
+    results, agg = rb.evaluate_batch(legs, overrides)
+    assert [r.ok for r in results] == [True, True, True]
+    assert risk._orders_in_last_minute() == minute_before + 3  # each leg counts per minute
+    assert abs(risk.risk_state.last_order_ts - time.time()) < 5  # one timestamp for the batch
+
+    # the next batch inside the window is throttled as a whole
+    results, agg = rb.evaluate_batch(legs, overrides)
+    assert agg["blocked"] == 3 and agg["blocked_by"] == {"throttle": 3}
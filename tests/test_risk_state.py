@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from app.core.file_cache import WatchedFile
+
+
+def _json_loader(path):
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def test_watched_file_serves_cache_between_revalidations(tmp_path):
+    path = tmp_path / "preset.json"
+    path.write_text(json.dumps({"a": 1}), encoding="utf-8")
+    w = WatchedFile(path, _json_loader, dict, revalidate_seconds=3600)
+    assert w.get() == {"a": 1}
+
+    # Changed on disk, but inside the revalidation window -> cached value
+    path.write_text(json.dumps({"a": 2, "b": 0}), encoding="utf-8")
+    assert w.get() == {"a": 1}
+
+    w.invalidate()
+    assert w.get() == {"a": 2, "b": 0}
+
+
+def test_watched_file_reloads_on_signature_change(tmp_path):
+    path = tmp_path / "flag"
+    w = WatchedFile(path, lambda _: True, lambda: False, revalidate_seconds=0)
+    assert w.get() is False
+    path.write_text("1", encoding="utf-8")
+    assert w.get() is True
+    os.remove(path)
+    assert w.get() is False
+
+
+def test_watched_file_write_through(tmp_path):
+    path = tmp_path / "last_order_ts.txt"
+    w = WatchedFile(path, lambda p: float(p.read_text()), lambda: None, revalidate_seconds=3600)
+    assert w.get() is None
+    v0 = w.version
+    w.store("123.5", 123.5)
+    assert w.get() == 123.5
+    assert path.read_text(encoding="utf-8") == "123.5"
+    assert w.version > v0
+    w.clear()
+    assert w.get() is None and not path.exists()
+
+
+@pytest.fixture
+def isolated_risk(test_client, tmp_path, monkeypatch):
+    """Point the (freshly imported) RiskState and audit path at tmp_path instead of the repo dirs."""
+    import app.core.risk as risk
+    from app.core.rate_state import open_rate_state
+
+    for w in risk.risk_state._files:
+        monkeypatch.setattr(w, "path", tmp_path / w.path.name)
+        w.invalidate()
+    monkeypatch.setattr(risk, "CIRCUIT_BREAKER_FILE", tmp_path / "cfg_circuit_breaker.lock")
+    monkeypatch.setattr(risk, "ORDERS_AUDIT_FILE", tmp_path / "orders_audit.jsonl")
+    monkeypatch.setattr(risk, "rate_state", open_rate_state(tmp_path / "rate_state.bin"))
+    return risk
+
+
+def test_risk_cooloff_write_through(test_client, isolated_risk, tmp_path):
+    risk_state = isolated_risk.risk_state
+
+    r = test_client.post("/api/risk/cooloff/true")
+    assert r.status_code == 200
+    assert risk_state.cooloff is True
+    assert (tmp_path / "cooloff_active.flag").exists()
+    r = test_client.post("/api/risk/evaluate", json={"symbol": "AAPL", "side": "buy", "qty": 1,
+                                                     "order_type": "limit", "limit_price": 1.0})
+    assert r.json()["reasons"]["cooloff"] == "cooloff_active"
+
+    test_client.post("/api/risk/cooloff/false")
+    assert risk_state.cooloff is False
+    assert not (tmp_path / "cooloff_active.flag").exists()
+
+
+def test_gate_files_are_never_stale(test_client, isolated_risk, tmp_path):
+    """Flags written by another process apply on the very next evaluation."""
+    risk = isolated_risk
+    overrides = {"SESSION_ENABLED": False, "ORDER_THROTTLE_SECONDS": 0}
+    assert risk.evaluate_order("AAPL", "buy", 1, "limit", 1.0, overrides).reasons["cooloff"] == "ok"
+    (tmp_path / "cooloff_active.flag").write_text("1", encoding="utf-8")
+    assert risk.evaluate_order("AAPL", "buy", 1, "limit", 1.0, overrides).reasons["cooloff"] == "cooloff_active"
+
+
+def test_evaluate_order_steady_state_does_no_reads(test_client, isolated_risk, tmp_path, monkeypatch):
+    risk = isolated_risk
+    (tmp_path / "risk_preset.json").write_text(json.dumps({"SESSION_ENABLED": False}), encoding="utf-8")
+    (tmp_path / "daily_pnl_now.txt").write_text("12.5", encoding="utf-8")
+    overrides = {"ORDER_THROTTLE_SECONDS": 0}
+    risk.evaluate_order("AAPL", "buy", 1, "limit", 1.0, overrides)  # warm the cache
+
+    reads = []
+    real_read_text = Path.read_text
+    def counting_read_text(self, *a, **kw):
+        reads.append(self)
+        return real_read_text(self, *a, **kw)
+    monkeypatch.setattr(Path, "read_text", counting_read_text)
+
+    for _ in range(5):
+        res = risk.evaluate_order("AAPL", "buy", 1, "limit", 1.0, overrides)
+    assert res.reasons["session"] == "ok"  # preset came from the cache
+    assert reads == []
+
+    # the cached preset is not shared with callers
+    res.preset["SESSION_ENABLED"] = True
+    assert risk.risk_state.preset["SESSION_ENABLED"] is False
+
+
+def test_allow_path_claims_the_rate_slot_atomically(test_client, isolated_risk, monkeypatch):
+    """A worker whose pipeline saw a stale count/timestamp is still stopped by the atomic claim."""
+    risk = isolated_risk
+    monkeypatch.setattr(risk._StateSources, "orders_in_window", lambda self, seconds: 0)
+    monkeypatch.setattr(risk._StateSources, "last_order_ts", lambda self: None)
+    overrides = {"SESSION_ENABLED": False, "ORDER_THROTTLE_SECONDS": 0, "ORDERS_PER_MIN_LIMIT": 2}
+    risk.rate_state.record(2)  # two orders admitted by other workers
+    res = risk.evaluate_order("AAPL", "buy", 1, "limit", 1.0, overrides)
+    assert not res.ok and res.reasons["orders_per_min"] == "2/2" and risk.rate_state.count(60) == 2
+
+    res = risk.evaluate_order("AAPL", "buy", 1, "limit", 1.0, {**overrides, "ORDERS_PER_MIN_LIMIT": 5,
+                                                                 "ORDER_THROTTLE_SECONDS": 30})
+    assert not res.ok and res.reasons["throttle"] == "throttled"
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+
+class _Src:
+    def __init__(self, last=None, n=0, pnl=0.0, cooloff=False):
+        self.last, self.n, self.pnl, self._cooloff = last, n, pnl, cooloff
+        self.pnl_calls = 0
+
+    def session_state(self, now, tz, start, end, extended): return "ok"
+    def cooloff(self): return self._cooloff
+    def circuit_breaker(self): return False
+    def last_order_ts(self): return self.last
+    def orders_in_window(self, seconds): return self.n
+    def day_pnl(self):
+        self.pnl_calls += 1
+        return self.pnl
+
+
+CFG = {"ORDER_THROTTLE_SECONDS": 10, "ORDERS_PER_MIN_LIMIT": 5, "MAX_POSITION_RISK": 100.0, "DAILY_LOSS_LIMIT": 50.0}
+
+
+def test_pipeline_is_compiled_once_per_config():
+    from app.core import rules
+    p = rules.compile_pipeline(dict(CFG))
+    assert rules.compile_pipeline(dict(reversed(list(CFG.items())))) is p
+    assert rules.compile_pipeline({**CFG, "DAILY_LOSS_LIMIT": 60.0}) is not p
+    assert rules.compile_pipeline({**CFG, "ORDERS_PER_MIN_LIMIT": None}).names == \
+        ("session", "cooloff", "throttle", "max_position_risk", "daily_loss_limit")
+
+
+def test_outcomes_and_short_circuit():
+    from app.core import rules
+    order = rules.Order("AAPL", "buy", 2, 300.0)
+    outs = rules.evaluate(CFG, order, _Src(last=995.0, pnl=-50.0), now=1000.0)
+    assert [o.name for o in outs if not o.passed] == ["throttle", "max_position_risk", "daily_loss_limit"]
+    assert outs[2].detail == "Throttle: wait 5s"
+
+    src = _Src(cooloff=True, pnl=-50.0)
+    outs = rules.evaluate(CFG, order, src, now=1000.0, short_circuit=True)
+    assert [o.name for o in outs] == ["session", "cooloff"] and src.pnl_calls == 0
+
+
+def test_evaluate_many_shares_order_independent_checks():
+    from app.core import rules
+    src = _Src(pnl=-10.0)
+    orders = [rules.Order("AAPL", "buy", 1, 50.0), rules.Order("MSFT", "buy", 1, 500.0), rules.Order("SPY", "buy", 1)]
+    res = rules.evaluate_many(CFG, orders, src, now=1000.0)
+    assert src.pnl_calls == 1
+    assert all([o.name for o in r] == rules.check_names() for r in res)
+    assert [r[4].passed for r in res] == [True, False, True] and res[2][4].warn
+
+
+def test_core_evaluate_order_short_circuit_marks_skipped(test_client, tmp_path, monkeypatch):
+    import app.core.risk as risk
+    from app.core.rate_state import open_rate_state
+
+    for w in risk.risk_state._files:
+        monkeypatch.setattr(w, "path", tmp_path / w.path.name)
+        w.invalidate()
+    monkeypatch.setattr(risk, "ORDERS_AUDIT_FILE", tmp_path / "orders_audit.jsonl")
+    monkeypatch.setattr(risk, "rate_state", open_rate_state(tmp_path / "rate_state.bin"))
+    (tmp_path / "cooloff_active.flag").write_text("1", encoding="utf-8")
+    overrides = {"SESSION_ENABLED": False, "ORDER_THROTTLE_SECONDS": 0}
+    res = risk.evaluate_order("AAPL", "buy", 1, "limit", 1.0, overrides, short_circuit=True)
+    assert res.ok is False and res.reasons["cooloff"] == "cooloff_active"
+    assert res.reasons["daily_loss_limit"] == "skipped"
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import json
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from app.core.session_calendar import HolidaySpec, SessionCalendar, load_holiday_file
+
+NY = ZoneInfo("America/New_York")
+
+
+def _t(y, mo, d, h, mi=0):
+    return datetime(y, mo, d, h, mi, tzinfo=NY).timestamp()
+
+
+def test_open_close_follow_dst():
+    cal = SessionCalendar("America/New_York", first_year=2025, last_year=2025)
+    # 09:30 New York is 14:30 UTC in winter and 13:30 UTC in summer; a fixed -4h offset gets one wrong
+    assert cal.is_open(_t(2025, 1, 15, 9, 30)) and not cal.is_open(_t(2025, 1, 15, 9, 29))
+    assert cal.is_open(_t(2025, 7, 15, 9, 30)) and not cal.is_open(_t(2025, 7, 15, 16, 0))
+    assert not cal.is_open(_t(2025, 3, 8, 12))  # Saturday
+    assert not cal.is_trading_day(_t(2025, 3, 8, 12))
+    opens_at, opens = cal.next_transition(_t(2025, 3, 8, 12))
+    assert opens and opens_at == _t(2025, 3, 10, 9, 30)  # Monday after the DST switch
+
+
+def test_holidays_and_half_days_from_file(tmp_path):
+    path = tmp_path / "us_holidays.json"
+    path.write_text(json.dumps({"holidays": ["2025-11-27"], "half_days": {"2025-11-28": "13:00"}}), encoding="utf-8")
+    cal = SessionCalendar("America/New_York", spec=load_holiday_file(path), first_year=2025, last_year=2025)
+    assert cal.is_holiday(_t(2025, 11, 27, 11)) and not cal.is_open(_t(2025, 11, 27, 11))
+    assert cal.is_open(_t(2025, 11, 28, 12, 59)) and not cal.is_open(_t(2025, 11, 28, 13))
+    assert cal.next_transition(_t(2025, 11, 28, 10)) == (_t(2025, 11, 28, 13), False)
+    # plain list format: every entry is a full closure
+    path.write_text(json.dumps(["2025-07-04"]), encoding="utf-8")
+    assert load_holiday_file(path) == HolidaySpec(frozenset({"2025-07-04"}))
+
+
+def test_horizon_extends_on_demand():
+    cal = SessionCalendar("America/New_York", first_year=2025, last_year=2025)
+    assert cal.is_open(_t(2031, 6, 4, 10))
+    clock = cal.clock(_t(2031, 6, 4, 10))
+    assert clock["is_open"] and clock["next_close"].startswith("2031-06-04T16:00")
+
+
+def test_risk_gate_uses_calendar_and_reloads_holidays(test_client, tmp_path, monkeypatch):
+    import app.core.risk as risk
+
+    w = risk.risk_state.holidays_file
+    monkeypatch.setattr(w, "path", tmp_path / "us_holidays.json"); w.invalidate()
+    monkeypatch.setattr(risk.time, "time", lambda: _t(2025, 7, 3, 10))  # Thursday, mid-session
+    monkeypatch.setattr(risk, "ORDERS_AUDIT_FILE", tmp_path / "orders_audit.jsonl")
+    preset = {**risk.risk_state.preset, "TIMEZONE": "America/New_York"}
+    assert risk._common_gates(risk.risk_state, preset)["session"] == "ok"
+
+    w.path.write_text(json.dumps(["2025-07-03"]), encoding="utf-8"); w.invalidate()
+    assert risk._common_gates(risk.risk_state, preset)["session"] == "holiday"
+    assert risk.risk_state.calendar(preset) is risk.get_calendar("America/New_York", "09:30", "16:00", risk.risk_state.holidays)
+
+
+def test_alpaca_clock_fallback(test_client):
+    clock = test_client.get("/api/alpaca/clock").json()
+    assert clock["source"] == "fallback"
+    assert set(clock["clock"]) == {"timestamp", "is_open", "next_open", "next_close"}
+
+
+def test_bad_preset_hours_fall_back_instead_of_failing(test_client, tmp_path, monkeypatch):
+    import app.core.risk as risk
+
+    r = test_client.post("/api/risk/update", json={"TIMEZONE": "Mars/Olympus"})
+    assert r.status_code == 422
+    assert test_client.post("/api/risk/update", json={"RTH_END": "4pm"}).status_code == 422
+
+    # a hand-edited preset file can still carry bad values: the gate and the clock keep working
+    monkeypatch.setattr(risk, "ORDERS_AUDIT_FILE", tmp_path / "orders_audit.jsonl")
+    bad = {**risk.risk_state.preset, "TIMEZONE": "Mars/Olympus", "RTH_START": "25:99"}
+    cal = risk.risk_state.calendar(bad)
+    assert cal.tz_name == risk.settings.SESSION_TZ and (cal.rth_start, cal.rth_end) == ("09:30", "16:00")
+    assert risk._common_gates(risk.risk_state, bad)["session"] in ("ok", "closed", "holiday")
+    r = test_client.post("/api/risk/evaluate", json={"symbol": "AAPL", "side": "buy", "qty": 1, "order_type": "limit",
+                                                     "limit_price": 1.0, "meta": {"overrides": bad}})
+    assert r.status_code == 200
+
+
+def test_horizon_growth_is_safe_under_concurrent_readers():
+    from concurrent.futures import ThreadPoolExecutor
+
+    cal = SessionCalendar("America/New_York", first_year=2025, last_year=2025)
+    years = [2025 + (i % 12) for i in range(240)]
+    with ThreadPoolExecutor(8) as pool:
+        got = list(pool.map(lambda y: (cal.is_trading_day(_t(y, 6, 4, 10)), cal.day_status(_t(y, 6, 7, 10))), years))
+    expect = {y: (datetime(y, 6, 4).weekday() < 5, 0 if datetime(y, 6, 7).weekday() >= 5 else 1) for y in set(years)}
+    assert got == [expect[y] for y in years]
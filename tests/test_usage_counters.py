@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import json
+import threading
+
+
+def test_add_appends_and_reads_rebuild_state(test_client, tmp_path, monkeypatch):
+    monkeypatch.setenv("ORION_CONFIG_DIR", str(tmp_path))
+    for svc, cost in (("openai:gpt-4o", 1.5), ("oanda", 0.25), ("openai:gpt-4o", 2.0)):
+        r = test_client.post("/api/usage/counters/add",
+                             json={"service": svc, "cost": cost, "tokens": 10, "requests": 1, "date": "2024-01-02"})
+        assert r.status_code == 200
+    body = r.json()
+    assert body["per_service"]["openai:gpt-4o"] == {"tokens": 20.0, "cost": 3.5, "requests": 2}
+    assert body["daily"]["2024-01-02"]["cost"] == 3.75 and body["summary"]["total"]["requests"] == 3
+
+    assert not (tmp_path / "usage_counters.json").exists()  # nothing compacted yet: three log lines
+    assert len((tmp_path / "usage_counters.log").read_text(encoding="utf-8").splitlines()) == 3
+
+    assert test_client.post("/api/usage/counters/reset", json={"confirm": True}).status_code == 200
+    assert test_client.get("/api/usage/counters").json()["per_service"] == {}
+
+
+def test_concurrent_adds_are_not_lost(tmp_path):
+    from app.services.usage_counters import CounterStore
+
+    writers = [CounterStore(tmp_path) for _ in range(4)]  # separate stores ~ separate workers
+    def work(s):
+        for _ in range(100): s.add("svc", "2024-01-02", tokens=1, cost=0.01, requests=1)
+    ts = [threading.Thread(target=work, args=(s,)) for s in writers]
+    for t in ts: t.start()
+    for t in ts: t.join()
+    c = CounterStore(tmp_path).state()
+    assert c["services"]["svc"]["requests"] == 400 and c["by_service_daily"]["svc"]["2024-01-02"]["tokens"] == 400.0
+
+
+def test_compaction_writes_a_compatible_snapshot(tmp_path):
+    from app.services.usage_counters import CounterStore
+
+    s = CounterStore(tmp_path, compact_every=5)
+    for i in range(7): s.add("svc", f"2024-01-0{i + 1}", cost=1.0, requests=1, currency="EUR")
+    assert s.state()["services"]["svc"]["requests"] == 7
+    snap = json.loads((tmp_path / "usage_counters.json").read_text(encoding="utf-8"))
+    assert snap["log_offset"] == (tmp_path / "usage_counters.log").stat().st_size
+    assert snap["currency"] == "EUR" and set(snap) >= {"as_of", "services", "daily", "by_service_daily"}
+
+    s.add("svc", "2024-01-09", cost=1.0, requests=1)  # tail past the snapshot
+    fresh = CounterStore(tmp_path).state()
+    assert fresh["services"]["svc"]["requests"] == 8 and fresh["currency"] == "USD"
+
+
+def test_reads_legacy_snapshot_without_log(tmp_path):
+    from app.services.usage_counters import CounterStore
+
+    legacy = {"as_of": "2024-01-01T00:00:00Z", "currency": "USD", "daily": {},
+              "services": {"oanda": {"tokens": 0.0, "cost": 4.0, "requests": 2}},
+              "by_service_daily": {}}
+    (tmp_path / "usage_counters.json").write_text(json.dumps(legacy, indent=2), encoding="utf-8")
+    s = CounterStore(tmp_path)
+    s.add("oanda", "2024-01-02", cost=1.0, requests=1)
+    assert s.state()["services"]["oanda"] == {"tokens": 0.0, "cost": 5.0, "requests": 3}
+
+
+def test_add_batch_json_and_ndjson(test_client, tmp_path, monkeypatch):
+    monkeypatch.setenv("ORION_CONFIG_DIR", str(tmp_path))
+    recs = [{"service": f"svc{i % 3}", "cost": 0.5, "requests": 1, "date": "2024-02-01"} for i in range(3000)]
+    r = test_client.post("/api/usage/counters/add_batch", json=recs)
+    assert r.status_code == 200 and r.json()["added"] == 3000
+    assert r.json()["summary"]["total"]["requests"] == 3000
+
+    ndjson = "\n".join(json.dumps({"service": "oanda", "tokens": 5, "date": "2024-02-02"}) for _ in range(1000)) + "\n"
+    r = test_client.post("/api/usage/counters/add_batch", content=ndjson.encode(),
+                         headers={"Content-Type": "application/x-ndjson"})
+    assert r.status_code == 200 and r.json()["per_service"]["oanda"]["tokens"] == 5000.0
+    assert r.json()["daily"]["2024-02-01"]["cost"] == 1500.0
+
+
+def test_add_batch_is_all_or_nothing(test_client, tmp_path, monkeypatch):
+    monkeypatch.setenv("ORION_CONFIG_DIR", str(tmp_path))
+    r = test_client.post("/api/usage/counters/add_batch",
+                         json={"records": [{"service": "a", "cost": 1}, {"service": "b"}, {"cost": 1}]})
+    assert r.status_code == 422
+    detail = r.json()["detail"]
+    assert detail["error_count"] == 2 and [e["index"] for e in detail["errors"]] == [1, 2]
+    assert not (tmp_path / "usage_counters.log").exists()
+
+    r = test_client.post("/api/usage/counters/add_batch", content=b'{"service": "a", "cost": 1}\n{oops\n',
+                         headers={"Content-Type": "application/x-ndjson"})
+    assert r.status_code == 422 and "invalid JSON" in r.json()["detail"]["errors"][0]["error"]
+
+
+def test_add_batch_validates_off_the_event_loop(test_client, tmp_path, monkeypatch):
+    import asyncio
+    import app.routers.usage as usage
+
+    def on_loop() -> bool:
+        try: asyncio.get_running_loop()
+        except RuntimeError: return False
+        return True
+
+    monkeypatch.setenv("ORION_CONFIG_DIR", str(tmp_path))
+    calls = []
+    real = usage._batch_record
+    monkeypatch.setattr(usage, "_batch_record", lambda raw: calls.append(on_loop()) or real(raw))
+
+    recs = [{"service": "a", "cost": 1}] * 50
+    assert test_client.post("/api/usage/counters/add_batch", json=recs).status_code == 200
+    ndjson = "\n".join(json.dumps(r) for r in recs).encode()
+    assert test_client.post("/api/usage/counters/add_batch", content=ndjson,
+                            headers={"Content-Type": "application/x-ndjson"}).status_code == 200
+    assert len(calls) == 100 and not any(calls)
+
+
+def test_day_series_prefix_sums_and_views():
+    import datetime as dt
+    from app.services.usage_counters import DaySeries
+
+    d = lambda s: dt.date.fromisoformat(s).toordinal()
+    s = DaySeries()
+    s.add(d("2024-01-10"), (1.0, 0.1, 1))
+    s.add(d("2024-01-12"), (2.0, 0.2, 1))
+    assert s.window(d("2024-01-01"), d("2024-01-31")) == {"tokens": 3.0, "cost": 0.3, "requests": 2}
+    s.add(d("2023-12-31"), (4.0, 0.4, 1))  # back-dated: extends the array at the front
+    assert s.window(d("2023-12-31"), d("2024-01-10")) == {"tokens": 5.0, "cost": 0.5, "requests": 2}
+    assert s.window(d("2025-01-01"), d("2025-12-31"))["requests"] == 0
+
+    first, (tokens, _, _) = s.view(d("2024-01-09"), d("2024-01-11"))
+    assert first == d("2024-01-09") and list(tokens) == [0.0, 1.0, 0.0]
+    assert tokens.obj is s.cols[0]  # a view, not a copy
+    rows = s.daily(d("2024-01-11"), d("2024-01-13"))
+    assert [r["tokens"] for r in rows] == [0.0, 2.0, 0.0] and rows[0]["date"] == "2024-01-11"
+
+
+def test_windowed_history_and_per_service_endpoints(test_client, tmp_path, monkeypatch):
+    monkeypatch.setenv("ORION_CONFIG_DIR", str(tmp_path))
+    recs = [{"service": "a", "cost": 1.0, "requests": 1, "date": "2022-06-01"},
+            {"service": "a", "cost": 2.0, "requests": 1, "date": "2024-06-01"},
+            {"service": "b", "cost": 4.0, "requests": 2, "date": "2024-06-02"}]
+    assert test_client.post("/api/usage/counters/add_batch", json=recs).status_code == 200
+
+    r = test_client.get("/api/usage/counters/services", params={"window_days": 3 * 365, "end": "2024-06-30"}).json()
+    assert r["services"]["a"]["cost"] == 3.0 and r["services"]["b"]["requests"] == 2
+    assert r["total"]["cost"] == 7.0 and r["window"]["start"] == "2021-07-02"
+
+    r = test_client.get("/api/usage/counters/services/a", params={"window_days": 30, "end": "2024-06-30"}).json()
+    assert r["total"]["cost"] == 2.0 and len(r["rollup"]["series"]) == 30 and r["avg_cost_per_day"] == 2.0 / 30
+
+    h = test_client.get("/api/usage/counters/history",
+                        params={"days": 2, "end": "2024-06-02", "service": "b"}).json()["history"]["series"]
+    assert [x["cost"] for x in h] == [0.0, 4.0]
+    assert test_client.get("/api/usage/counters/history", params={"end": "June"}).status_code == 400
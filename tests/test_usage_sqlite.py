@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import json
+import threading
+
+
+def test_concurrent_connections_do_not_lose_increments(tmp_path):
+    from app.services.usage_sqlite import SqliteUsageStore
+
+    stores = [SqliteUsageStore(tmp_path / "usage.sqlite") for _ in range(4)]  # one connection each ~ one worker
+    def work(s):
+        for _ in range(50): s.add_many([{"service": "svc", "date": "2024-03-01", "cost": 0.5, "requests": 1}] * 2)
+    ts = [threading.Thread(target=work, args=(s,)) for s in stores]
+    for t in ts: t.start()
+    for t in ts: t.join()
+    assert stores[0].window("2024-03-01", "2024-03-01") == {"tokens": 0.0, "cost": 200.0, "requests": 400}
+    plan = " ".join(str(r) for r in stores[0]._db.execute(
+        "EXPLAIN QUERY PLAN SELECT SUM(cost) FROM usage_counters WHERE day BETWEEN '2024-01-01' AND '2024-12-31'"))
+    assert "COVERING INDEX usage_counters_day" in plan
+    for s in stores: s.close()
+
+
+def test_migrates_json_once_and_exports_back(tmp_path):
+    from app.services.usage_counters import CounterStore
+    from app.services.usage_sqlite import SqliteUsageStore
+
+    js = CounterStore(tmp_path, compact_every=2)
+    for day in ("2024-03-01", "2024-03-02", "2024-03-02"): js.add("a", day, tokens=10, cost=1.0, requests=1)
+    js.state()  # snapshot covers two events, the third stays in the log tail
+    (tmp_path / "usage_tokens.json").write_text(json.dumps({"current_balance": 9.5, "daily_used": [1, 2]}), encoding="utf-8")
+
+    db = SqliteUsageStore(tmp_path / "usage.sqlite", migrate_from=tmp_path)
+    assert db.state()["services"]["a"] == {"tokens": 30.0, "cost": 3.0, "requests": 3}
+    assert db.get_tokens("usage_tokens")["daily_used"] == [1.0, 2.0]
+    assert db.migrate_json(tmp_path) is False  # second open: nothing re-imported
+
+    db.add("b", "2024-03-03", cost=2.0, requests=1)
+    db.export_json(tmp_path)
+    back = CounterStore(tmp_path).state()
+    assert back["services"] == db.state()["services"] and back["daily"]["2024-03-02"]["requests"] == 2
+    db.close()
+
+
+def test_router_and_core_on_sqlite_backend(test_client, tmp_path, monkeypatch):
+    monkeypatch.setenv("ORION_CONFIG_DIR", str(tmp_path))
+    monkeypatch.setenv("USAGE_BACKEND", "sqlite")
+    body = {"service": "oanda", "cost": 1.25, "requests": 1, "date": "2024-03-01"}
+    assert test_client.post("/api/usage/counters/add", json=body).status_code == 200
+    r = test_client.post("/api/usage/counters/add_batch", json=[body] * 3).json()
+    assert r["per_service"]["oanda"] == {"tokens": 0.0, "cost": 5.0, "requests": 4}
+    h = test_client.get("/api/usage/counters/history", params={"days": 2, "end": "2024-03-02"}).json()
+    assert [x["requests"] for x in h["history"]["series"]] == [4, 0]
+
+    test_client.post("/api/usage/tokens/set", json={"current_balance": 3.0, "daily_used": [1.0]})
+    assert test_client.get("/api/usage/tokens").json()["usage"]["current_balance"] == 3.0
+    assert not (tmp_path / "usage_tokens.json").exists()
+    paths = test_client.post("/api/usage/export").json()["paths"]
+    assert any(p.endswith("usage_counters.json") for p in paths) and (tmp_path / "usage_tokens.json").exists()
+
+    from app.core import usage
+    monkeypatch.setattr(usage, "CONFIG_DIR", tmp_path / "core")
+    monkeypatch.setattr(usage, "TOKENS_FILE", tmp_path / "core" / "tokens.json")
+    (tmp_path / "core").mkdir()
+    (tmp_path / "core" / "tokens.json").write_text(json.dumps({"current_balance": 7.0, "daily_used": [2.0]}), encoding="utf-8")
+    assert usage.load_usage().current_balance == 7.0  # imported from tokens.json
+    assert usage.save_usage({"current_balance": 1.0, "daily_used": []}).current_balance == 1.0
+    assert json.loads((tmp_path / "core" / "tokens.json").read_text(encoding="utf-8"))["current_balance"] == 7.0
+
+
+def test_core_usage_reuses_the_cached_store(tmp_path, monkeypatch):
+    from app.core import usage
+    from app.services import usage_sqlite
+
+    monkeypatch.setenv("USAGE_BACKEND", "sqlite")
+    monkeypatch.setattr(usage, "CONFIG_DIR", tmp_path)
+    monkeypatch.setattr(usage, "TOKENS_FILE", tmp_path / "tokens.json")
+    opened = []
+    real = usage_sqlite.SqliteUsageStore.__init__
+    monkeypatch.setattr(usage_sqlite.SqliteUsageStore, "__init__", lambda self, *a, **k: opened.append(1) or real(self, *a, **k))
+    for i in range(5):
+        usage.save_usage({"current_balance": float(i), "daily_used": [1.0]})
+        assert usage.load_usage().current_balance == float(i)
+    assert len(opened) == 1 and usage._sqlite_store() is usage_sqlite.get_sqlite_store(tmp_path)